@@ -17,11 +17,21 @@ class Profile(models.Model):
         return f"{self.user.username} Profile"
 
 
-# Signal: after creating a User, immediately create an empty Profile
+def get_profile(user):
+    """
+    The user's profile, created empty if they have none yet (users made by
+    bulk_create() or loaded from fixtures skip the signal below).
+    """
+    try:
+        return user.profile
+    except Profile.DoesNotExist:
+        profile, _ = Profile.objects.get_or_create(user=user)
+        return profile
+
+
+# Signal: after creating a User, immediately create an empty Profile. Later
+# saves (e.g. of last_login on every login) leave the profile alone.
 @receiver(post_save, sender=User)
-def create_or_update_user_profile(sender, instance, created, **kwargs):
-    if created:
+def create_user_profile(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
         Profile.objects.create(user=instance)
-    else:
-        profile, _ = Profile.objects.get_or_create(user=instance)
-        profile.save()
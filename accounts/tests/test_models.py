@@ -1,5 +1,8 @@
 from django.contrib.auth.models import User
 from django.test import TestCase
+from django.urls import reverse
+
+from accounts.models import Profile, get_profile
 
 
 class ProfileModelTest(TestCase):
@@ -7,3 +10,31 @@ class ProfileModelTest(TestCase):
         u = User.objects.create_user(username="alice", password="pass")
         self.assertTrue(hasattr(u, "profile"))
         self.assertEqual(u.profile.user, u)
+
+    def test_user_saves_leave_profile_alone(self):
+        u = User.objects.create_user(username="alice", password="pass")
+        with self.assertNumQueries(1):
+            u.save(update_fields=["last_login"])
+
+    def test_profile_created_lazily(self):
+        u = User.objects.create_user(username="alice", password="pass")
+        Profile.objects.filter(user=u).delete()
+        u = User.objects.get(pk=u.pk)
+        self.assertEqual(get_profile(u), Profile.objects.get(user=u))
+
+
+class ProfileViewTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="alice", password="pass")
+        self.client.force_login(self.user)
+        self.data = {"username": "alice", "first_name": "", "last_name": ""}
+
+    def test_saves_only_changed_forms(self):
+        url = reverse("accounts:profile")
+        # Session, user, profile and two username checks; no writes
+        with self.assertNumQueries(5):
+            resp = self.client.post(url, self.data)
+        self.assertRedirects(resp, url)
+
+        self.client.post(url, dict(self.data, city="Lyon"))
+        self.assertEqual(Profile.objects.get(user=self.user).city, "Lyon")
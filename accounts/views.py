@@ -3,19 +3,23 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import redirect, render
 
 from .forms import ProfileForm, UserForm
+from .models import get_profile
 
 
 @login_required
 def profile_view(request):
     user = request.user
-    profile = user.profile
+    profile = get_profile(user)
 
     if request.method == "POST":
         u_form = UserForm(request.POST, instance=user)
         p_form = ProfileForm(request.POST, request.FILES, instance=profile)
         if u_form.is_valid() and p_form.is_valid():
-            u_form.save()
-            p_form.save()
+            # Unchanged forms would write the same values back
+            if u_form.has_changed():
+                u_form.save()
+            if p_form.has_changed():
+                p_form.save()
             messages.success(request, "Your profile has been updated.")
             return redirect("accounts:profile")
     else:
@@ -106,6 +106,51 @@ DATABASES = {
     }
 }
 
+# Seconds a cart keeps its hold on stock after the last change; expired
+# holds are swept by `manage.py release_expired_reservations`
+STOCK_RESERVATION_TTL = env.int("STOCK_RESERVATION_TTL", default=15 * 60)
+
+# Per-process memory by default, which only suits a single worker: the
+# catalog cache's version stamps must be shared for a change made by one
+# worker to reach the others (`manage.py check --deploy` insists on it)
+CACHES = {
+    "default": env.cache("CACHE_URL", default="locmemcache://"),
+}
+
+# Seconds a cached catalog entry may live; with a shared cache, entries are
+# also invalidated as soon as a product or category changes
+CATALOG_CACHE_TIMEOUT = env.int("CATALOG_CACHE_TIMEOUT", default=300)
+
+# How long API responses are kept for replay against their Idempotency-Key
+IDEMPOTENCY_KEY_TTL = env.int("IDEMPOTENCY_KEY_TTL", default=24 * 60 * 60)
+
+# API users authenticated by JWT are kept in a per-process cache for this
+# many seconds (see store.api.authentication) ...
+JWT_USER_CACHE_TTL = env.int("JWT_USER_CACHE_TTL", default=60)
+# ... and newly blacklisted tokens are looked up at most this often
+JWT_BLACKLIST_REFRESH = env.int("JWT_BLACKLIST_REFRESH", default=30)
+
+# Loads request.user together with their cart (see store.backends).
+# ModelBackend stays listed so sessions created before CartModelBackend
+# existed, which name it, still resolve instead of being logged out
+AUTHENTICATION_BACKENDS = [
+    "store.backends.CartModelBackend",
+    "django.contrib.auth.backends.ModelBackend",
+]
+
+# The first hasher hashes new passwords; a login with a password stored by
+# any other one (or with weaker parameters) re-hashes it with the first
+PASSWORD_HASHERS = env.list(
+    "PASSWORD_HASHERS",
+    default=[
+        "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+        "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+        "django.contrib.auth.hashers.Argon2PasswordHasher",
+        "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+        "django.contrib.auth.hashers.ScryptPasswordHasher",
+    ],
+)
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -153,8 +198,24 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, "static")]
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Admin changelists of large tables (orders, carts, products) show the
+# planner's row estimate instead of running COUNT(*) once a table or a
+# filtered list holds at least this many rows; 0 always counts exactly
+ADMIN_ESTIMATED_COUNT_THRESHOLD = env.int(
+    "ADMIN_ESTIMATED_COUNT_THRESHOLD", default=100_000
+)
+
+# "numbered" (page links, COUNT + OFFSET) or "keyset" (next/prev only,
+# constant cost per page) for the HTML product catalog
+CATALOG_PAGINATION = env("CATALOG_PAGINATION", default="numbered")
+CATALOG_PAGE_SIZE = 6
+# Lower bounds of the price bands shown in the catalog filter sidebar;
+# run `manage.py rebuild_facets` after changing them
+CATALOG_PRICE_BANDS = [0, 25, 50, 100, 250]
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
+        "store.api.authentication.CachedJWTAuthentication",
         "rest_framework.authentication.SessionAuthentication",
         "rest_framework.authentication.TokenAuthentication",
     ],
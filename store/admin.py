@@ -1,13 +1,24 @@
 from django import forms
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.auth.models import User
+from django.core.exceptions import FieldDoesNotExist, PermissionDenied
+from django.db import models, transaction
 from django.forms import HiddenInput
+from django.http import StreamingHttpResponse
+from django.shortcuts import redirect
+from django.urls import path
+from django.utils import timezone
 from django.utils.html import format_html
+from django.utils.text import smart_split, unescape_string_literal
 
-from .models import Cart, CartItem, Category, Order, OrderItem, Product
+from . import authz, bulk, carts, changes, exports, inventory, search
+from .models import Cart, CartItem, Category, ChangeLogEntry, Order, OrderItem, Product
+from .pagination import EstimatedCountPaginator
 
 
 def is_staff_user(request):
-    return request.user.groups.filter(name="Staff").exists()
+    return authz.resolve(request).is_staff_member
 
 
 class HideForStaffMixin:
@@ -17,6 +28,31 @@ class HideForStaffMixin:
         return super().has_module_permission(request)
 
 
+class LargeTableMixin:
+    """
+    Changelist settings for tables that grow into the millions: counts
+    estimated by the planner (see EstimatedCountPaginator), no second
+    COUNT(*) of the whole table, and the foreign keys in list_display
+    loaded with the rows unless list_select_related says otherwise.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_list_select_related(self, request):
+        if self.list_select_related is not False:
+            return self.list_select_related
+        related = []
+        for name in self.list_display:
+            try:
+                field = self.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if field.many_to_one or field.one_to_one:
+                related.append(name)
+        return related
+
+
 # Categories
 @admin.register(Category)
 class CategoryAdmin(HideForStaffMixin, admin.ModelAdmin):
@@ -28,7 +64,7 @@ class CategoryAdmin(HideForStaffMixin, admin.ModelAdmin):
 
 # Products
 @admin.register(Product)
-class ProductAdmin(HideForStaffMixin, admin.ModelAdmin):
+class ProductAdmin(HideForStaffMixin, LargeTableMixin, admin.ModelAdmin):
     list_display = ("name", "category", "price", "stock", "image_preview")
     list_filter = ("category", "stock")
     search_fields = ("name", "description")
@@ -36,6 +72,30 @@ class ProductAdmin(HideForStaffMixin, admin.ModelAdmin):
     readonly_fields = ("image_preview",)
     list_per_page = 20
 
+    def get_search_results(self, request, queryset, search_term):
+        # The catalog's full-text index instead of icontains scans
+        if not search_term.strip():
+            return queryset, False
+        return search.search_products(queryset, search_term), False
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method != "POST" or "_save" not in request.POST:
+            return super().changelist_view(request, extra_context)
+        # list_editable: save_model() only collects the rows, which are
+        # then written together in the same transaction
+        with transaction.atomic():
+            request._product_patches = []
+            response = super().changelist_view(request, extra_context)
+            if request._product_patches:
+                bulk.apply_product_patches(request._product_patches)
+        return response
+
+    def save_model(self, request, obj, form, change):
+        patches = getattr(request, "_product_patches", None)
+        if patches is None or not change:
+            return super().save_model(request, obj, form, change)
+        patches.append({"id": obj.pk, "price": obj.price, "stock": obj.stock})
+
     def image_preview(self, obj):
         if obj.image:
             return format_html(
@@ -49,17 +109,32 @@ class ProductAdmin(HideForStaffMixin, admin.ModelAdmin):
 
 # Cart and its elements
 @admin.register(Cart)
-class CartAdmin(HideForStaffMixin, admin.ModelAdmin):
-    list_display = ("user", "created_at")
-    readonly_fields = ("created_at",)
+class CartAdmin(HideForStaffMixin, LargeTableMixin, admin.ModelAdmin):
+    list_display = ("user", "item_count", "total", "created_at")
+    raw_id_fields = ("user",)
+    readonly_fields = ("created_at", "item_count", "total")
 
 
 @admin.register(CartItem)
-class CartItemAdmin(HideForStaffMixin, admin.ModelAdmin):
+class CartItemAdmin(HideForStaffMixin, LargeTableMixin, admin.ModelAdmin):
     list_display = ("cart", "product", "quantity")
-    list_select_related = ("product", "cart")
+    raw_id_fields = ("cart", "product")
     list_per_page = 20
 
+    def save_model(self, request, obj, form, change):
+        old_cart_id = form.initial.get("cart")
+        super().save_model(request, obj, form, change)
+        carts.refresh(obj.cart_id, old_cart_id)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        carts.refresh(obj.cart_id)
+
+    def delete_queryset(self, request, queryset):
+        cart_ids = set(queryset.values_list("cart_id", flat=True))
+        super().delete_queryset(request, queryset)
+        carts.refresh(*cart_ids)
+
 
 # Inline editor for order items
 class OrderItemForm(forms.ModelForm):
@@ -87,6 +162,7 @@ class OrderItemInline(admin.TabularInline):
     model = OrderItem
     form = OrderItemForm
     extra = 1
+    raw_id_fields = ("product",)
 
     def has_add_permission(self, request, obj=None):
         return (
@@ -115,11 +191,14 @@ class OrderItemInline(admin.TabularInline):
 
 # Orders
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(LargeTableMixin, admin.ModelAdmin):
     list_display = ("id", "user", "ordered_at", "status", "total_price")
     list_filter = ("status", "ordered_at")
+    # Drills down by year, month and day over the ordered_at index
+    date_hierarchy = "ordered_at"
+    # icontains on each of these, and on the buyer's username, is served by
+    # a trigram index on PostgreSQL (migration 0013); see get_search_results
     search_fields = (
-        "user__username",
         "first_name",
         "last_name",
         "address",
@@ -149,20 +228,99 @@ class OrderAdmin(admin.ModelAdmin):
     )
     inlines = [OrderItemInline]
     list_per_page = 20
-    actions = ["mark_completed", "mark_cancelled"]
+    actions = ["mark_completed", "mark_cancelled", "export_csv"]
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Every term matches an order's own search fields or its buyer's
+        username. Django's search ORs them all into one condition across
+        the join to auth_user, which no index can serve; here each term is
+        the union of the two lookups, each using its own trigram indexes.
+        """
+        for term in smart_split(search_term):
+            if term.startswith(('"', "'")) and term[0] == term[-1]:
+                term = unescape_string_literal(term)
+            by_fields = Order.objects.filter(
+                models.Q(
+                    *[(f"{name}__icontains", term) for name in self.search_fields],
+                    _connector=models.Q.OR,
+                )
+            )
+            by_username = Order.objects.filter(
+                user__in=User.objects.filter(username__icontains=term).values("pk")
+            )
+            queryset = queryset.filter(
+                pk__in=by_fields.order_by()
+                .values("pk")
+                .union(by_username.order_by().values("pk"))
+            )
+        return queryset, False
 
     def mark_completed(self, request, queryset):
-        updated = queryset.update(status="COMPLETED")
+        pks = list(queryset.values_list("pk", flat=True))
+        updated = Order.objects.filter(pk__in=pks).update(
+            status="COMPLETED", updated_at=timezone.now()
+        )
+        changes.record(ChangeLogEntry.ORDER, ChangeLogEntry.UPDATED, pks)
         self.message_user(request, f"{updated} order(s) marked as completed.")
 
     mark_completed.short_description = "Mark selected orders as Completed"
 
     def mark_cancelled(self, request, queryset):
-        updated = queryset.update(status="CANCELLED")
+        # Returns the ordered quantities to stock through the ledger
+        updated = inventory.cancel_orders(queryset)
         self.message_user(request, f"{updated} order(s) marked as cancelled.")
 
     mark_cancelled.short_description = "Mark selected orders as Cancelled"
 
+    def export_csv(self, request, queryset):
+        return self.csv_response(queryset)
+
+    export_csv.short_description = "Export selected orders as CSV"
+    export_csv.allowed_permissions = ("view",)
+
+    def get_urls(self):
+        return [
+            path(
+                "export/",
+                self.admin_site.admin_view(self.export_view),
+                name="store_order_export",
+            )
+        ] + super().get_urls()
+
+    def export_view(self, request):
+        """
+        The changelist's current filters and search, exported whole (the
+        "Export CSV" button on the changelist links here).
+        """
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        try:
+            changelist = self.get_changelist_instance(request)
+        except IncorrectLookupParameters:
+            return redirect("admin:store_order_changelist")
+        return self.csv_response(changelist.queryset)
+
+    def csv_response(self, queryset):
+        # One line per order item, read in chunks (see store.exports)
+        response = StreamingHttpResponse(
+            exports.export("orders", "csv", queryset), content_type="text/csv"
+        )
+        response["Content-Disposition"] = 'attachment; filename="orders.csv"'
+        return response
+
+    def save_model(self, request, obj, form, change):
+        cancelling = (
+            change and "status" in form.changed_data and obj.status == "CANCELLED"
+        )
+        if cancelling:
+            # Let cancel_orders() flip the status so stock is returned once
+            obj.status = form.initial["status"]
+        super().save_model(request, obj, form, change)
+        if cancelling:
+            inventory.cancel_orders([obj])
+            obj.status = "CANCELLED"
+
     def get_readonly_fields(self, request, obj=None):
         if is_staff_user(request):
             return list(self.readonly_fields)
@@ -180,4 +338,4 @@ class OrderAdmin(admin.ModelAdmin):
         return False
 
     def has_change_permission(self, request, obj=None):
-        return request.user.has_perm("store.change_order")
+        return authz.resolve(request).has_perm("store.change_order")
@@ -0,0 +1,186 @@
+"""
+JWT authentication without a database round trip per request.
+
+simplejwt's JWTAuthentication fetches the user on every request. Here the
+user (their fields and permissions) is kept in a per-process cache for
+JWT_USER_CACHE_TTL seconds and rebuilt from it, and revoked tokens are
+checked against a local copy of the token blacklist, reloaded every
+JWT_BLACKLIST_REFRESH seconds. An API call with a valid access token
+therefore needs no query to authenticate.
+
+Changes to a user, their groups or permissions drop them from this
+process's cache straight away (see store.signals); other processes pick
+them up within the TTL, as they do newly blacklisted tokens.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+from rest_framework_simplejwt.utils import datetime_from_epoch, get_md5_hash_password
+
+PERM_CACHES = ("_perm_cache", "_user_perm_cache", "_group_perm_cache")
+
+
+class UserCache:
+    """
+    {user id: (loaded at, field values, permission caches)}, rebuilt into
+    a fresh User instance on every hit so requests never share one.
+    Expired entries are dropped on insert, at most once per TTL, so the
+    cache holds about the users seen within the last two TTLs.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.pruned_at = time.monotonic()
+
+    def get(self, user_id):
+        now = time.monotonic()
+        entry = self.entries.get(user_id)
+        if entry is None or now - entry[0] > settings.JWT_USER_CACHE_TTL:
+            self.prune(now)
+            entry = self.entries[user_id] = self.load(user_id)
+        _, values, perms = entry
+        UserModel = get_user_model()
+        user = UserModel.from_db(
+            DEFAULT_DB_ALIAS,
+            [f.attname for f in UserModel._meta.concrete_fields],
+            values,
+        )
+        for name, cached in zip(PERM_CACHES, perms):
+            setattr(user, name, set(cached))
+        return user
+
+    def load(self, user_id):
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.get(
+                **{api_settings.USER_ID_FIELD: user_id}
+            )
+        except UserModel.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        # Fills the backends' permission caches on the instance
+        user.get_all_permissions()
+        values = [getattr(user, f.attname) for f in UserModel._meta.concrete_fields]
+        perms = [frozenset(getattr(user, name, ())) for name in PERM_CACHES]
+        return time.monotonic(), values, perms
+
+    def prune(self, now):
+        ttl = settings.JWT_USER_CACHE_TTL
+        if now - self.pruned_at > ttl:
+            self.entries = {
+                user_id: entry
+                for user_id, entry in self.entries.items()
+                if now - entry[0] <= ttl
+            }
+            self.pruned_at = now
+
+    def forget(self, user_id=None):
+        if user_id is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(user_id, None)
+
+
+class TokenBlacklist:
+    """
+    The jtis of blacklisted, unexpired tokens. A refresh reloads all of
+    them: ids are handed out at insert time, so a row with a lower id than
+    the last one seen can still commit later, and the unexpired tokens
+    are few anyway.
+    """
+
+    def __init__(self):
+        self.expiry = {}
+        self.loaded_at = None
+        self.lock = threading.Lock()
+
+    def __contains__(self, jti):
+        if (
+            self.loaded_at is None
+            or time.monotonic() - self.loaded_at > settings.JWT_BLACKLIST_REFRESH
+        ):
+            self.refresh()
+        return jti in self.expiry
+
+    def refresh(self):
+        with self.lock:
+            self.expiry = dict(
+                BlacklistedToken.objects.filter(
+                    token__expires_at__gt=timezone.now()
+                ).values_list("token__jti", "token__expires_at")
+            )
+            self.loaded_at = time.monotonic()
+
+    def add(self, jti, expires_at):
+        self.expiry[jti] = expires_at
+
+    def reset(self):
+        with self.lock:
+            self.expiry, self.loaded_at = {}, None
+
+
+users = UserCache()
+blacklist = TokenBlacklist()
+
+
+def revoke(token):
+    """
+    Blacklists an access token, which simplejwt only does for refresh
+    tokens, so it is refused before it expires.
+    """
+    jti = token[api_settings.JTI_CLAIM]
+    expires_at = datetime_from_epoch(token["exp"])
+    outstanding, _ = OutstandingToken.objects.get_or_create(
+        jti=jti,
+        defaults={
+            "user_id": token.get(api_settings.USER_ID_CLAIM),
+            "token": str(token),
+            "created_at": timezone.now(),
+            "expires_at": expires_at,
+        },
+    )
+    BlacklistedToken.objects.get_or_create(token=outstanding)
+    blacklist.add(jti, expires_at)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that checks the local token blacklist and takes the
+    user from the local user cache.
+    """
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if token.get(api_settings.JTI_CLAIM) in blacklist:
+            raise InvalidToken(_("Token is blacklisted"))
+        return token
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = users.get(user_id)
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(
+                _("The user's password has been changed."), code="password_changed"
+            )
+        return user
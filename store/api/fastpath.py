@@ -0,0 +1,181 @@
+"""
+values() fast path for hot list endpoints.
+
+When every field a serializer renders is a column (plain model fields,
+primary-key relations, dotted sources and nested serializers over foreign
+keys), ValuesListMixin lists straight from ``.values()`` rows: no model
+instances are built and the serializer's fields are resolved once per
+response, not once per row. Each value still goes through the field's
+own to_representation(), so the output is the same as the regular path.
+A SerializerMethodField can join in by naming the columns it reads in
+``Meta.values_methods`` and providing ``<method>_from_values(*values)``;
+anything else falls back to the regular path.
+"""
+
+from django.db import models
+from django.db.models import QuerySet
+from rest_framework import serializers
+from rest_framework.relations import PKOnlyObject, RelatedField
+from rest_framework.response import Response
+
+from store.pagination import ordering_of
+
+from .optimizer import _field, _is_forward
+
+# Serializer fields whose to_representation() returns the database value
+# of these columns unchanged, so the fast path copies it as it is
+PASS_THROUGH = {
+    serializers.CharField: (models.CharField, models.TextField),
+    serializers.IntegerField: (models.IntegerField,),
+    serializers.BooleanField: (models.BooleanField,),
+}
+
+
+def _column_reader(field, column):
+    def read(row):
+        value = row[column]
+        return None if value is None else field.to_representation(value)
+
+    return read
+
+
+def _file_reader(field, model_field, column):
+    def read(row):
+        if not row[column]:
+            return None
+        return field.to_representation(
+            model_field.attr_class(None, model_field, row[column])
+        )
+
+    return read
+
+
+def _pk_reader(field, column):
+    def read(row):
+        value = row[column]
+        return None if value is None else field.to_representation(PKOnlyObject(value))
+
+    return read
+
+
+def _nested_reader(readers, column):
+    def read(row):
+        if row[column] is None:
+            return None
+        return _render(readers, row)
+
+    return read
+
+
+def _method_reader(method, needed):
+    def read(row):
+        return method(*[row[column] for column in needed])
+
+    return read
+
+
+def _readers(serializer, model, prefix, columns):
+    """
+    [(field name, column, row -> representation)] for ``serializer``,
+    adding the columns it needs to ``columns``; the reader is None where
+    the column is copied as it is. None if some field is not a column.
+    """
+    meta = getattr(serializer, "Meta", None)
+    methods = getattr(meta, "values_methods", {})
+    readers = []
+    for field in serializer._readable_fields:
+        if isinstance(field, serializers.SerializerMethodField):
+            method = getattr(serializer, f"{field.method_name}_from_values", None)
+            if field.field_name not in methods or method is None:
+                return None
+            needed = [prefix + column for column in methods[field.field_name]]
+            columns.extend(needed)
+            readers.append((field.field_name, None, _method_reader(method, needed)))
+            continue
+        if field.source == "*":
+            return None
+        *hops, name = field.source_attrs
+        level, path = model, prefix
+        for hop in hops:
+            relation = _field(level, hop)
+            if not _is_forward(relation):
+                return None
+            level, path = relation.related_model, f"{path}{hop}__"
+        model_field = _field(level, name)
+        if model_field is None or model_field.many_to_many or model_field.one_to_many:
+            return None
+        column = path + name
+        columns.append(column)
+
+        if isinstance(field, serializers.BaseSerializer):
+            if isinstance(field, serializers.ListSerializer) or not _is_forward(
+                model_field
+            ):
+                return None
+            nested = _readers(field, model_field.related_model, f"{column}__", columns)
+            if nested is None:
+                return None
+            readers.append((field.field_name, None, _nested_reader(nested, column)))
+        elif isinstance(field, RelatedField):
+            if not field.use_pk_only_optimization():
+                return None
+            readers.append((field.field_name, None, _pk_reader(field, column)))
+        elif isinstance(field, serializers.FileField):
+            readers.append(
+                (field.field_name, None, _file_reader(field, model_field, column))
+            )
+        elif model_field.is_relation:
+            return None
+        elif isinstance(model_field, PASS_THROUGH.get(type(field), ())):
+            readers.append((field.field_name, column, None))
+        else:
+            readers.append((field.field_name, None, _column_reader(field, column)))
+    return readers
+
+
+def _render(readers, row):
+    return {
+        name: row[column] if reader is None else reader(row)
+        for name, column, reader in readers
+    }
+
+
+def values_plan(serializer, model):
+    """
+    Returns (columns, row -> dict) for rendering ``model`` rows with
+    ``serializer`` from values(), or None if it cannot be done.
+    """
+    columns = []
+    readers = _readers(serializer, model, "", columns)
+    if readers is None:
+        return None
+
+    def render(row):
+        return _render(readers, row)
+
+    return list(dict.fromkeys(columns)), render
+
+
+class ValuesListMixin:
+    """
+    For viewsets: list() through values_plan() when the serializer
+    allows it, the regular list() otherwise.
+    """
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        plan = None
+        if isinstance(queryset, QuerySet):
+            plan = values_plan(self.get_serializer(), queryset.model)
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+
+        columns, render = plan
+        queryset = self.filter_queryset(queryset)
+        # Keyset pagination reads its cursor from the ordering columns
+        ordering = [name for name, _ in ordering_of(queryset)]
+        rows = queryset.values(*dict.fromkeys(columns + ordering))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response([render(row) for row in page])
+        return Response([render(row) for row in rows])
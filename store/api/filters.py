@@ -0,0 +1,48 @@
+from rest_framework import filters
+from rest_framework.settings import api_settings
+
+from store.catalog import filter_products, parse_filters
+from store.search import search_products
+
+
+class CatalogFilter(filters.BaseFilterBackend):
+    """
+    ?category=<id>, ?min_price=, ?max_price= and ?in_stock=true, parsed
+    the same way as on the HTML catalog. Invalid values are ignored.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = parse_filters(request.query_params)
+        # Text search is ProductSearchFilter's job
+        params["q"] = ""
+        return filter_products(queryset, params)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": name,
+                "required": False,
+                "in": "query",
+                "schema": {"type": kind},
+            }
+            for name, kind in (
+                ("category", "integer"),
+                ("min_price", "number"),
+                ("max_price", "number"),
+                ("in_stock", "boolean"),
+            )
+        ]
+
+
+class ProductSearchFilter(filters.BaseFilterBackend):
+    """
+    ?search=<words> backed by the full-text index, most relevant first.
+    """
+
+    search_param = api_settings.SEARCH_PARAM
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, "").strip()
+        if not query:
+            return queryset
+        return search_products(queryset, query).order_by("-search_rank", "name", "id")
@@ -0,0 +1,104 @@
+"""
+Idempotency-Key support for unsafe API requests.
+
+The first request with a given key runs inside one transaction together
+with the IdempotencyKey row that records its response, so either both
+are saved or neither is and the client may simply retry. Later requests
+with the same key get the stored response back: from the cache without
+touching the database, or from the row if the cache lost it. Reusing a
+key for a different request is rejected with 422.
+"""
+
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from store.models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+REPLAY_HEADER = "Idempotent-Replayed"
+
+
+def fingerprint(request):
+    payload = json.dumps(
+        [request.method, request.path, request.data], sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _cache_key(user_id, key):
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return f"idempotency:{user_id}:{digest}"
+
+
+def _replay(stored, request_fingerprint):
+    if stored["fingerprint"] != request_fingerprint:
+        return Response(
+            {"detail": f"{HEADER} was already used for a different request."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    return Response(
+        stored["response"],
+        status=stored["status_code"],
+        headers={REPLAY_HEADER: "true"},
+    )
+
+
+def run_once(request, key, handler):
+    """
+    Returns ``handler()``'s response for the first request with ``key``
+    and replays it for the ones after. If the handler raises, nothing is
+    stored and the key can be used again.
+    """
+    request_fingerprint = fingerprint(request)
+    cache_key = _cache_key(request.user.pk, key)
+    stored = cache.get(cache_key)
+    if stored is not None:
+        return _replay(stored, request_fingerprint)
+
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    user=request.user, key=key, fingerprint=request_fingerprint
+                )
+        except IntegrityError:
+            # A retry, possibly one that waited for the first request to
+            # commit
+            stored = (
+                IdempotencyKey.objects.filter(user=request.user, key=key)
+                .values("fingerprint", "status_code", "response")
+                .get()
+            )
+        else:
+            response = handler()
+            record.status_code = response.status_code
+            record.response = response.data
+            record.save(update_fields=["status_code", "response"])
+            stored = {
+                "fingerprint": record.fingerprint,
+                "status_code": record.status_code,
+                "response": record.response,
+            }
+            transaction.on_commit(
+                lambda: cache.set(cache_key, stored, settings.IDEMPOTENCY_KEY_TTL)
+            )
+            return response
+
+    cache.set(cache_key, stored, settings.IDEMPOTENCY_KEY_TTL)
+    return _replay(stored, request_fingerprint)
+
+
+def purge_expired():
+    """
+    Deletes keys older than IDEMPOTENCY_KEY_TTL; returns how many.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    return IdempotencyKey.objects.filter(created_at__lt=cutoff).delete()[0]
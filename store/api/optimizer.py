@@ -0,0 +1,163 @@
+"""
+Queryset planning from serializer field trees.
+
+QuerysetOptimizerMixin walks the viewset's serializer and applies the
+select_related(), prefetch_related() and only() its fields need, so
+nested serializers read related rows in a fixed number of queries instead
+of one (or two) per object. Fields whose needs cannot be known, such as
+SerializerMethodField or model properties, load the whole row of their
+model; anything that cannot be expressed safely turns only() off.
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch, QuerySet
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.relations import ManyRelatedField, RelatedField
+
+
+class QueryPlan:
+    def __init__(self):
+        self.select = []
+        self.prefetch = []
+        # None once some field needs something only() cannot express
+        self.only = []
+
+    def need(self, path):
+        if self.only is not None and path not in self.only:
+            self.only.append(path)
+
+    def need_all(self, model, prefix):
+        for field in model._meta.concrete_fields:
+            self.need(prefix + field.name)
+
+
+def _field(model, name):
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+
+
+def _is_forward(field):
+    return (
+        field is not None and field.concrete and (field.many_to_one or field.one_to_one)
+    )
+
+
+def _is_many(field):
+    return field is not None and (field.one_to_many or field.many_to_many)
+
+
+def _walk(serializer, model, prefix, plan, restrict):
+    """
+    Adds what ``serializer`` needs to render ``model`` rows, reached from
+    the root queryset through ``prefix``, to ``plan``.
+    """
+    plan.need(prefix + model._meta.pk.name)
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if field.source == "*":
+            # SerializerMethodField and friends get the whole object
+            plan.need_all(model, prefix)
+            continue
+
+        *hops, name = field.source_attrs
+        level, level_prefix = model, prefix
+        for hop in hops:
+            relation = _field(level, hop)
+            if not _is_forward(relation):
+                plan.need_all(level, level_prefix)
+                break
+            plan.select.append(level_prefix + hop)
+            plan.need(level_prefix + hop)
+            level, level_prefix = relation.related_model, f"{level_prefix}{hop}__"
+        else:
+            _walk_field(field, level, level_prefix, name, plan, restrict)
+
+
+def _walk_field(field, model, prefix, name, plan, restrict):
+    model_field = _field(model, name)
+    path = prefix + name
+
+    if model_field is None:
+        # A property or method of the model
+        plan.need_all(model, prefix)
+    elif isinstance(field, (serializers.ListSerializer, ManyRelatedField)):
+        if not _is_many(model_field):
+            plan.need_all(model, prefix)
+            return
+        child = getattr(field, "child", None) or field.child_relation
+        related = model_field.related_model
+        queryset = related._default_manager.all()
+        if isinstance(child, serializers.BaseSerializer):
+            queryset = plan_queryset(queryset, child, model_field, restrict)
+        plan.prefetch.append(Prefetch(path, queryset=queryset))
+    elif isinstance(field, serializers.BaseSerializer):
+        if not model_field.is_relation:
+            plan.need(path)
+            return
+        plan.select.append(path)
+        if _is_forward(model_field):
+            plan.need(path)
+            _walk(field, model_field.related_model, f"{path}__", plan, restrict)
+        else:
+            # Reverse one-to-one: only() cannot reach through it
+            plan.only = None
+    elif isinstance(field, RelatedField):
+        plan.need(path)
+        if not field.use_pk_only_optimization() and model_field.is_relation:
+            plan.select.append(path)
+            plan.need_all(model_field.related_model, f"{path}__")
+    else:
+        plan.need(path)
+
+
+def plan_queryset(queryset, serializer, parent_field=None, restrict=True):
+    """
+    Returns ``queryset`` with the related lookups ``serializer`` needs,
+    limited with only() to the columns it reads unless ``restrict`` is
+    False. ``parent_field`` is the relation a prefetched queryset hangs
+    off, whose foreign key must stay loaded.
+    """
+    plan = QueryPlan()
+    if not restrict:
+        plan.only = None
+    _walk(serializer, queryset.model, "", plan, restrict)
+    if parent_field is not None and parent_field.one_to_many:
+        plan.need(parent_field.field.name)
+    elif parent_field is not None:
+        plan.only = None
+
+    if plan.select:
+        queryset = queryset.select_related(*plan.select)
+    if plan.prefetch:
+        queryset = queryset.prefetch_related(*plan.prefetch)
+    if plan.only is not None:
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        for name in ordering:
+            name = name.lstrip("-")
+            if "__" not in name and _field(queryset.model, name) is not None:
+                plan.need(name)
+        queryset = queryset.only(*plan.only)
+    return queryset
+
+
+class QuerysetOptimizerMixin:
+    """
+    For viewsets: plans the filtered queryset from the serializer, so the
+    ordering added by filter backends is known too. only() is used for
+    reads alone, since a partially loaded instance would make the Product
+    signals fall back to full recounts when saved.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if not isinstance(queryset, QuerySet):
+            return queryset
+        return plan_queryset(
+            queryset,
+            self.get_serializer(),
+            restrict=self.request.method in SAFE_METHODS,
+        )
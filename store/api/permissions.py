@@ -1,5 +1,7 @@
 from rest_framework import permissions
 
+from store import authz
+
 
 class IsStaffOrOwner(permissions.BasePermission):
     def has_permission(self, request, view):
@@ -7,7 +9,7 @@ class IsStaffOrOwner(permissions.BasePermission):
 
     def has_object_permission(self, request, view, obj):
         user = request.user
-        is_staff = user.has_perm("store.change_order")
+        is_staff = authz.resolve(request).has_perm("store.change_order")
 
         if view.action == "retrieve":
             return is_staff or obj.user == user
@@ -12,6 +12,7 @@ def api_root(request, format=None):
             "products": reverse("product-list", request=request, format=format),
             "cart": reverse("cart-list", request=request, format=format),
             "orders": reverse("order-list", request=request, format=format),
+            "changes": reverse("change-feed", request=request, format=format),
             # DRF session auth
             "login": reverse("rest_framework:login", request=request, format=format),
             "logout": reverse("rest_framework:logout", request=request, format=format),
@@ -20,5 +21,6 @@ def api_root(request, format=None):
                 "token_obtain_pair", request=request, format=format
             ),
             "token_refresh": reverse("token_refresh", request=request, format=format),
+            "token_logout": reverse("token_logout", request=request, format=format),
         }
     )
@@ -1,18 +1,50 @@
 from django.contrib.auth.models import User
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 
 from accounts.models import Profile
 from store.models import CartItem, Category, Order, OrderItem, Product
-
-
-class CategorySerializer(serializers.ModelSerializer):
+from store.pricing import line_subtotal
+
+
+class SparseFieldsMixin:
+    """
+    ?fields=id,name keeps only the listed fields of a response, ?omit=
+    drops some. Applies to reads and to the top-level serializer only;
+    unknown names are ignored. The queryset planner then selects just the
+    columns that are left.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get("request")
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        if request is None or parent is not None or request.method not in SAFE_METHODS:
+            return fields
+        wanted = _names(request.query_params.get("fields"))
+        omitted = _names(request.query_params.get("omit"))
+        return {
+            name: field
+            for name, field in fields.items()
+            if (not wanted or name in wanted) and name not in omitted
+        }
+
+
+def _names(param):
+    return {name.strip() for name in (param or "").split(",") if name.strip()}
+
+
+class CategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ["id", "name", "slug"]
 
 
-class ProductSerializer(serializers.ModelSerializer):
-    category = serializers.StringRelatedField(read_only=True)
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    # The category's name; a plain column, unlike str(category)
+    category = serializers.CharField(source="category.name", read_only=True)
     category_id = serializers.PrimaryKeyRelatedField(
         queryset=Category.objects.all(), source="category", write_only=True
     )
@@ -31,6 +63,23 @@ class ProductSerializer(serializers.ModelSerializer):
         ]
 
 
+class ProductPatchSerializer(serializers.Serializer):
+    """
+    One row of a bulk price / stock update.
+    """
+
+    id = serializers.IntegerField()
+    price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=0, required=False
+    )
+    stock = serializers.IntegerField(min_value=0, max_value=2**31 - 1, required=False)
+
+    def validate(self, attrs):
+        if "price" not in attrs and "stock" not in attrs:
+            raise serializers.ValidationError("Give a price, a stock or both.")
+        return attrs
+
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -53,7 +102,23 @@ class ProfileSerializer(serializers.ModelSerializer):
         ]
 
 
-class CartItemSerializer(serializers.ModelSerializer):
+class CartOpSerializer(serializers.Serializer):
+    """
+    One cart operation: set a line to ``quantity`` (0 removes it) or
+    change it by ``delta``.
+    """
+
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=0, required=False)
+    delta = serializers.IntegerField(required=False)
+
+    def validate(self, attrs):
+        if ("quantity" in attrs) == ("delta" in attrs):
+            raise serializers.ValidationError("Give either a quantity or a delta.")
+        return attrs
+
+
+class CartItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
     product_id = serializers.PrimaryKeyRelatedField(
         queryset=Product.objects.all(), source="product", write_only=True
@@ -63,9 +128,14 @@ class CartItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = CartItem
         fields = ["id", "product", "product_id", "quantity", "subtotal"]
+        # Columns read by subtotal_from_values() on the values() fast path
+        values_methods = {"subtotal": ["product__price", "quantity"]}
 
     def get_subtotal(self, obj):
-        return obj.product.price * obj.quantity
+        return line_subtotal(obj.product, obj.quantity)
+
+    def subtotal_from_values(self, price, quantity):
+        return price * quantity
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -76,8 +146,8 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = ["id", "product", "quantity", "price_at_order"]
 
 
-class OrderSerializer(serializers.ModelSerializer):
-    items = OrderItemSerializer(many=True, read_only=True, source="orderitem_set")
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    items = OrderItemSerializer(many=True, read_only=True, source="order_items")
 
     class Meta:
         model = Order
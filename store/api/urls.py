@@ -6,7 +6,14 @@ from rest_framework_simplejwt.views import (
 )
 
 from .root import api_root
-from .views import CartViewSet, CategoryViewSet, OrderViewSet, ProductViewSet
+from .views import (
+    CartViewSet,
+    CategoryViewSet,
+    ChangeFeedView,
+    LogoutView,
+    OrderViewSet,
+    ProductViewSet,
+)
 
 router = DefaultRouter()
 router.register("categories", CategoryViewSet, basename="category")
@@ -17,9 +24,11 @@ router.register("orders", OrderViewSet, basename="order")
 urlpatterns = [
     path("", api_root, name="api-root"),
     path("", include(router.urls)),
+    path("changes/", ChangeFeedView.as_view(), name="change-feed"),
     # DRF session login/logout
     path("auth/", include("rest_framework.urls", namespace="rest_framework")),
     # JWT endpoints
     path("token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
     path("token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
+    path("token/logout/", LogoutView.as_view(), name="token_logout"),
 ]
@@ -1,39 +1,167 @@
-from rest_framework import permissions, status, viewsets
+from django.http import StreamingHttpResponse
+from rest_framework import filters, permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.tokens import RefreshToken
 
-from store.models import Cart, CartItem, Category, Order, OrderItem, Product
+from store import (
+    authz,
+    bulk,
+    carts,
+    changes,
+    exports,
+    inventory,
+    pricing,
+    reservations,
+)
+from store.catalog import parse_filters
+from store.conditional import (
+    api_condition,
+    category_versions,
+    listing_versions,
+    product_versions,
+)
+from store.facets import get_facets
+from store.models import Cart, CartItem, Category, ChangeLogEntry, Order, Product
+from store.orders import OutOfStock, place_order
+from store.reservations import InsufficientStock
 
+from . import authentication, idempotency
+from .fastpath import ValuesListMixin
+from .filters import CatalogFilter, ProductSearchFilter
+from .optimizer import QuerysetOptimizerMixin, plan_queryset
+from .pagination import KeysetPagination
 from .permissions import IsStaffOrOwner
 from .serializers import (
     CartItemSerializer,
+    CartOpSerializer,
     CategorySerializer,
     OrderSerializer,
+    ProductPatchSerializer,
     ProductSerializer,
 )
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+def export_response(request, dataset, queryset):
+    """
+    Streams ``dataset`` as ?as=ndjson (the default) or ?as=csv.
+    """
+    fmt = request.query_params.get("as", "ndjson")
+    if fmt not in exports.FORMATS:
+        raise ValidationError({"as": [f"Choose one of: {', '.join(exports.FORMATS)}."]})
+    content_type, _ = exports.FORMATS[fmt]
+    response = StreamingHttpResponse(
+        exports.export(dataset, fmt, queryset), content_type=content_type
+    )
+    response["Content-Disposition"] = f'attachment; filename="{dataset}.{fmt}"'
+    return response
+
+
+class CategoryViewSet(QuerysetOptimizerMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [permissions.DjangoModelPermissionsOrAnonReadOnly]
 
+    @api_condition(category_versions)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
 
-class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.select_related("category").all()
+    @api_condition(category_versions)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+
+class ProductViewSet(ValuesListMixin, QuerysetOptimizerMixin, viewsets.ModelViewSet):
+    queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [permissions.DjangoModelPermissionsOrAnonReadOnly]
-    filterset_fields = ["category", "price", "stock"]
-    search_fields = ["name", "description"]
+    # Filters first, then search ranking, then an explicit ?ordering=
+    # (which replaces the relevance order); keyset pagination adds the id
+    # tie-breaker. The indexes behind these are declared on Product.
+    filter_backends = [CatalogFilter, ProductSearchFilter, filters.OrderingFilter]
+    ordering_fields = ["name", "price", "stock", "id"]
+    pagination_class = KeysetPagination
+    max_bulk_size = 5000
+
+    @api_condition(listing_versions)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @api_condition(product_versions)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
-    pagination_class = None
+    @action(detail=False, methods=["get"])
+    def facets(self, request):
+        """
+        Facet counts for the same filters the HTML catalog understands:
+        ?search=, ?category=, ?min_price=, ?max_price=, ?in_stock=true.
+        """
+        params = request.query_params.copy()
+        params.setdefault("q", params.get("search", ""))
+        counts = get_facets(parse_filters(params))
+        names = dict(Category.objects.values_list("id", "name"))
+        return Response(
+            {
+                "categories": [
+                    {"id": pk, "name": name, "count": counts["categories"].get(pk, 0)}
+                    for pk, name in names.items()
+                ],
+                "price_bands": counts["price_bands"],
+                "in_stock": counts["in_stock"],
+                "out_of_stock": counts["out_of_stock"],
+            }
+        )
+
+    @action(detail=False, methods=["patch"], url_path="bulk")
+    def bulk_update(self, request):
+        """
+        PATCH a list of {"id", "price", "stock"} rows (price or stock may
+        be left out). Either every row is valid and all are applied in one
+        transaction, or nothing is and the errors come back per row.
+        """
+        serializer = ProductPatchSerializer(
+            data=request.data, many=True, max_length=self.max_bulk_size
+        )
+        serializer.is_valid(raise_exception=True)
+        patches = serializer.validated_data
+        seen, repeated = set(), set()
+        for patch in patches:
+            (repeated if patch["id"] in seen else seen).add(patch["id"])
+        if repeated:
+            return Response(
+                {"detail": "Each product may appear once.", "ids": sorted(repeated)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            results = bulk.apply_product_patches(patches)
+        except bulk.UnknownProducts as exc:
+            return Response(
+                {"detail": str(exc), "ids": exc.ids},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(
+            {"results": [{"id": pk, "status": result} for pk, result in results]}
+        )
+
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        """
+        The whole (filtered) catalog, streamed: same filters, search and
+        ordering as the list, without pagination.
+        """
+        return export_response(
+            request, "products", self.filter_queryset(self.get_queryset())
+        )
 
 
-class CartViewSet(viewsets.ModelViewSet):
+class CartViewSet(ValuesListMixin, QuerysetOptimizerMixin, viewsets.ModelViewSet):
     serializer_class = CartItemSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    max_batch_size = 200
 
     def get_queryset(self):
         if self.request.user.is_authenticated:
@@ -45,43 +173,192 @@ class CartViewSet(viewsets.ModelViewSet):
         # handle guest session cart separately or error
         return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
+    @action(detail=False, methods=["post"])
+    def batch(self, request):
+        """
+        POST a list of {"product_id", "quantity"} / {"product_id", "delta"}
+        operations. They are folded per product and applied in one
+        transaction; the response is the whole cart afterwards.
+        """
+        serializer = CartOpSerializer(
+            data=request.data, many=True, max_length=self.max_batch_size
+        )
+        serializer.is_valid(raise_exception=True)
+        try:
+            priced = carts.apply_ops(request, serializer.validated_data)
+        except InsufficientStock as exc:
+            raise ValidationError({"quantity": [str(exc)]})
+        except Product.DoesNotExist as exc:
+            raise ValidationError({"product_id": [str(exc)]})
+        items = CartItemSerializer(
+            priced.items(), many=True, context=self.get_serializer_context()
+        )
+        return Response(
+            {
+                "items": items.data,
+                "item_count": priced.item_count,
+                "total": f"{priced.total:.2f}",
+            }
+        )
+
+    def _hold(self, cart, product, quantity):
+        try:
+            reservations.hold(product, quantity, cart=cart)
+        except InsufficientStock as exc:
+            raise ValidationError({"quantity": [str(exc)]})
+
     def perform_create(self, serializer):
         cart, _ = Cart.objects.get_or_create(user=self.request.user)
+        self._hold(
+            cart,
+            serializer.validated_data["product"],
+            serializer.validated_data.get("quantity", 1),
+        )
         serializer.save(cart=cart)
+        carts.refresh(cart)
+
+    def perform_update(self, serializer):
+        item = serializer.instance
+        self._hold(
+            item.cart,
+            serializer.validated_data.get("product", item.product),
+            serializer.validated_data.get("quantity", item.quantity),
+        )
+        serializer.save()
+        carts.refresh(item.cart_id)
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        reservations.release(cart=instance.cart_id, product_ids=[instance.product_id])
+        carts.refresh(instance.cart_id)
 
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(QuerysetOptimizerMixin, viewsets.ModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = [IsStaffOrOwner]
 
     def get_queryset(self):
-        user = self.request.user
-        if user.has_perm("store.change_order"):
+        if authz.resolve(self.request).has_perm("store.change_order"):
             return Order.objects.all()
-        return Order.objects.filter(user=user)
+        return Order.objects.filter(user=self.request.user)
+
+    def create(self, request, *args, **kwargs):
+        """
+        Places an order for the user's cart. With an Idempotency-Key header
+        a retried request gets the first response back instead of a second
+        order.
+        """
+        key = request.headers.get(idempotency.HEADER)
+        if not key or not request.user.is_authenticated:
+            return super().create(request, *args, **kwargs)
+        if len(key) > 255:
+            raise ValidationError(
+                {"detail": f"{idempotency.HEADER} is longer than 255 characters."}
+            )
+        return idempotency.run_once(
+            request,
+            key,
+            lambda: super(OrderViewSet, self).create(request, *args, **kwargs),
+        )
 
     def perform_create(self, serializer):
+        """
+        One transaction: conditional stock decrements, the order, a bulk
+        insert of its lines and the cart cleanup (see store.orders).
+        """
         user = self.request.user
-        cart_items = CartItem.objects.filter(cart__user=user)
-
-        total = sum(item.product.price * item.quantity for item in cart_items)
+        priced = pricing.price_cart(carts.user_cart(user))
+        if not priced:
+            raise ValidationError({"detail": "Your cart is empty."})
 
-        order = serializer.save(user=user, total_price=total)
+        data = dict(serializer.validated_data, status="PENDING")
+        try:
+            serializer.instance = place_order(Order(user=user, **data), priced.items())
+        except OutOfStock as exc:
+            raise ValidationError({"detail": str(exc)})
 
-        for item in cart_items:
-            OrderItem.objects.create(
-                order=order,
-                product=item.product,
-                quantity=item.quantity,
-                price_at_order=item.product.price,
-            )
-
-        cart_items.delete()
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        """
+        One row per order line of the orders the user can see, streamed.
+        """
+        return export_response(request, "orders", self.get_queryset())
 
     def update(self, request, *args, **kwargs):
         kwargs["partial"] = True
         return super().update(request, *args, **kwargs)
 
+    def perform_update(self, serializer):
+        order = serializer.instance
+        if (
+            serializer.validated_data.get("status") == "CANCELLED"
+            and order.status != "CANCELLED"
+        ):
+            # Let cancel_orders() flip the status so stock is returned once
+            serializer.validated_data.pop("status")
+            serializer.save()
+            inventory.cancel_orders([order])
+            order.status = "CANCELLED"
+            return
+        serializer.save()
+
+
+class ChangeFeedView(APIView):
+    """
+    GET /api/changes/?since=<cursor>: products (and, for order staff,
+    orders) created, updated or deleted since the cursor, in order and
+    with their current data. Start without ?since= and pass the
+    returned cursor next time; ``more`` says whether to ask again now.
+    """
+
+    permission_classes = [permissions.AllowAny]
+    max_limit = 1000
+
+    SERIALIZERS = {
+        ChangeLogEntry.PRODUCT: (Product, ProductSerializer),
+        ChangeLogEntry.ORDER: (Order, OrderSerializer),
+    }
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            since = int(params.get("since", 0))
+            limit = min(int(params.get("limit", 500)), self.max_limit)
+        except ValueError:
+            raise ValidationError({"detail": "since and limit must be integers."})
+        if since < 0 or limit < 1:
+            raise ValidationError({"detail": "since and limit must be positive."})
+
+        models = [ChangeLogEntry.PRODUCT]
+        if authz.resolve(request).has_perm("store.change_order"):
+            models.append(ChangeLogEntry.ORDER)
+        entries, cursor, more = changes.read(since, models, limit)
+
+        data = {}
+        for name, (model, serializer_class) in self.SERIALIZERS.items():
+            pks = [
+                pk
+                for kind, pk, change in entries
+                if kind == name and change != ChangeLogEntry.DELETED
+            ]
+            if not pks:
+                continue
+            serializer = serializer_class(context={"request": request})
+            queryset = plan_queryset(model.objects.filter(pk__in=pks), serializer)
+            for obj in queryset:
+                data[name, obj.pk] = serializer_class(
+                    obj, context={"request": request}
+                ).data
+
+        results = []
+        for kind, pk, change in entries:
+            record = data.get((kind, pk))
+            if record is None:
+                # Deleted since, by a change further down the log
+                change = ChangeLogEntry.DELETED
+            results.append({"model": kind, "id": pk, "action": change, "data": record})
+        return Response({"cursor": str(cursor), "more": more, "results": results})
+
 
 class LogoutView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -92,4 +369,7 @@ class LogoutView(APIView):
             return Response(status=status.HTTP_400_BAD_REQUEST)
         token = RefreshToken(refresh_token)
         token.blacklist()
+        if isinstance(request.successful_authenticator, JWTAuthentication):
+            # The access token is not blacklisted by simplejwt
+            authentication.revoke(request.auth)
         return Response(status=status.HTTP_205_RESET_CONTENT)
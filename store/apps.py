@@ -10,6 +10,7 @@ class StoreConfig(AppConfig):
         from django.contrib.contenttypes.models import ContentType
         from django.db.models.signals import post_migrate
 
+        from . import checks, signals  # noqa: F401
         from .models import Category, Order, Product
 
         def create_groups(sender, **kwargs):
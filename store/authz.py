@@ -0,0 +1,70 @@
+"""
+Request-scoped roles and permissions.
+
+The admin asks whether the user is in the Staff group and which model
+permissions they hold many times per page, and the API asks again for
+every object. resolve() loads the user's groups and permissions once per
+request, two queries at most, and fills the permission caches Django's
+ModelBackend keeps on the user, so user.has_perm() and the admin's own
+checks are answered from memory too.
+"""
+
+from django.contrib.auth.models import Group, Permission
+
+STAFF = "Staff"
+MANAGERS = "Managers"
+
+
+class Authz:
+    def __init__(self, user):
+        self.user = user
+        self.groups = frozenset()
+        if user.is_authenticated and user.is_active:
+            self._load()
+
+    def _load(self):
+        user = self.user
+        groups, group_perms = set(), set()
+        rows = Group.objects.filter(user=user).values_list(
+            "name", "permissions__content_type__app_label", "permissions__codename"
+        )
+        for name, app_label, codename in rows:
+            groups.add(name)
+            if codename is not None:
+                group_perms.add(f"{app_label}.{codename}")
+        self.groups = frozenset(groups)
+        # Superusers pass every has_perm() without looking at permissions;
+        # users from the JWT cache come with them loaded
+        if user.is_superuser or hasattr(user, "_perm_cache"):
+            return
+        user_perms = {
+            f"{app_label}.{codename}"
+            for app_label, codename in Permission.objects.filter(user=user).values_list(
+                "content_type__app_label", "codename"
+            )
+        }
+        user._user_perm_cache = user_perms
+        user._group_perm_cache = group_perms
+        user._perm_cache = user_perms | group_perms
+
+    def in_group(self, name):
+        return name in self.groups
+
+    def has_perm(self, perm):
+        return self.user.has_perm(perm)
+
+    @property
+    def is_staff_member(self):
+        return self.in_group(STAFF)
+
+
+def resolve(request):
+    """
+    The Authz of ``request.user``, loaded on first use in the request.
+    Works with Django and DRF requests alike.
+    """
+    request = getattr(request, "_request", request)
+    authz = getattr(request, "_authz", None)
+    if authz is None or authz.user is not request.user:
+        authz = request._authz = Authz(request.user)
+    return authz
@@ -0,0 +1,110 @@
+"""
+Bulk price and stock updates.
+
+apply_product_patches() writes a batch of changes with one
+``UPDATE ... SET price = CASE id WHEN ...`` per BATCH_SIZE rows, and then
+does for the whole batch what the Product signals do for a single save():
+ledger adjustments, facet counts, cart totals, cache versions and the
+change feed. The statement is built by hand because bulk_update() spends
+far longer resolving its When() expressions than the database spends
+running them.
+"""
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import caching, carts, changes, facets, inventory
+from .models import ChangeLogEntry, Product
+
+BATCH_SIZE = 1000
+
+UPDATED = "updated"
+UNCHANGED = "unchanged"
+
+
+def _write(rows, now):
+    """
+    Sets price, stock and updated_at for ``rows`` of (pk, price, stock).
+    """
+    qn = connection.ops.quote_name
+    table, pk = qn(Product._meta.db_table), qn(Product._meta.pk.column)
+    ops = connection.ops
+    now = ops.adapt_datetimefield_value(now)
+    # Five parameters per row
+    size = min(BATCH_SIZE, (connection.features.max_query_params or 5000) // 5)
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), size):
+            batch = rows[start : start + size]
+            whens = " ".join(["WHEN %s THEN %s"] * len(batch))
+            cursor.execute(
+                f"UPDATE {table} SET {qn('price')} = CASE {pk} {whens} END, "
+                f"{qn('stock')} = CASE {pk} {whens} END, {qn('updated_at')} = %s "
+                f"WHERE {pk} IN ({', '.join(['%s'] * len(batch))})",
+                [
+                    value
+                    for row_pk, price, _ in batch
+                    for value in (row_pk, ops.adapt_decimalfield_value(price, 10, 2))
+                ]
+                + [value for row_pk, _, stock in batch for value in (row_pk, stock)]
+                + [now]
+                + [row_pk for row_pk, _, _ in batch],
+            )
+
+
+class UnknownProducts(Exception):
+    def __init__(self, ids):
+        self.ids = ids
+        super().__init__(f"No such products: {', '.join(map(str, ids))}.")
+
+
+def apply_product_patches(patches):
+    """
+    ``patches`` are dicts with an ``id`` and a new ``price`` and/or
+    ``stock``, at most one per product. Returns [(id, UPDATED or
+    UNCHANGED)] in the same order. If some ids do not exist, raises
+    UnknownProducts and writes nothing.
+    """
+    ids = [patch["id"] for patch in patches]
+    with transaction.atomic():
+        before = {
+            pk: (category_id, price, stock)
+            for pk, category_id, price, stock in Product.objects.filter(pk__in=ids)
+            .select_for_update()
+            .order_by("pk")
+            .values_list("pk", "category_id", "price", "stock")
+        }
+        missing = [pk for pk in ids if pk not in before]
+        if missing:
+            raise UnknownProducts(missing)
+
+        results, rows, moves, stock_deltas, repriced = [], [], [], {}, []
+        for patch in patches:
+            pk = patch["id"]
+            category_id, price, stock = before[pk]
+            new_price = patch.get("price", price)
+            new_stock = patch.get("stock", stock)
+            if new_price == price and new_stock == stock:
+                results.append((pk, UNCHANGED))
+                continue
+            results.append((pk, UPDATED))
+            rows.append((pk, new_price, new_stock))
+            moves.append(
+                (
+                    facets.facet_key(category_id, price, stock),
+                    facets.facet_key(category_id, new_price, new_stock),
+                )
+            )
+            stock_deltas[pk] = new_stock - stock
+            if new_price != price:
+                repriced.append(pk)
+
+        if rows:
+            _write(rows, timezone.now())
+            inventory.record_adjustments(stock_deltas)
+            facets.record_moves(moves)
+            if repriced:
+                carts.refresh_for_products(repriced)
+            pks = [pk for pk, _, _ in rows]
+            caching.products_changed(pks)
+            changes.record(ChangeLogEntry.PRODUCT, ChangeLogEntry.UPDATED, pks)
+    return results
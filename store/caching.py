@@ -0,0 +1,149 @@
+"""
+Read-through cache for catalog reads (product pages, the category list
+and filtered listing pages).
+
+Every key embeds version stamps. Product / Category signals bump the
+stamps, so stale entries are never read again and simply expire; nothing
+has to find and delete them. A miss is rebuilt by a single worker while
+the others wait for its result instead of all hitting the database.
+The stamps only reach every worker through a shared cache backend (see
+store.checks). They expire after CATALOG_CACHE_TIMEOUT like the entries,
+so a worker that missed a bump is never stale for longer than that.
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Category, Product
+
+PRODUCT_VERSION = "catalog:version:product:{}"
+CATEGORIES_VERSION = "catalog:version:categories"
+LISTING_VERSION = "catalog:version:listing"
+
+LOCK_TIMEOUT = 10
+WAIT_TIMEOUT = 2.0
+POLL_INTERVAL = 0.05
+
+_MISSING = object()
+
+
+def get_versions(*keys):
+    """
+    Returns the current stamp for each version key, creating missing ones.
+    """
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            now = time.time_ns()
+            cache.add(key, now, settings.CATALOG_CACHE_TIMEOUT)
+            versions[key] = cache.get(key, now)
+    return [versions[key] for key in keys]
+
+
+def bump(*keys):
+    """
+    Gives the version keys a fresh stamp now and again once the current
+    transaction commits, so a reader that refilled the cache from
+    not-yet-committed data in between cannot leave it stale.
+    """
+
+    def _bump():
+        now = time.time_ns()
+        cache.set_many({key: now for key in keys}, settings.CATALOG_CACHE_TIMEOUT)
+
+    _bump()
+    transaction.on_commit(_bump)
+
+
+def get_or_build(key, build, timeout=None):
+    """
+    Single-flight read-through: on a miss only the worker that wins the
+    lock runs ``build()``; the others poll for its result for a short
+    while and only build it themselves if that takes too long.
+    """
+    if timeout is None:
+        timeout = settings.CATALOG_CACHE_TIMEOUT
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    lock_key = f"{key}:lock"
+    if cache.add(lock_key, 1, LOCK_TIMEOUT):
+        try:
+            value = build()
+            cache.set(key, value, timeout)
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+    return build()
+
+
+def product_key(pk):
+    product_version, categories_version = get_versions(
+        PRODUCT_VERSION.format(pk), CATEGORIES_VERSION
+    )
+    return f"catalog:product:{pk}:{product_version}:{categories_version}"
+
+
+def categories_key():
+    (version,) = get_versions(CATEGORIES_VERSION)
+    return f"catalog:categories:{version}"
+
+
+def listing_key(params):
+    """
+    Key for a listing page; ``params`` is the request's GET QueryDict.
+    """
+    (version,) = get_versions(LISTING_VERSION)
+    query = sorted((k, v) for k, values in params.lists() for v in values)
+    digest = hashlib.md5(repr(query).encode(), usedforsecurity=False).hexdigest()
+    return f"catalog:listing:{settings.CATALOG_PAGINATION}:{version}:{digest}"
+
+
+def get_product(pk):
+    """
+    Product with its category, or None if it does not exist.
+    """
+
+    def build():
+        return Product.objects.select_related("category").filter(pk=pk).first()
+
+    return get_or_build(product_key(pk), build)
+
+
+def get_categories():
+    return get_or_build(categories_key(), lambda: list(Category.objects.all()))
+
+
+def product_changed(product):
+    bump(PRODUCT_VERSION.format(product.pk), LISTING_VERSION)
+
+
+def products_changed(pks):
+    """
+    For stock or price updates done with queryset.update().
+    """
+    bump(*[PRODUCT_VERSION.format(pk) for pk in pks], LISTING_VERSION)
+
+
+def category_changed(category):
+    bump(CATEGORIES_VERSION, LISTING_VERSION)
+
+
+def catalog_changed():
+    """
+    Invalidates every catalog entry at once; for bulk updates that bypass
+    model signals.
+    """
+    bump(CATEGORIES_VERSION, LISTING_VERSION)
@@ -0,0 +1,243 @@
+"""
+Cart totals and bulk cart changes.
+
+Cart.item_count and Cart.total are stored on the cart and recomputed by
+refresh() after every change to its items, with a single UPDATE, so two
+concurrent changes cannot leave them off. The header badge reads them
+from the cart that is loaded together with request.user (see
+store.backends), which makes it free on every page render.
+"""
+
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
+
+from . import pricing, reservations
+from .models import Cart, CartItem, Product
+
+
+def totals():
+    """
+    Expressions for item_count and total of the outer Cart row, computed
+    from its items and the current product prices.
+    """
+    items = CartItem.objects.filter(cart=models.OuterRef("pk")).order_by()
+    count = items.values("cart").annotate(n=models.Sum("quantity")).values("n")
+    amount = (
+        items.values("cart")
+        .annotate(
+            amount=models.Sum(
+                models.F("quantity") * models.F("product__price"),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            )
+        )
+        .values("amount")
+    )
+    return {
+        "item_count": Coalesce(
+            models.Subquery(count, output_field=models.PositiveIntegerField()), 0
+        ),
+        "total": Coalesce(
+            models.Subquery(
+                amount,
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            ),
+            models.Value(Decimal("0")),
+        ),
+    }
+
+
+def refresh(*carts):
+    """
+    Recomputes the stored totals of the given carts (instances or ids).
+    """
+    pks = [getattr(cart, "pk", cart) for cart in carts if cart is not None]
+    if pks:
+        Cart.objects.filter(pk__in=pks).update(**totals())
+
+
+def refresh_for_products(product_ids):
+    """
+    For price changes: recomputes every cart that holds one of the products.
+    """
+    Cart.objects.filter(
+        pk__in=CartItem.objects.filter(product_id__in=product_ids).values("cart_id")
+    ).update(**totals())
+
+
+def drop_product(product_id):
+    """
+    Removes a product that is about to be deleted from every cart and
+    recomputes those carts; the cascade would skip the totals otherwise.
+    """
+    items = CartItem.objects.filter(product_id=product_id)
+    cart_ids = list(items.values_list("cart_id", flat=True))
+    items.delete()
+    refresh(*cart_ids)
+
+
+def merge(cart, quantities):
+    """
+    Adds {product_id: quantity} to ``cart`` in a fixed number of queries:
+    one for the products, one for the cart's existing lines, then bulk
+    inserts, updates and holds. Lines are clamped to the product's stock;
+    unknown products are skipped.
+    """
+    with transaction.atomic():
+        products = Product.objects.in_bulk(list(quantities))
+        existing = {
+            item.product_id: item
+            for item in CartItem.objects.filter(cart=cart, product_id__in=products)
+        }
+        created, updated, lines = [], [], {}
+        for pk, product in products.items():
+            item = existing.get(pk)
+            if item is None:
+                item = CartItem(cart=cart, product=product, quantity=0)
+                created.append(item)
+            else:
+                updated.append(item)
+            item.quantity = min(item.quantity + quantities[pk], product.stock)
+            lines[product] = item.quantity
+        CartItem.objects.bulk_create(created)
+        CartItem.objects.bulk_update(updated, ["quantity"])
+        reservations.hold_many(cart, lines)
+        refresh(cart)
+
+
+def coalesce(current, ops):
+    """
+    Folds cart operations into the final quantity of each product they
+    touch; ``current`` is {product_id: quantity} before them. An op is
+    {"product_id", "quantity"} to set a line or {"product_id", "delta"} to
+    change it; lines that end at zero or below are removed (quantity 0).
+    Products whose line ends where it started are left out.
+    """
+    final = {}
+    for op in ops:
+        pk = op["product_id"]
+        quantity = final.get(pk, current.get(pk, 0))
+        if "quantity" in op:
+            quantity = op["quantity"]
+        else:
+            quantity += op["delta"]
+        final[pk] = max(quantity, 0)
+    return {pk: qty for pk, qty in final.items() if qty != current.get(pk, 0)}
+
+
+def apply_ops(request, ops):
+    """
+    Applies cart operations (see coalesce()) to the visitor's cart in one
+    transaction: one write per kind of change however many ops there are,
+    then one refresh of the totals. Raises InsufficientStock for a line
+    the stock cannot cover and Product.DoesNotExist for an unknown
+    product, leaving the cart as it was. Returns the priced cart.
+    """
+    with transaction.atomic():
+        if not request.user.is_authenticated:
+            return _apply_session_ops(request, ops)
+
+        cart, _ = Cart.objects.get_or_create(user=request.user)
+        items = {item.product_id: item for item in CartItem.objects.filter(cart=cart)}
+        final = coalesce({pk: item.quantity for pk, item in items.items()}, ops)
+        lines = _products_for(final)
+        reservations.hold_many(cart, lines, strict=True)
+
+        removed = [pk for pk, qty in final.items() if qty == 0 and pk in items]
+        if removed:
+            CartItem.objects.filter(cart=cart, product_id__in=removed).delete()
+            reservations.release(cart=cart, product_ids=removed)
+        CartItem.objects.bulk_create(
+            CartItem(cart=cart, product=product, quantity=qty)
+            for product, qty in lines.items()
+            if product.pk not in items
+        )
+        updated = []
+        for product, qty in lines.items():
+            if product.pk in items:
+                items[product.pk].quantity = qty
+                updated.append(items[product.pk])
+        CartItem.objects.bulk_update(updated, ["quantity"])
+        refresh(cart)
+        priced = pricing.price_cart(cart)
+
+    request._cart_summary = {"item_count": priced.item_count, "total": priced.total}
+    return priced
+
+
+def _products_for(final):
+    """
+    {product: quantity} for the lines of ``final`` that stay in the cart.
+    """
+    kept = [pk for pk, qty in final.items() if qty > 0]
+    products = Product.objects.in_bulk(kept)
+    if len(products) < len(kept):
+        raise Product.DoesNotExist(
+            f"No such products: {sorted(set(kept) - set(products))}."
+        )
+    return {products[pk]: final[pk] for pk in kept}
+
+
+def _apply_session_ops(request, ops):
+    session_cart = request.session.get("cart", {})
+    current = {int(pk): qty for pk, qty in session_cart.items()}
+    final = coalesce(current, ops)
+    lines = _products_for(final)
+    key = reservations.guest_key(request.session)
+    reservations.hold_many(None, lines, session_key=key, strict=True)
+
+    removed = [pk for pk, qty in final.items() if qty == 0 and pk in current]
+    if removed:
+        reservations.release(session_key=key, product_ids=removed)
+    for pk, qty in final.items():
+        if qty:
+            session_cart[str(pk)] = qty
+        else:
+            session_cart.pop(str(pk), None)
+    request.session["cart"] = session_cart
+    request._cart_summary = {"item_count": sum(session_cart.values()), "total": None}
+    return pricing.price_session_cart(session_cart)
+
+
+def user_cart(user):
+    """
+    The user's cart if they have one. Free when the user came from
+    store.backends.CartModelBackend, one query at most otherwise.
+    """
+    try:
+        return user.cart
+    except Cart.DoesNotExist:
+        return None
+
+
+def summary(request):
+    """
+    {"item_count", "total"} of the visitor's cart, worked out once per
+    request. Guests only get a count (from the session); their total
+    needs the product prices.
+    """
+    if not hasattr(request, "_cart_summary"):
+        if request.user.is_authenticated:
+            cart = user_cart(request.user)
+            request._cart_summary = {
+                "item_count": cart.item_count if cart else 0,
+                "total": cart.total if cart else Decimal("0"),
+            }
+        else:
+            request._cart_summary = {
+                "item_count": sum(request.session.get("cart", {}).values()),
+                "total": None,
+            }
+    return request._cart_summary
+
+
+def changed(request, cart):
+    """
+    For views that just changed the request user's ``cart``: recomputes
+    its totals and returns the fresh summary.
+    """
+    refresh(cart)
+    cart.refresh_from_db(fields=["item_count", "total"])
+    request._cart_summary = {"item_count": cart.item_count, "total": cart.total}
+    return request._cart_summary
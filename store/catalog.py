@@ -0,0 +1,50 @@
+"""
+Catalog filtering shared by the HTML product list and the products API.
+"""
+
+from decimal import Decimal, InvalidOperation
+
+from .search import search_products
+
+
+def _decimal(value):
+    try:
+        value = Decimal(value)
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+    return value if value.is_finite() else None
+
+
+def parse_filters(params):
+    """
+    Cleans the catalog query parameters. Invalid values are ignored the
+    same way the catalog always did, rather than rejected.
+    """
+    category = params.get("category", "").strip()
+    return {
+        "q": params.get("q", "").strip(),
+        "category": int(category) if category.isdigit() else None,
+        "min_price": _decimal(params.get("min_price", "").strip()),
+        "max_price": _decimal(params.get("max_price", "").strip()),
+        "in_stock": params.get("in_stock") in ("on", "true", "1"),
+    }
+
+
+def filter_products(qs, filters, exclude=()):
+    """
+    Applies cleaned ``filters`` to a Product queryset. Filters named in
+    ``exclude`` are skipped, which is what disjunctive facets need.
+    A search query annotates ``search_rank`` on the result.
+    """
+    if filters["q"] and "q" not in exclude:
+        qs = search_products(qs, filters["q"])
+    if filters["category"] is not None and "category" not in exclude:
+        qs = qs.filter(category_id=filters["category"])
+    if "price" not in exclude:
+        if filters["min_price"] is not None:
+            qs = qs.filter(price__gte=filters["min_price"])
+        if filters["max_price"] is not None:
+            qs = qs.filter(price__lte=filters["max_price"])
+    if filters["in_stock"] and "in_stock" not in exclude:
+        qs = qs.filter(stock__gt=0)
+    return qs
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core import checks
+
+# Backends whose entries only the process that wrote them can see
+PER_PROCESS_CACHES = {"django.core.cache.backends.locmem.LocMemCache"}
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    The catalog cache and its version stamps (store.caching) must be seen
+    by every worker, or a worker that did not handle a change keeps serving
+    and revalidating the old catalog.
+    """
+    backend = settings.CACHES["default"]["BACKEND"]
+    if settings.DEBUG or backend not in PER_PROCESS_CACHES:
+        return []
+    return [
+        checks.Error(
+            "The default cache is per-process memory, so catalog changes are "
+            "only seen by the worker that made them.",
+            hint="Set CACHE_URL to a cache shared by all workers, e.g. "
+            "redis://127.0.0.1:6379/1.",
+            id="store.E001",
+        )
+    ]
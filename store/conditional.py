@@ -0,0 +1,118 @@
+"""
+Conditional GETs for the catalog.
+
+ETags and Last-Modified dates are worked out from the catalog cache
+version stamps (see store.caching), which every product and category
+change bumps. Answering If-None-Match / If-Modified-Since therefore
+costs one cache read: no rows are loaded and nothing is serialized or
+rendered when the client's copy is current. The stamps expire after
+CATALOG_CACHE_TIMEOUT, which bounds how long a worker that missed a change
+can answer 304 if the cache is not shared (see store.checks).
+
+HTML pages also show the visitor's cart, login state and one-time
+messages, so their ETag covers those too and they get no Last-Modified.
+"""
+
+import hashlib
+from datetime import datetime, timezone
+
+from django.contrib.messages import get_messages
+from django.middleware.csrf import get_token
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_headers
+
+from . import carts
+from .caching import (
+    CATEGORIES_VERSION,
+    LISTING_VERSION,
+    PRODUCT_VERSION,
+    get_versions,
+)
+
+
+def listing_versions(**kwargs):
+    return [LISTING_VERSION]
+
+
+def product_versions(pk, **kwargs):
+    return [PRODUCT_VERSION.format(pk), CATEGORIES_VERSION]
+
+
+def category_versions(**kwargs):
+    return [CATEGORIES_VERSION]
+
+
+def _stamps(request, keys):
+    # The ETag and Last-Modified functions both need them; read once
+    memo = request.__dict__.setdefault("_catalog_stamps", {})
+    keys = tuple(keys)
+    if keys not in memo:
+        memo[keys] = get_versions(*keys)
+    return memo[keys]
+
+
+def _digest(*parts):
+    return hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest()
+
+
+def _csrf_secret(request):
+    # get_token() makes sure there is one; its result is masked afresh on
+    # every call, the secret underneath is stable
+    get_token(request)
+    return request.META.get("CSRF_COOKIE")
+
+
+def _last_modified(stamps):
+    return datetime.fromtimestamp(max(stamps) / 1e9, tz=timezone.utc)
+
+
+def api_condition(versions):
+    """
+    Decorator for viewset list() / retrieve(): validators from the stamps
+    ``versions(**view_kwargs)`` names. The representation also depends on
+    the query string and the negotiated format, so those go into the ETag.
+    """
+
+    def etag(request, *args, **kwargs):
+        return _digest(
+            _stamps(request, versions(**kwargs)),
+            request.get_full_path(),
+            request.META.get("HTTP_ACCEPT", ""),
+        )
+
+    def last_modified(request, *args, **kwargs):
+        return _last_modified(_stamps(request, versions(**kwargs)))
+
+    def decorator(method):
+        method = method_decorator(vary_on_headers("Accept"))(method)
+        return method_decorator(
+            condition(etag_func=etag, last_modified_func=last_modified)
+        )(method)
+
+    return decorator
+
+
+def page_condition(versions, visitor_state=None):
+    """
+    Decorator for catalog pages: the ETag covers the catalog stamps and
+    what the page shows about the visitor (user, cart summary, CSRF
+    token, plus ``visitor_state(request, **kwargs)`` if given). Pages with
+    pending messages are always rendered in full.
+    """
+
+    def etag(request, *args, **kwargs):
+        if len(get_messages(request)):
+            return None
+        summary = carts.summary(request)
+        return _digest(
+            _stamps(request, versions(**kwargs)),
+            request.get_full_path(),
+            request.user.pk,
+            summary["item_count"],
+            summary["total"],
+            _csrf_secret(request),
+            visitor_state(request, **kwargs) if visitor_state else None,
+        )
+
+    return condition(etag_func=etag)
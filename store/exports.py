@@ -0,0 +1,138 @@
+"""
+Streaming catalog and order exports.
+
+Rows are read from values_list() querysets with iterator(), so only one
+chunk of rows is in memory at a time however large the catalog or the
+order book is. The writers turn them into NDJSON or CSV text, buffered
+into chunks of about 64 KB, for a StreamingHttpResponse or a file. CSV
+text cells that a spreadsheet would run as a formula are prefixed with a
+quote, since names, addresses and the like come from users.
+"""
+
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import OrderItem, Product
+
+CHUNK_SIZE = 2000
+BUFFER_SIZE = 64 * 1024
+
+# Spreadsheets treat a cell starting with one of these as a formula
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+PRODUCT_COLUMNS = [
+    ("id", "id"),
+    ("name", "name"),
+    ("description", "description"),
+    ("price", "price"),
+    ("stock", "stock"),
+    ("image", "image"),
+    ("category_id", "category_id"),
+    ("category", "category__name"),
+]
+
+# One row per order line, with the order it belongs to
+ORDER_COLUMNS = [
+    ("order_id", "order_id"),
+    ("user_id", "order__user_id"),
+    ("ordered_at", "order__ordered_at"),
+    ("status", "order__status"),
+    ("total_price", "order__total_price"),
+    ("city", "order__city"),
+    ("postal_code", "order__postal_code"),
+    ("line_id", "id"),
+    ("product_id", "product_id"),
+    ("product", "product__name"),
+    ("quantity", "quantity"),
+    ("price_at_order", "price_at_order"),
+]
+
+
+def _rows(queryset, columns):
+    lookups = [lookup for _, lookup in columns]
+    return queryset.values_list(*lookups).iterator(chunk_size=CHUNK_SIZE)
+
+
+def product_rows(queryset=None):
+    """
+    Product tuples in PRODUCT_COLUMNS order; ``queryset`` keeps its
+    ordering, the whole catalog goes by id.
+    """
+    if queryset is None:
+        queryset = Product.objects.order_by("id")
+    return _rows(queryset, PRODUCT_COLUMNS)
+
+
+def order_rows(orders=None):
+    """
+    Order line tuples in ORDER_COLUMNS order, for ``orders`` (a queryset)
+    or all orders, by order then line.
+    """
+    lines = OrderItem.objects.all()
+    if orders is not None:
+        lines = lines.filter(order__in=orders.values("pk"))
+    return _rows(lines.order_by("order_id", "id"), ORDER_COLUMNS)
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def _csv_cell(value):
+    # Only text: numbers such as a negative quantity are left as they are
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_lines(columns, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([name for name, _ in columns])
+    for row in rows:
+        yield writer.writerow([_csv_cell(value) for value in row])
+
+
+def ndjson_lines(columns, rows):
+    names = [name for name, _ in columns]
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(dict(zip(names, row))) + "\n"
+
+
+FORMATS = {
+    "ndjson": ("application/x-ndjson", ndjson_lines),
+    "csv": ("text/csv", csv_lines),
+}
+
+DATASETS = {
+    "products": (PRODUCT_COLUMNS, product_rows),
+    "orders": (ORDER_COLUMNS, order_rows),
+}
+
+
+def buffered(lines, size=BUFFER_SIZE):
+    """
+    Joins ``lines`` into chunks of about ``size`` characters, so a stream
+    is not written to the socket one short line at a time.
+    """
+    buffer, length = [], 0
+    for line in lines:
+        buffer.append(line)
+        length += len(line)
+        if length >= size:
+            yield "".join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def export(dataset, fmt, queryset=None):
+    """
+    Text chunks of ``dataset`` ("products" or "orders") in ``fmt``
+    ("ndjson" or "csv"), limited to ``queryset`` if given.
+    """
+    columns, rows = DATASETS[dataset]
+    _, lines = FORMATS[fmt]
+    return buffered(lines(columns, rows(queryset)))
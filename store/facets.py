@@ -0,0 +1,225 @@
+"""
+Facet counts for the catalog sidebar: products per category, per price
+band and in / out of stock, for the current filters.
+
+Counts come from CatalogFacetCount, a tiny (category x band x stock)
+table kept up to date by the Product signals. Only a text search or a
+price range that does not line up with the configured bands falls back to
+grouped queries over the filtered products.
+"""
+
+from bisect import bisect_right
+from collections import Counter
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+
+from .catalog import filter_products
+from .models import CatalogFacetCount, Product
+
+CENT = Decimal("0.01")
+
+
+def band_bounds():
+    """
+    Lower bounds of the price bands, e.g. [0, 25, 50, 100, 250] gives
+    0-24.99, 25-49.99, 50-99.99, 100-249.99 and 250+.
+    """
+    return [Decimal(str(b)) for b in settings.CATALOG_PRICE_BANDS]
+
+
+def band_of(price):
+    return max(bisect_right(band_bounds(), Decimal(price)) - 1, 0)
+
+
+def price_bands():
+    bounds = band_bounds()
+    return [
+        {
+            "band": i,
+            "min": lower,
+            "max": bounds[i + 1] - CENT if i + 1 < len(bounds) else None,
+        }
+        for i, lower in enumerate(bounds)
+    ]
+
+
+def _band_expression():
+    bounds = band_bounds()
+    return models.Case(
+        *[
+            models.When(price__lt=upper, then=models.Value(i))
+            for i, upper in enumerate(bounds[1:])
+        ],
+        default=models.Value(len(bounds) - 1),
+        output_field=models.IntegerField(),
+    )
+
+
+def facet_key(category_id, price, stock):
+    return (category_id, band_of(price), stock > 0)
+
+
+def _bump(key, delta):
+    category_id, band, in_stock = key
+    cells = CatalogFacetCount.objects.filter(
+        category_id=category_id, price_band=band, in_stock=in_stock
+    )
+    if cells.update(product_count=models.F("product_count") + delta) or delta < 0:
+        return
+    try:
+        with transaction.atomic():
+            CatalogFacetCount.objects.create(
+                category_id=category_id,
+                price_band=band,
+                in_stock=in_stock,
+                product_count=delta,
+            )
+    except IntegrityError:
+        # Someone else created the cell in the meantime
+        cells.update(product_count=models.F("product_count") + delta)
+
+
+def record_move(old_key, new_key):
+    """
+    Moves one product between facet cells; either key may be None for a
+    product that is being created or deleted.
+    """
+    if old_key == new_key:
+        return
+    if old_key is not None:
+        _bump(old_key, -1)
+    if new_key is not None:
+        _bump(new_key, 1)
+
+
+def record_moves(moves):
+    """
+    record_move() for many products at once: (old_key, new_key) pairs are
+    netted per cell first, so each affected cell is updated once.
+    """
+    deltas = Counter()
+    for old_key, new_key in moves:
+        if old_key == new_key:
+            continue
+        if old_key is not None:
+            deltas[old_key] -= 1
+        if new_key is not None:
+            deltas[new_key] += 1
+    # Decrements first, like record_move()
+    for key, delta in sorted(deltas.items(), key=lambda item: item[1]):
+        if delta:
+            _bump(key, delta)
+
+
+def rebuild():
+    """
+    Recounts every cell from Product. Needed after changing
+    CATALOG_PRICE_BANDS or after bulk updates that bypass signals.
+    """
+    rows = (
+        Product.objects.order_by()
+        .annotate(
+            band=_band_expression(),
+            available=models.ExpressionWrapper(
+                models.Q(stock__gt=0), output_field=models.BooleanField()
+            ),
+        )
+        .values("category_id", "band", "available")
+        .annotate(n=models.Count("id"))
+    )
+    with transaction.atomic():
+        CatalogFacetCount.objects.all().delete()
+        CatalogFacetCount.objects.bulk_create(
+            CatalogFacetCount(
+                category_id=row["category_id"],
+                price_band=row["band"],
+                in_stock=row["available"],
+                product_count=row["n"],
+            )
+            for row in rows
+        )
+
+
+def _band_range(filters):
+    """
+    Translates min/max price into an inclusive range of band indexes, or
+    None if the price filter does not fall on band boundaries.
+    """
+    bounds = band_bounds()
+    low, high = 0, len(bounds) - 1
+    if filters["min_price"] is not None:
+        if filters["min_price"] not in bounds:
+            return None
+        low = bounds.index(filters["min_price"])
+    if filters["max_price"] is not None:
+        if filters["max_price"] + CENT not in bounds:
+            return None
+        high = bounds.index(filters["max_price"] + CENT) - 1
+    return low, high
+
+
+def _from_cells(filters, bands):
+    category_counts, band_counts, stock_counts = {}, {}, {True: 0, False: 0}
+    low, high = bands
+    for category_id, band, in_stock, count in CatalogFacetCount.objects.values_list(
+        "category_id", "price_band", "in_stock", "product_count"
+    ):
+        in_category = filters["category"] in (None, category_id)
+        in_price = low <= band <= high
+        in_stock_filter = in_stock or not filters["in_stock"]
+        if in_price and in_stock_filter:
+            category_counts[category_id] = category_counts.get(category_id, 0) + count
+        if in_category and in_stock_filter:
+            band_counts[band] = band_counts.get(band, 0) + count
+        if in_category and in_price:
+            stock_counts[in_stock] += count
+    return category_counts, band_counts, stock_counts
+
+
+def _from_products(filters):
+    base = Product.objects.order_by()
+
+    categories = filter_products(base, filters, exclude=("category",))
+    category_counts = dict(
+        categories.values("category_id")
+        .annotate(n=models.Count("id"))
+        .values_list("category_id", "n")
+    )
+
+    bands = filter_products(base, filters, exclude=("price",))
+    band_counts = dict(
+        bands.annotate(band=_band_expression())
+        .values("band")
+        .annotate(n=models.Count("id"))
+        .values_list("band", "n")
+    )
+
+    stock = filter_products(base, filters, exclude=("in_stock",)).aggregate(
+        in_stock=models.Count("id", filter=models.Q(stock__gt=0)),
+        out_of_stock=models.Count("id", filter=models.Q(stock=0)),
+    )
+    stock_counts = {True: stock["in_stock"], False: stock["out_of_stock"]}
+    return category_counts, band_counts, stock_counts
+
+
+def get_facets(filters):
+    """
+    Returns facet counts for cleaned catalog ``filters`` (see
+    catalog.parse_filters). Each facet ignores its own filter, so picking
+    a category still shows how many products the other categories have.
+    """
+    bands = _band_range(filters)
+    if filters["q"] or bands is None:
+        category_counts, band_counts, stock_counts = _from_products(filters)
+    else:
+        category_counts, band_counts, stock_counts = _from_cells(filters, bands)
+    return {
+        "categories": category_counts,
+        "price_bands": [
+            dict(band, count=band_counts.get(band["band"], 0)) for band in price_bands()
+        ],
+        "in_stock": stock_counts[True],
+        "out_of_stock": stock_counts[False],
+    }
@@ -0,0 +1,197 @@
+"""
+Inventory ledger.
+
+Every stock change is recorded as an InventoryMovement insert: sales from
+checkout, the opening restock of a new product, manual adjustments from
+the admin or the API, and cancellations. ``Product.stock`` is the
+materialized balance that checkout decrements conditionally;
+``manage.py compact_inventory`` periodically folds old movements into
+InventorySnapshot rows and checks the two still agree.
+"""
+
+from django.db import models, transaction
+from django.utils import timezone
+
+from . import caching, changes, facets
+from .models import (
+    ChangeLogEntry,
+    InventoryMovement,
+    InventorySnapshot,
+    Order,
+    OrderItem,
+    Product,
+)
+
+
+def record(product_id, kind, quantity, order=None):
+    if quantity:
+        InventoryMovement.objects.create(
+            product_id=product_id, kind=kind, quantity=quantity, order=order
+        )
+
+
+def record_sale(order, lines):
+    """
+    One bulk insert for all lines of an order; ``lines`` are
+    (product_id, quantity) pairs.
+    """
+    InventoryMovement.objects.bulk_create(
+        InventoryMovement(
+            product_id=product_id,
+            kind=InventoryMovement.SALE,
+            quantity=-quantity,
+            order=order,
+        )
+        for product_id, quantity in lines
+    )
+
+
+def record_adjustments(deltas):
+    """
+    One bulk insert of ADJUSTMENT movements; ``deltas`` maps product ids
+    to signed stock changes.
+    """
+    InventoryMovement.objects.bulk_create(
+        InventoryMovement(
+            product_id=product_id, kind=InventoryMovement.ADJUSTMENT, quantity=delta
+        )
+        for product_id, delta in deltas.items()
+        if delta
+    )
+
+
+def cancel_orders(orders):
+    """
+    Marks the given orders CANCELLED and puts their lines back in stock:
+    one CANCELLATION movement per line and a single UPDATE for the
+    affected products. Orders that are already cancelled are skipped, so
+    stock is never returned twice. Returns the number of orders cancelled.
+    """
+    with transaction.atomic():
+        pks = list(
+            Order.objects.filter(pk__in=[getattr(o, "pk", o) for o in orders])
+            .exclude(status="CANCELLED")
+            .select_for_update()
+            .values_list("pk", flat=True)
+        )
+        if not pks:
+            return 0
+        now = timezone.now()
+        Order.objects.filter(pk__in=pks).update(status="CANCELLED", updated_at=now)
+        changes.record(ChangeLogEntry.ORDER, ChangeLogEntry.UPDATED, pks)
+
+        lines = list(
+            OrderItem.objects.filter(order_id__in=pks).values_list(
+                "order_id", "product_id", "quantity"
+            )
+        )
+        InventoryMovement.objects.bulk_create(
+            InventoryMovement(
+                product_id=product_id,
+                kind=InventoryMovement.CANCELLATION,
+                quantity=quantity,
+                order_id=order_id,
+            )
+            for order_id, product_id, quantity in lines
+        )
+
+        returned = {}
+        for _, product_id, quantity in lines:
+            returned[product_id] = returned.get(product_id, 0) + quantity
+        if returned:
+            before = list(
+                Product.objects.filter(pk__in=returned)
+                .select_for_update()
+                .order_by("pk")
+                .values_list("pk", "category_id", "price", "stock")
+            )
+            Product.objects.filter(pk__in=returned).update(
+                stock=models.Case(
+                    *[
+                        models.When(pk=pk, then=models.F("stock") + qty)
+                        for pk, qty in returned.items()
+                    ],
+                    default=models.F("stock"),
+                    output_field=models.PositiveIntegerField(),
+                ),
+                updated_at=now,
+            )
+            for pk, category_id, price, stock in before:
+                facets.record_move(
+                    facets.facet_key(category_id, price, stock),
+                    facets.facet_key(category_id, price, stock + returned[pk]),
+                )
+            caching.products_changed(list(returned))
+            changes.record(ChangeLogEntry.PRODUCT, ChangeLogEntry.UPDATED, returned)
+    return len(pks)
+
+
+def ledger_balances(product_ids=None):
+    """
+    {product_id: snapshot quantity + movements since the snapshot}.
+    """
+    snapshots = InventorySnapshot.objects.all()
+    movements = InventoryMovement.objects.all()
+    if product_ids is not None:
+        snapshots = snapshots.filter(product_id__in=product_ids)
+        movements = movements.filter(product_id__in=product_ids)
+    balances = dict(snapshots.values_list("product_id", "quantity"))
+    for product_id, total in (
+        movements.order_by()
+        .values("product_id")
+        .annotate(total=models.Sum("quantity"))
+        .values_list("product_id", "total")
+    ):
+        balances[product_id] = balances.get(product_id, 0) + total
+    return balances
+
+
+def compact(before):
+    """
+    Folds every movement created before ``before`` into the products'
+    snapshots and deletes those movements. Returns how many were folded.
+    """
+    with transaction.atomic():
+        cutoff = InventoryMovement.objects.filter(created_at__lt=before).aggregate(
+            last=models.Max("id")
+        )["last"]
+        if cutoff is None:
+            return 0
+        folded = InventoryMovement.objects.filter(id__lte=cutoff)
+        totals = dict(
+            folded.order_by()
+            .values("product_id")
+            .annotate(total=models.Sum("quantity"))
+            .values_list("product_id", "total")
+        )
+        now = timezone.now()
+        snapshots = InventorySnapshot.objects.select_for_update().in_bulk(list(totals))
+        created = []
+        for product_id, total in totals.items():
+            snapshot = snapshots.get(product_id)
+            if snapshot is None:
+                snapshot = InventorySnapshot(product_id=product_id, quantity=0)
+                created.append(snapshot)
+            snapshot.quantity += total
+            snapshot.last_movement_id = cutoff
+            snapshot.taken_at = now
+        InventorySnapshot.objects.bulk_update(
+            list(snapshots.values()),
+            ["quantity", "last_movement_id", "taken_at"],
+            batch_size=1000,
+        )
+        InventorySnapshot.objects.bulk_create(created, batch_size=1000)
+        return folded.delete()[0]
+
+
+def drift():
+    """
+    Products whose materialized stock disagrees with the ledger, as
+    {product_id: (stock, ledger balance)}.
+    """
+    balances = ledger_balances()
+    return {
+        pk: (stock, balances.get(pk, 0))
+        for pk, stock in Product.objects.values_list("pk", "stock").iterator()
+        if stock != balances.get(pk, 0)
+    }
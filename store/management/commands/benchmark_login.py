@@ -0,0 +1,84 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+PASSWORD = "correct horse battery staple"
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Time POST /login/ for synthetic users in one process and report "
+        "logins per second of CPU, i.e. per core. Works in a transaction "
+        "that is rolled back, but do not point it at a production database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument("--logins", type=int, default=200)
+        parser.add_argument(
+            "--hasher",
+            help="Dotted path of the password hasher to use instead of the "
+            "first one in PASSWORD_HASHERS.",
+        )
+
+    def handle(self, *args, **options):
+        hashers = list(settings.PASSWORD_HASHERS)
+        if options["hasher"]:
+            hashers = [options["hasher"]] + hashers
+        with override_settings(PASSWORD_HASHERS=hashers):
+            try:
+                with transaction.atomic():
+                    self.run(options)
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def run(self, options):
+        # One hash for everyone; hashing a password per user would take
+        # longer than the benchmark
+        encoded = make_password(PASSWORD)
+        users = User.objects.bulk_create(
+            User(username=f"bench-login-{i}", password=encoded)
+            for i in range(options["users"])
+        )
+        url = reverse("store:login")
+        client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+
+        started = time.perf_counter()
+        for _ in range(options["logins"]):
+            check_password(PASSWORD, encoded)
+        hash_ms = (time.perf_counter() - started) * 1000 / options["logins"]
+
+        timings = []
+        cpu_started = time.process_time()
+        for i in range(options["logins"]):
+            client.cookies.clear()
+            started = time.perf_counter()
+            response = client.post(
+                url,
+                {"username": users[i % len(users)].username, "password": PASSWORD},
+            )
+            timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 302:
+                raise RuntimeError(f"Login failed with {response.status_code}")
+        cpu = time.process_time() - cpu_started
+
+        timings.sort()
+        p95 = timings[max(int(len(timings) * 0.95) - 1, 0)]
+        self.stdout.write(f"hasher             {settings.PASSWORD_HASHERS[0]}")
+        self.stdout.write(f"check_password     {hash_ms:.1f} ms")
+        self.stdout.write(f"login median       {statistics.median(timings):.1f} ms")
+        self.stdout.write(f"login p95          {p95:.1f} ms")
+        self.stdout.write(f"logins/s per core  {options['logins'] / cpu:.1f}")
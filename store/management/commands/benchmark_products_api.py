@@ -0,0 +1,130 @@
+import random
+import statistics
+import time
+from urllib.parse import parse_qs, urlparse
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from rest_framework.test import APIRequestFactory
+
+from store import search
+from store.api.views import ProductViewSet
+from store.models import Category, Product
+
+WORDS = (
+    "oak walnut steel linen wool desk lamp chair shelf rug mirror vase "
+    "clock stool bench frame basket candle blanket pillow"
+).split()
+
+SCENARIOS = [
+    ("first page", {}),
+    ("category", {"category": "{category}"}),
+    ("price range", {"min_price": "25", "max_price": "49.99"}),
+    ("in stock by price", {"in_stock": "true", "ordering": "price"}),
+    (
+        "category in stock -price",
+        {"category": "{category}", "in_stock": "true", "ordering": "-price"},
+    ),
+    # Names end in their sequence number, so this matches a handful of rows
+    ("search, narrow", {"search": "walnut 4242"}),
+    ("search, broad", {"search": "walnut lamp"}),
+    ("10th page", {"pages": 10}),
+]
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Time GET /api/products/ for common filter / ordering / search shapes "
+        "at growing catalog sizes. Works in a transaction that is rolled "
+        "back, but do not point it at a production database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+        )
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--categories", type=int, default=50)
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options["seed"])
+        self.view = ProductViewSet.as_view({"get": "list"})
+        self.factory = APIRequestFactory()
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        self.categories = Category.objects.bulk_create(
+            Category(name=f"Bench {i}", slug=f"bench-{i}")
+            for i in range(options["categories"])
+        )
+        self.stdout.write(
+            f"{'products':>10}  {'scenario':<26}{'median ms':>10}{'p95 ms':>10}"
+        )
+        count = 0
+        for size in sorted(options["sizes"]):
+            self.seed(count, size)
+            count = size
+            search.rebuild_index()
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+            for name, params in SCENARIOS:
+                timings = self.measure(params, options["repeat"])
+                timings.sort()
+                p95 = timings[max(int(len(timings) * 0.95) - 1, 0)]
+                self.stdout.write(
+                    f"{size:>10}  {name:<26}"
+                    f"{statistics.median(timings):>10.1f}{p95:>10.1f}"
+                )
+
+    def seed(self, start, stop, batch_size=5000):
+        for low in range(start, stop, batch_size):
+            Product.objects.bulk_create(
+                Product(
+                    category=self.random.choice(self.categories),
+                    name=" ".join(self.random.sample(WORDS, 3)) + f" {i}",
+                    description=" ".join(self.random.choices(WORDS, k=12)),
+                    price=self.random.randint(100, 40000) / 100,
+                    stock=self.random.choice([0, 0, 1, 5, 20, 100]),
+                )
+                for i in range(low, min(low + batch_size, stop))
+            )
+
+    def get(self, params):
+        params = {
+            key: value.format(category=self.categories[0].pk)
+            for key, value in params.items()
+        }
+        request = self.factory.get(
+            "/api/products/", params, HTTP_HOST=settings.ALLOWED_HOSTS[0]
+        )
+        response = self.view(request)
+        response.render()
+        return response
+
+    def measure(self, params, repeat):
+        params = dict(params)
+        pages = params.pop("pages", 1)
+        timings = []
+        for _ in range(repeat):
+            cursor = None
+            for _ in range(pages):
+                page_params = dict(params, cursor=cursor) if cursor else params
+                started = time.perf_counter()
+                response = self.get(page_params)
+                elapsed = (time.perf_counter() - started) * 1000
+                next_url = response.data["next"]
+                if next_url:
+                    cursor = parse_qs(urlparse(next_url).query)["cursor"][0]
+            timings.append(elapsed)
+        return timings
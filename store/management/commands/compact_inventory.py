@@ -0,0 +1,46 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from store import inventory
+from store.models import InventoryMovement
+
+
+class Command(BaseCommand):
+    help = (
+        "Fold old inventory movements into per-product snapshots and check "
+        "that Product.stock still matches the ledger."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--keep-days",
+            type=int,
+            default=30,
+            help="Keep movements newer than this many days as individual rows.",
+        )
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Record adjustments so the ledger matches Product.stock again.",
+        )
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options["keep_days"])
+        folded = inventory.compact(before)
+        self.stdout.write(f"Folded {folded} movement(s) into snapshots.")
+
+        drift = inventory.drift()
+        for pk, (stock, balance) in sorted(drift.items()):
+            self.stdout.write(
+                self.style.WARNING(f"Product {pk}: stock {stock}, ledger {balance}")
+            )
+        if drift and options["fix"]:
+            # Product.stock is what the shop sells against, so the ledger
+            # is corrected with adjustment movements rather than the reverse
+            for pk, (stock, balance) in drift.items():
+                inventory.record(pk, InventoryMovement.ADJUSTMENT, stock - balance)
+            self.stdout.write(self.style.SUCCESS(f"Fixed {len(drift)} product(s)."))
+        elif not drift:
+            self.stdout.write(self.style.SUCCESS("Stock matches the ledger."))
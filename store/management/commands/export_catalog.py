@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from store import exports
+
+
+class Command(BaseCommand):
+    help = (
+        "Dump the catalog (or, with --dataset orders, every order line) as "
+        "NDJSON or CSV. Rows are streamed, so memory use stays flat."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dataset", choices=sorted(exports.DATASETS), default="products"
+        )
+        parser.add_argument(
+            "--format", choices=sorted(exports.FORMATS), default="ndjson"
+        )
+        parser.add_argument(
+            "-o", "--output", help="File to write to (default: standard output)."
+        )
+
+    def handle(self, *args, **options):
+        chunks = exports.export(options["dataset"], options["format"])
+        if not options["output"]:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
+            return
+        with open(options["output"], "w", newline="", encoding="utf-8") as out:
+            out.writelines(chunks)
+        self.stderr.write(
+            self.style.SUCCESS(f"Wrote {options['dataset']} to {options['output']}.")
+        )
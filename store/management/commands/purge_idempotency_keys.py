@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from store.api import idempotency
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete Idempotency-Key records older than IDEMPOTENCY_KEY_TTL (run from cron)."
+    )
+
+    def handle(self, *args, **options):
+        removed = idempotency.purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"Purged {removed} idempotency key(s)."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store import facets
+
+
+class Command(BaseCommand):
+    help = "Recount the catalog facet table (run after changing CATALOG_PRICE_BANDS)."
+
+    def handle(self, *args, **options):
+        facets.rebuild()
+        self.stdout.write(self.style.SUCCESS("Catalog facet counts rebuilt."))
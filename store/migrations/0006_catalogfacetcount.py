@@ -0,0 +1,66 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_facets(apps, schema_editor):
+    from store import facets
+
+    CatalogFacetCount = apps.get_model("store", "CatalogFacetCount")
+    Product = apps.get_model("store", "Product")
+    cells = {}
+    for category_id, price, stock in Product.objects.values_list(
+        "category_id", "price", "stock"
+    ).iterator():
+        key = facets.facet_key(category_id, price, stock)
+        cells[key] = cells.get(key, 0) + 1
+    CatalogFacetCount.objects.bulk_create(
+        CatalogFacetCount(
+            category_id=category_id,
+            price_band=band,
+            in_stock=in_stock,
+            product_count=count,
+        )
+        for (category_id, band, in_stock), count in cells.items()
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("store", "0005_product_search_vector"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CatalogFacetCount",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("price_band", models.PositiveSmallIntegerField()),
+                ("in_stock", models.BooleanField()),
+                ("product_count", models.IntegerField(default=0)),
+                (
+                    "category",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="store.category",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("category", "price_band", "in_stock"),
+                        name="unique_catalog_facet_cell",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(build_facets, migrations.RunPython.noop),
+    ]
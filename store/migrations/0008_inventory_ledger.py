@@ -0,0 +1,101 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def open_balances(apps, schema_editor):
+    """
+    Starts the ledger from the current stock of every product.
+    """
+    InventorySnapshot = apps.get_model("store", "InventorySnapshot")
+    Product = apps.get_model("store", "Product")
+    now = django.utils.timezone.now()
+    InventorySnapshot.objects.bulk_create(
+        (
+            InventorySnapshot(product_id=pk, quantity=stock, taken_at=now)
+            for pk, stock in Product.objects.values_list("pk", "stock").iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("store", "0007_stockreservation"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InventorySnapshot",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="inventory_snapshot",
+                        serialize=False,
+                        to="store.product",
+                    ),
+                ),
+                ("quantity", models.IntegerField()),
+                ("last_movement_id", models.BigIntegerField(default=0)),
+                ("taken_at", models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name="InventoryMovement",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("SALE", "Sale"),
+                            ("RESTOCK", "Restock"),
+                            ("ADJUSTMENT", "Adjustment"),
+                            ("CANCELLATION", "Cancellation"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("quantity", models.IntegerField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "order",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="store.order",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="movements",
+                        to="store.product",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["id"],
+                "indexes": [
+                    models.Index(
+                        fields=["product", "id"], name="store_inven_product_f36e7e_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(open_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_totals(apps, schema_editor):
+    Cart = apps.get_model("store", "Cart")
+    CartItem = apps.get_model("store", "CartItem")
+    items = (
+        CartItem.objects.filter(cart=models.OuterRef("pk")).order_by().values("cart")
+    )
+    count = items.annotate(n=models.Sum("quantity")).values("n")
+    amount = items.annotate(
+        amount=models.Sum(
+            models.F("quantity") * models.F("product__price"),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        )
+    ).values("amount")
+    Cart.objects.update(
+        item_count=Coalesce(
+            models.Subquery(count, output_field=models.PositiveIntegerField()), 0
+        ),
+        total=Coalesce(
+            models.Subquery(
+                amount,
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            ),
+            models.Value(Decimal("0")),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("store", "0008_inventory_ledger"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cart",
+            name="item_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="cart",
+            name="total",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(fill_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,90 @@
+from django.conf import settings
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+# The order admin searches these with icontains, which PostgreSQL runs as
+# UPPER(col::text) LIKE UPPER('%term%'); a trigram index on exactly that
+# expression serves it instead of a sequential scan
+TRIGRAM_INDEXES = [
+    ("store_order_first_name_trgm", "store_order", "first_name"),
+    ("store_order_last_name_trgm", "store_order", "last_name"),
+    ("store_order_address_trgm", "store_order", "address"),
+    ("store_order_city_trgm", "store_order", "city"),
+    ("store_order_postal_code_trgm", "store_order", "postal_code"),
+    # The buyer's username, searched separately by OrderAdmin; the index is
+    # on Django's auth_user table but owned (and dropped) by this migration
+    ("store_auth_user_username_trgm", "auth_user", "username"),
+]
+
+ORDERED_AT_INDEX = models.Index(
+    fields=["ordered_at"], name="store_order_ordered_e8f763_idx"
+)
+
+
+class CreateTrigramExtension(TrigramExtension):
+    # CreateExtension only checks the database vendor on the way forwards
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+def create_ordered_at_index(apps, schema_editor):
+    Order = apps.get_model("store", "Order")
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.add_index(Order, ORDERED_AT_INDEX, concurrently=True)
+    else:
+        schema_editor.add_index(Order, ORDERED_AT_INDEX)
+
+
+def drop_ordered_at_index(apps, schema_editor):
+    Order = apps.get_model("store", "Order")
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.remove_index(Order, ORDERED_AT_INDEX, concurrently=True)
+    else:
+        schema_editor.remove_index(Order, ORDERED_AT_INDEX)
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON "{table}" '
+            f'USING gin ((UPPER("{column}"::text)) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+    # The indexes are built CONCURRENTLY so orders can still be placed while
+    # they build, which cannot happen in a transaction. A build that fails
+    # leaves an INVALID index behind: drop it before migrating again.
+    atomic = False
+
+    dependencies = [
+        ("store", "0012_change_feed"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name="order", index=ORDERED_AT_INDEX),
+            ],
+            database_operations=[
+                migrations.RunPython(create_ordered_at_index, drop_ordered_at_index),
+            ],
+        ),
+        # Creating pg_trgm needs the CREATE privilege on the database
+        # (PostgreSQL 13+, where it is a trusted extension) or a superuser;
+        # without either, have an administrator run CREATE EXTENSION pg_trgm
+        # first. No-op on other databases.
+        CreateTrigramExtension(),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations, models
+
+# Cursors handed out so far are entry ids; numbering the existing entries
+# by id keeps them valid
+
+
+def number_existing_entries(apps, schema_editor):
+    ChangeLogEntry = apps.get_model("store", "ChangeLogEntry")
+    ChangeLogEntry.objects.update(sequence=models.F("id"))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("store", "0013_order_admin_indexes"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="changelogentry",
+            name="changelog_model_idx",
+        ),
+        migrations.AddField(
+            model_name="changelogentry",
+            name="sequence",
+            field=models.BigIntegerField(editable=False, null=True, unique=True),
+        ),
+        migrations.RunPython(number_existing_entries, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="changelogentry",
+            index=models.Index(
+                fields=["model", "sequence"], name="changelog_model_seq_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="changelogentry",
+            index=models.Index(
+                condition=models.Q(("sequence__isnull", True)),
+                fields=["id"],
+                name="changelog_unnumbered_idx",
+            ),
+        ),
+    ]
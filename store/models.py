@@ -1,4 +1,5 @@
 from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVectorField
 from django.core.exceptions import ValidationError
 from django.db import models
 
@@ -22,14 +23,89 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField()
     image = models.ImageField(upload_to="product_images/", blank=True)
+    # Maintained by store.search on save; GIN indexed on PostgreSQL
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Bulk stock updates set it explicitly; see store.changes for the feed
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["name"]
         permissions = [("manage_product", "Can add/change/delete product")]
+        # Every catalog sort ends with id (keyset pagination), so each
+        # index covers a filter prefix followed by a sort key and id
+        indexes = [
+            models.Index(fields=["name", "id"], name="product_name_idx"),
+            models.Index(fields=["price", "id"], name="product_price_idx"),
+            models.Index(
+                fields=["category", "name", "id"], name="product_category_name_idx"
+            ),
+            models.Index(
+                fields=["category", "price", "id"], name="product_category_price_idx"
+            ),
+            models.Index(
+                fields=["name", "id"],
+                condition=models.Q(stock__gt=0),
+                name="product_in_stock_name_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the row looked like so signal receivers can diff
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_values = {
+            f.attname: getattr(self, f.attname)
+            for f in self._meta.concrete_fields
+            if f.attname not in self.get_deferred_fields()
+        }
+
+    def tracked_changes(self):
+        """
+        Returns {attname: (old, new)} for the fields that differ from the
+        values last loaded from / saved to the database, or None if this
+        instance never came from the database.
+        """
+        loaded = getattr(self, "_loaded_values", None)
+        if loaded is None:
+            return None
+        return {
+            name: (old, getattr(self, name))
+            for name, old in loaded.items()
+            if old != getattr(self, name)
+        }
+
+
+class CatalogFacetCount(models.Model):
+    """
+    Incrementally maintained product counts per (category, price band,
+    in stock) cell. The filter sidebar sums these few rows instead of
+    grouping the whole Product table on every page view.
+    """
+
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    price_band = models.PositiveSmallIntegerField()
+    in_stock = models.BooleanField()
+    product_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["category", "price_band", "in_stock"],
+                name="unique_catalog_facet_cell",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.category_id}/{self.price_band}/{self.in_stock}: {self.product_count}"
+
 
 class Cart(models.Model):
     class Meta:
@@ -37,6 +113,9 @@ class Cart(models.Model):
 
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Kept in step with the items by store.carts.refresh()
+    item_count = models.PositiveIntegerField(default=0)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
 
 
 class CartItem(models.Model):
@@ -48,16 +127,58 @@ class CartItem(models.Model):
         unique_together = ("cart", "product")
 
     def clean(self):
-        # Ensure we don’t exceed available stock
-        if self.quantity > self.product.stock:
+        from .reservations import available
+
+        # Ensure we don’t exceed stock that other carts are not holding
+        left = available(self.product, cart=self.cart_id)
+        if self.quantity > left:
             raise ValidationError(
-                f"Cannot add {self.quantity} of '{self.product.name}' to the cart – only {self.product.stock} left in stock."
+                f"Cannot add {self.quantity} of '{self.product.name}' to the cart – only {max(left, 0)} left in stock."
             )
 
     def __str__(self):
         return f"{self.product.name} x{self.quantity}"
 
 
+class StockReservation(models.Model):
+    """
+    A time-limited hold on stock, placed when a product goes into a cart
+    (a database cart for shoppers, a session key for guests).
+    """
+
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="reservations"
+    )
+    cart = models.ForeignKey(
+        Cart,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="reservations",
+    )
+    session_key = models.CharField(max_length=40, blank=True)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["product", "expires_at"])]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["cart", "product"],
+                condition=models.Q(cart__isnull=False),
+                name="unique_cart_reservation",
+            ),
+            models.UniqueConstraint(
+                fields=["session_key", "product"],
+                condition=~models.Q(session_key=""),
+                name="unique_session_reservation",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} x{self.quantity} until {self.expires_at}"
+
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ("PENDING", "Pending"),
@@ -68,6 +189,7 @@ class Order(models.Model):
 
     class Meta:
         ordering = ["id"]
+        indexes = [models.Index(fields=["ordered_at"])]
 
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     first_name = models.CharField(max_length=50)
@@ -79,6 +201,7 @@ class Order(models.Model):
     ordered_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="PENDING")
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Order #{self.id} - {self.user.username}"
@@ -94,3 +217,120 @@ class OrderItem(models.Model):
 
     def __str__(self):
         return f"{self.product.name} x{self.quantity}"
+
+
+class InventoryMovement(models.Model):
+    """
+    Append-only stock ledger. ``quantity`` is the signed change; movements
+    older than the last compaction are folded into InventorySnapshot.
+    """
+
+    SALE = "SALE"
+    RESTOCK = "RESTOCK"
+    ADJUSTMENT = "ADJUSTMENT"
+    CANCELLATION = "CANCELLATION"
+    KIND_CHOICES = [
+        (SALE, "Sale"),
+        (RESTOCK, "Restock"),
+        (ADJUSTMENT, "Adjustment"),
+        (CANCELLATION, "Cancellation"),
+    ]
+
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="movements"
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    quantity = models.IntegerField()
+    order = models.ForeignKey(
+        Order, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [models.Index(fields=["product", "id"])]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.quantity:+d} of {self.product_id}"
+
+
+class InventorySnapshot(models.Model):
+    """
+    Stock balance of a product as of ``last_movement_id``: the sum of all
+    movements up to that id, which compaction has since deleted.
+    """
+
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="inventory_snapshot",
+    )
+    quantity = models.IntegerField()
+    last_movement_id = models.BigIntegerField(default=0)
+    taken_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.product_id}: {self.quantity} @ {self.last_movement_id}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    The first response to an API request sent with an Idempotency-Key
+    header, replayed when the client retries with the same key.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    # Hash of the request the key was first used for
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "key"], name="unique_user_idempotency_key"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.key}"
+
+
+class ChangeLogEntry(models.Model):
+    """
+    One created / updated / deleted product or order, written in the
+    change's own transaction. ``sequence`` is numbered in commit order
+    once the entry is committed and is the change feed cursor (see
+    store.changes).
+    """
+
+    PRODUCT = "product"
+    ORDER = "order"
+    MODEL_CHOICES = [(PRODUCT, "Product"), (ORDER, "Order")]
+
+    CREATED = "created"
+    UPDATED = "updated"
+    DELETED = "deleted"
+    ACTION_CHOICES = [(CREATED, "Created"), (UPDATED, "Updated"), (DELETED, "Deleted")]
+
+    model = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    changed_at = models.DateTimeField(auto_now_add=True)
+    sequence = models.BigIntegerField(null=True, unique=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["model", "sequence"], name="changelog_model_seq_idx"),
+            models.Index(
+                fields=["id"],
+                condition=models.Q(sequence__isnull=True),
+                name="changelog_unnumbered_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} {self.model} {self.object_id} {self.action}"
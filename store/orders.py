@@ -0,0 +1,89 @@
+"""
+Order placement: one transaction, a conditional stock decrement per
+product and a single bulk insert for the order lines.
+"""
+
+from django.db import models, transaction
+from django.utils import timezone
+
+from . import caching, carts, changes, facets, inventory, pricing, reservations
+from .models import CartItem, ChangeLogEntry, OrderItem, Product
+
+
+class OutOfStock(Exception):
+    def __init__(self, product, requested):
+        self.product = product
+        self.requested = requested
+        super().__init__(
+            f"Not enough stock for product '{product.name}'. "
+            f"Requested: {requested}."
+        )
+
+
+def place_order(order, cart_items):
+    """
+    Saves the unsaved ``order`` with one line per cart item, takes the
+    quantities out of stock and removes the items from the cart.
+
+    Each decrement is an ``UPDATE ... SET stock = stock - n WHERE stock >= n
+    + <held by other carts>``, so two checkouts racing for the last unit
+    cannot both win: the loser updates no row, OutOfStock is raised and the
+    whole order rolls back. The cart's own holds are released on success.
+    Products are updated in primary-key order so concurrent orders lock
+    rows in the same order and cannot deadlock.
+    """
+    cart_items = sorted(cart_items, key=lambda item: item.product_id)
+    order.total_price = pricing.price_items(cart_items).total
+
+    with transaction.atomic():
+        now = timezone.now()
+        for item in cart_items:
+            updated = Product.objects.filter(
+                pk=item.product_id,
+                stock__gte=reservations.held_by_others(cart=item.cart_id)
+                + item.quantity,
+            ).update(stock=models.F("stock") - item.quantity, updated_at=now)
+            if not updated:
+                raise OutOfStock(item.product, item.quantity)
+
+        order.save()
+        OrderItem.objects.bulk_create(
+            OrderItem(
+                order=order,
+                product=item.product,
+                quantity=item.quantity,
+                price_at_order=item.product.price,
+            )
+            for item in cart_items
+        )
+        inventory.record_sale(
+            order, [(item.product_id, item.quantity) for item in cart_items]
+        )
+        CartItem.objects.filter(pk__in=[item.pk for item in cart_items]).delete()
+        if cart_items:
+            reservations.release(
+                cart=cart_items[0].cart_id,
+                product_ids=[item.product_id for item in cart_items],
+            )
+            carts.refresh(cart_items[0].cart_id)
+
+        # The F() updates bypass the Product signals
+        after = (
+            Product.objects.filter(pk__in=[item.product_id for item in cart_items])
+            .order_by()
+            .values_list("category_id", "price", "stock")
+        )
+        for category_id, price, stock in after:
+            if stock == 0:
+                facets.record_move(
+                    facets.facet_key(category_id, price, 1),
+                    facets.facet_key(category_id, price, 0),
+                )
+        caching.products_changed([item.product_id for item in cart_items])
+        changes.record(
+            ChangeLogEntry.PRODUCT,
+            ChangeLogEntry.UPDATED,
+            [item.product_id for item in cart_items],
+        )
+
+    return order
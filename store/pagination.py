@@ -0,0 +1,254 @@
+"""
+Keyset ("seek") pagination.
+
+Instead of OFFSET/COUNT, every page is fetched with a WHERE clause that
+starts right after the last row of the previous page, so page 10 000 costs
+the same index range scan as page 1. Cursors are opaque base64 tokens
+holding the ordering values of the boundary row.
+
+EstimatedCountPaginator keeps page numbers (for the admin) but takes the
+count from the PostgreSQL planner once a table is too big to COUNT(*).
+"""
+
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, models
+from django.utils.functional import cached_property
+
+DEFAULT_ORDERING = ("name", "id")
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values, reverse=False):
+    payload = json.dumps({"v": values, "r": reverse}, cls=DjangoJSONEncoder)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return list(payload["v"]), bool(payload["r"])
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise InvalidCursor(cursor)
+
+
+def ordering_of(queryset):
+    """
+    Returns the queryset ordering as [(field, descending), ...], always
+    ending with the primary key so that every row has a unique position.
+    """
+    order_by = queryset.query.order_by or (
+        queryset.model._meta.ordering if queryset.query.default_ordering else ()
+    )
+    ordering = []
+    for term in order_by or DEFAULT_ORDERING:
+        if not isinstance(term, str):
+            raise ValueError("Keyset pagination only supports field orderings.")
+        name = term.lstrip("-")
+        ordering.append(("id" if name == "pk" else name, term.startswith("-")))
+    if "id" not in {name for name, _ in ordering}:
+        ordering.append(("id", False))
+    return ordering
+
+
+def seek(ordering, values, reverse=False):
+    """
+    Builds the "(a, b, id) > (x, y, z)" row comparison as an OR of
+    prefix-equal terms, which works with mixed sort directions. The extra
+    "a >= x" bound is implied by the OR but lets the database use an
+    index on ``a`` for a range scan instead of reading every row.
+    """
+    condition = models.Q()
+    for i, (name, descending) in enumerate(ordering):
+        lookup = "lt" if descending != reverse else "gt"
+        term = models.Q(**{f"{name}__{lookup}": values[i]})
+        for j, (prev_name, _) in enumerate(ordering[:i]):
+            term &= models.Q(**{prev_name: values[j]})
+        condition |= term
+    name, descending = ordering[0]
+    bound = "lte" if descending != reverse else "gte"
+    return models.Q(**{f"{name}__{bound}": values[0]}) & condition
+
+
+class KeysetPage:
+    def __init__(self, object_list, ordering, has_next, has_previous):
+        self.object_list = object_list
+        self.has_next_page = has_next
+        self.has_previous_page = has_previous
+        self._ordering = ordering
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.has_next_page
+
+    def has_previous(self):
+        return self.has_previous_page
+
+    def has_other_pages(self):
+        return self.has_next_page or self.has_previous_page
+
+    def _values(self, obj):
+        # Rows are model instances, or dicts on the values() fast path
+        if isinstance(obj, dict):
+            return [obj[name] for name, _ in self._ordering]
+        return [getattr(obj, name) for name, _ in self._ordering]
+
+    @property
+    def next_cursor(self):
+        if not self.has_next_page:
+            return None
+        return encode_cursor(self._values(self.object_list[-1]))
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous_page:
+            return None
+        return encode_cursor(self._values(self.object_list[0]), reverse=True)
+
+
+class KeysetPaginator:
+    """
+    Paginates an ordered queryset by cursor rather than page number.
+    There is no total count and no page numbers, only next/previous.
+    """
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = ordering_of(queryset)
+
+    def _field(self, name):
+        annotation = self.queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        opts, field = self.queryset.model._meta, None
+        for part in name.split("__"):
+            field = opts.get_field(part)
+            if field.is_relation:
+                opts = field.related_model._meta
+        return field.target_field if field.is_relation else field
+
+    def decode(self, cursor):
+        """
+        The boundary values and direction of ``cursor``, each value
+        converted by its ordering field. Raises InvalidCursor for anything
+        that could not have come from this ordering.
+        """
+        values, reverse = decode_cursor(cursor)
+        if len(values) != len(self.ordering):
+            raise InvalidCursor(cursor)
+        cleaned = []
+        for value, (name, _) in zip(values, self.ordering):
+            if value is None or isinstance(value, (dict, list)):
+                raise InvalidCursor(cursor)
+            try:
+                value = self._field(name).to_python(value)
+            except (ValidationError, TypeError, ValueError):
+                raise InvalidCursor(cursor)
+            if value is None:
+                raise InvalidCursor(cursor)
+            cleaned.append(value)
+        return cleaned, reverse
+
+    def get_page(self, cursor=None):
+        """
+        Returns the page after (or, for a "previous" cursor, before) the
+        boundary row. A malformed or edited cursor falls back to the first
+        page.
+        """
+        values, reverse = None, False
+        if cursor:
+            try:
+                values, reverse = self.decode(cursor)
+            except InvalidCursor:
+                values, reverse = None, False
+
+        qs = self.queryset
+        if values is not None:
+            qs = qs.filter(seek(self.ordering, values, reverse))
+        if reverse:
+            qs = qs.order_by(
+                *[(name if desc else f"-{name}") for name, desc in self.ordering]
+            )
+        else:
+            qs = qs.order_by(
+                *[(f"-{name}" if desc else name) for name, desc in self.ordering]
+            )
+
+        rows = list(qs[: self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if reverse:
+            rows.reverse()
+            return KeysetPage(rows, self.ordering, True, has_more)
+        return KeysetPage(rows, self.ordering, has_more, values is not None)
+
+
+def estimated_count(queryset):
+    """
+    The planner's row estimate for ``queryset`` on PostgreSQL, which costs
+    no scan; None on other databases.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator whose count is the planner's estimate when that is at least
+    ADMIN_ESTIMATED_COUNT_THRESHOLD rows, and an exact COUNT(*) below it.
+    As the estimate may be off, any page number is accepted; pages past
+    the real end are just empty.
+    """
+
+    @cached_property
+    def count(self):
+        threshold = settings.ADMIN_ESTIMATED_COUNT_THRESHOLD
+        if threshold and hasattr(self.object_list, "query"):
+            estimate = estimated_count(self.object_list)
+            if estimate is not None and estimate >= threshold:
+                return estimate
+        return super().count
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            if int(number) < 1:
+                raise
+            return int(number)
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if number <= self.num_pages:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(
+            self.object_list[bottom : bottom + self.per_page], number, self
+        )
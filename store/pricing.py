@@ -0,0 +1,95 @@
+"""
+Cart pricing.
+
+Every view and API endpoint that shows cart money goes through this
+module: a cart is priced from its lines and the current product prices,
+whether it lives in the database (CartItem rows) or in the guest's
+session ({product_id: quantity}), with one query for all its products.
+Amounts are Decimals throughout.
+"""
+
+from decimal import Decimal
+
+from . import carts
+from .models import Product
+
+
+def line_subtotal(product, quantity):
+    return product.price * quantity
+
+
+class CartLine:
+    """
+    One priced line. ``pk`` is what the cart page links to: the CartItem
+    id for database carts, the product id for session carts. ``item`` is
+    the CartItem, if there is one.
+    """
+
+    def __init__(self, pk, product, quantity, item=None):
+        self.pk = pk
+        self.product = product
+        self.quantity = quantity
+        self.item = item
+        self.subtotal = line_subtotal(product, quantity)
+
+
+class PricedCart:
+    def __init__(self, lines):
+        self.lines = lines
+        self.total = sum((line.subtotal for line in lines), Decimal("0"))
+        self.item_count = sum(line.quantity for line in lines)
+
+    def __iter__(self):
+        return iter(self.lines)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def items(self):
+        """
+        The CartItems of a database cart, with their products loaded.
+        """
+        return [line.item for line in self.lines if line.item is not None]
+
+
+def price_items(items):
+    """
+    Prices CartItems whose products are already loaded; no queries.
+    """
+    return PricedCart(
+        [CartLine(item.pk, item.product, item.quantity, item) for item in items]
+    )
+
+
+def price_cart(cart):
+    """
+    Prices a database cart (or None) with one query for its items and
+    their products.
+    """
+    if cart is None:
+        return PricedCart([])
+    return price_items(cart.items.select_related("product").order_by("id"))
+
+
+def price_session_cart(session_cart):
+    """
+    Prices a guest's session cart with one query for its products. Lines
+    whose product no longer exists are skipped.
+    """
+    products = Product.objects.in_bulk([int(pk) for pk in session_cart])
+    return PricedCart(
+        [
+            CartLine(product.pk, product, session_cart[str(product.pk)])
+            for product in sorted(products.values(), key=lambda p: p.pk)
+        ]
+    )
+
+
+def price_visitor_cart(request):
+    """
+    The current visitor's cart, priced: the user's Cart when logged in,
+    the session cart otherwise.
+    """
+    if request.user.is_authenticated:
+        return price_cart(carts.user_cart(request.user))
+    return price_session_cart(request.session.get("cart", {}))
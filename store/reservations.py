@@ -0,0 +1,190 @@
+"""
+Time-limited stock holds for carts.
+
+Putting a product in a cart holds that quantity for STOCK_RESERVATION_TTL
+seconds; every cart change refreshes the hold. Available-to-sell is
+``stock`` minus the active holds of *other* carts, read with one grouped
+query over the (product, expires_at) index. Expired holds are ignored by
+every read and swept in bulk by ``manage.py release_expired_reservations``.
+
+Holds are advisory: the authoritative check is still the conditional
+stock decrement at checkout (see store.orders).
+"""
+
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import StockReservation
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product, requested, available):
+        self.product = product
+        self.requested = requested
+        self.available = available
+        super().__init__(
+            f"Cannot add {requested} of '{product.name}' to the cart – "
+            f"only {max(available, 0)} available."
+        )
+
+
+def guest_key(session):
+    """
+    Key that identifies a guest's holds. It lives in the session data
+    rather than being the session key itself, so it survives the key
+    rotation done by login() and the holds can move to the user's cart.
+    """
+    key = session.get("cart_key")
+    if not key:
+        key = session["cart_key"] = uuid.uuid4().hex
+    return key
+
+
+def _owner_filter(cart=None, session_key=""):
+    if cart is not None:
+        return models.Q(cart=cart)
+    return models.Q(session_key=session_key, cart__isnull=True)
+
+
+def active_holds(now=None):
+    return StockReservation.objects.filter(expires_at__gt=now or timezone.now())
+
+
+def held_quantities(product_ids, cart=None, session_key=""):
+    """
+    {product_id: quantity held by carts other than the given one}.
+    """
+    holds = active_holds().filter(product_id__in=product_ids)
+    if cart is not None or session_key:
+        holds = holds.exclude(_owner_filter(cart, session_key))
+    return dict(
+        holds.values("product_id")
+        .annotate(held=models.Sum("quantity"))
+        .values_list("product_id", "held")
+        .order_by()
+    )
+
+
+def held_by_others(cart=None, session_key=""):
+    """
+    Expression for the quantity of the outer Product row held by other
+    carts, usable in annotate() and in filter() / update() conditions.
+    """
+    holds = active_holds().filter(product=models.OuterRef("pk"))
+    if cart is not None or session_key:
+        holds = holds.exclude(_owner_filter(cart, session_key))
+    total = (
+        holds.order_by()
+        .values("product")
+        .annotate(held=models.Sum("quantity"))
+        .values("held")
+    )
+    return Coalesce(models.Subquery(total, output_field=models.IntegerField()), 0)
+
+
+def available(product, cart=None, session_key=""):
+    """
+    Units of ``product`` the given cart could still take.
+    """
+    held = held_quantities([product.pk], cart, session_key).get(product.pk, 0)
+    return product.stock - held
+
+
+def hold(product, quantity, cart=None, session_key=""):
+    """
+    Sets the cart's hold on ``product`` to ``quantity`` (its whole line,
+    not an increment) with a fresh expiry. Raises InsufficientStock if the
+    other carts' holds leave less than that.
+    """
+    free = available(product, cart, session_key)
+    if quantity > free:
+        raise InsufficientStock(product, quantity, free)
+
+    expires_at = timezone.now() + timedelta(seconds=settings.STOCK_RESERVATION_TTL)
+    existing = StockReservation.objects.filter(
+        _owner_filter(cart, session_key), product=product
+    )
+    if existing.update(quantity=quantity, expires_at=expires_at):
+        return
+    try:
+        with transaction.atomic():
+            StockReservation.objects.create(
+                product=product,
+                cart=cart,
+                session_key="" if cart is not None else session_key,
+                quantity=quantity,
+                expires_at=expires_at,
+            )
+    except IntegrityError:
+        existing.update(quantity=quantity, expires_at=expires_at)
+
+
+def hold_many(cart, quantities, session_key="", strict=False):
+    """
+    hold() for several products at once, in a fixed number of queries;
+    ``quantities`` maps products to line quantities. Lines the other
+    carts' holds leave no room for go unreserved (checkout re-checks stock
+    anyway) and their products are returned; with ``strict`` the first of
+    them raises InsufficientStock instead and nothing is held.
+    """
+    held = held_quantities([product.pk for product in quantities], cart, session_key)
+    fits = {}
+    for product, quantity in quantities.items():
+        free = product.stock - held.get(product.pk, 0)
+        if quantity <= free:
+            fits[product] = quantity
+        elif strict:
+            raise InsufficientStock(product, quantity, free)
+    expires_at = timezone.now() + timedelta(seconds=settings.STOCK_RESERVATION_TTL)
+    StockReservation.objects.filter(
+        _owner_filter(cart, session_key), product__in=list(quantities)
+    ).delete()
+    StockReservation.objects.bulk_create(
+        [
+            StockReservation(
+                product=product,
+                cart=cart,
+                session_key="" if cart is not None else session_key,
+                quantity=quantity,
+                expires_at=expires_at,
+            )
+            for product, quantity in fits.items()
+        ],
+        ignore_conflicts=True,
+    )
+    return [product for product in quantities if product not in fits]
+
+
+def release(cart=None, session_key="", product_ids=None):
+    """
+    Drops the cart's holds, optionally only for some products.
+    """
+    if cart is None and not session_key:
+        return
+    holds = StockReservation.objects.filter(_owner_filter(cart, session_key))
+    if product_ids is not None:
+        holds = holds.filter(product_id__in=product_ids)
+    holds.delete()
+
+
+def release_expired(batch_size=5000):
+    """
+    Deletes expired holds a batch at a time (one SELECT of ids and one
+    DELETE per batch) and returns how many were removed.
+    """
+    now = timezone.now()
+    removed = 0
+    while True:
+        ids = list(
+            StockReservation.objects.filter(expires_at__lte=now)
+            .order_by()
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not ids:
+            return removed
+        removed += StockReservation.objects.filter(pk__in=ids).delete()[0]
@@ -0,0 +1,149 @@
+"""
+Full-text product search.
+
+PostgreSQL keeps a weighted tsvector in Product.search_vector (GIN indexed),
+SQLite keeps a shadow FTS5 table keyed by product id. Any other backend
+falls back to icontains lookups so the catalog keeps working.
+"""
+
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections, models
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = "store_product_fts"
+MAX_TERMS = 10
+
+
+def search_config():
+    return getattr(settings, "STORE_SEARCH_CONFIG", "english")
+
+
+def product_search_vector():
+    """
+    Weighted vector: a hit in the name ranks above a hit in the description.
+    """
+    config = search_config()
+    return SearchVector("name", weight="A", config=config) + SearchVector(
+        "description", weight="B", config=config
+    )
+
+
+def parse_terms(query):
+    """
+    Split the raw user input into plain word tokens, dropping any
+    operators or quotes that would break the backend query syntax.
+    """
+    return re.findall(r"\w+", query.lower())[:MAX_TERMS]
+
+
+def search_products(queryset, query):
+    """
+    Restrict ``queryset`` to products matching every word of ``query``,
+    each as a prefix ("lam desk" finds "Desk lamp"; the icontains fallback
+    matches anywhere in a word), and annotate each row with
+    ``search_rank``, where higher is more relevant.
+    """
+    terms = parse_terms(query)
+    if not terms:
+        return queryset.annotate(
+            search_rank=models.Value(0.0, output_field=models.FloatField())
+        ).none()
+
+    vendor = connections[queryset.db].vendor
+    if vendor == "postgresql":
+        search_query = SearchQuery(
+            " & ".join(f"{term}:*" for term in terms),
+            search_type="raw",
+            config=search_config(),
+        )
+        return queryset.filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(models.F("search_vector"), search_query)
+        )
+
+    if vendor == "sqlite":
+        match = " ".join(f'"{term}"*' for term in terms)
+        table = queryset.model._meta.db_table
+        # Score every hit in one pass and look the rows up in that result.
+        # A per-row MATCH would recompute bm25()'s term statistics for
+        # each row, which is quadratic in the number of hits.
+        materialized = (
+            "MATERIALIZED"
+            if connections[queryset.db].Database.sqlite_version_info >= (3, 35)
+            else ""
+        )
+        return queryset.filter(
+            pk__in=RawSQL(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", (match,)
+            )
+        ).annotate(
+            # bm25() is "lower is better", flip it to match SearchRank
+            search_rank=RawSQL(
+                f"WITH hits AS {materialized} ("
+                f"SELECT rowid AS id, -bm25({FTS_TABLE}, 10.0, 1.0) AS score "
+                f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s) "
+                f'SELECT score FROM hits WHERE hits.id = "{table}"."id"',
+                (match,),
+                output_field=models.FloatField(),
+            )
+        )
+
+    condition = models.Q()
+    for term in terms:
+        condition &= models.Q(name__icontains=term) | models.Q(
+            description__icontains=term
+        )
+    return queryset.filter(condition).annotate(
+        search_rank=models.Value(0.0, output_field=models.FloatField())
+    )
+
+
+def index_product(product):
+    """
+    Refresh the search entry of a single product after it was saved.
+    """
+    from .models import Product
+
+    connection = connections[product._state.db or "default"]
+    if connection.vendor == "postgresql":
+        Product.objects.using(connection.alias).filter(pk=product.pk).update(
+            search_vector=product_search_vector()
+        )
+    elif connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product.pk])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)",
+                [product.pk, product.name, product.description],
+            )
+
+
+def unindex_product(product):
+    """
+    Drop a deleted product from the shadow FTS table (the tsvector column
+    goes away together with the row on PostgreSQL).
+    """
+    connection = connections[product._state.db or "default"]
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product.pk])
+
+
+def rebuild_index(using="default"):
+    """
+    Re-index the whole catalog in one statement per backend.
+    """
+    from .models import Product
+
+    connection = connections[using]
+    if connection.vendor == "postgresql":
+        Product.objects.using(using).update(search_vector=product_search_vector())
+    elif connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, description) "
+                f"SELECT id, name, description FROM {Product._meta.db_table}"
+            )
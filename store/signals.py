@@ -0,0 +1,179 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from . import caching, carts, changes, facets, inventory, search
+from .api import authentication
+from .models import Category, ChangeLogEntry, InventoryMovement, Order, Product
+
+User = get_user_model()
+
+SEARCH_FIELDS = {"name", "description"}
+FACET_FIELDS = {"category_id", "price", "stock"}
+
+
+@receiver(post_save, sender=Product)
+def index_product_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    changes = instance.tracked_changes()
+    if changes is not None and not SEARCH_FIELDS & changes.keys():
+        return
+    search.index_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product_on_delete(sender, instance, **kwargs):
+    search.unindex_product(instance)
+
+
+def _writes_facet_fields(update_fields):
+    if update_fields is None:
+        return True
+    written = {Product._meta.get_field(name).attname for name in update_fields}
+    return bool(FACET_FIELDS & written)
+
+
+@receiver(pre_save, sender=Product)
+def remember_old_values(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Keeps the row's (category_id, price, stock) as it is before an update,
+    for the facet counts and the stock ledger, from the loaded values or,
+    for instances that were not loaded whole, one query.
+    """
+    instance._values_before = None
+    if raw or instance.pk is None or not _writes_facet_fields(update_fields):
+        return
+    loaded = getattr(instance, "_loaded_values", {})
+    if FACET_FIELDS <= loaded.keys():
+        instance._values_before = (
+            loaded["category_id"],
+            loaded["price"],
+            loaded["stock"],
+        )
+    else:
+        instance._values_before = (
+            Product.objects.filter(pk=instance.pk)
+            .values_list("category_id", "price", "stock")
+            .first()
+        )
+
+
+@receiver(post_save, sender=Product)
+def update_facets_on_save(
+    sender, instance, created, raw=False, update_fields=None, **kwargs
+):
+    if raw or not _writes_facet_fields(update_fields):
+        return
+    before = getattr(instance, "_values_before", None)
+    deferred = instance.get_deferred_fields()
+    # Fields that were not written keep their old value; reading them off
+    # the instance would load them one query each
+    category_id, price, stock = [
+        old if name in deferred else getattr(instance, name)
+        for name, old in zip(("category_id", "price", "stock"), before or (None,) * 3)
+    ]
+    new_key = facets.facet_key(category_id, price, stock)
+    if created or before is None:
+        facets.record_move(None, new_key)
+        return
+    facets.record_move(facets.facet_key(*before), new_key)
+
+
+@receiver(post_delete, sender=Product)
+def update_facets_on_delete(sender, instance, **kwargs):
+    values = getattr(instance, "_loaded_values", {})
+    facets.record_move(
+        facets.facet_key(
+            values.get("category_id", instance.category_id),
+            values.get("price", instance.price),
+            values.get("stock", instance.stock),
+        ),
+        None,
+    )
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_cache(sender, instance, raw=False, **kwargs):
+    caching.product_changed(instance)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_cache(sender, instance, raw=False, **kwargs):
+    caching.category_changed(instance)
+
+
+@receiver(post_save, sender=Product)
+def record_stock_movement(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        inventory.record(instance.pk, InventoryMovement.RESTOCK, instance.stock)
+        return
+    # Edits from the admin or the API; checkout and cancellations write
+    # their own movements because they bypass save()
+    before = getattr(instance, "_values_before", None)
+    if before is None or "stock" in instance.get_deferred_fields():
+        return
+    if instance.stock != before[2]:
+        inventory.record(
+            instance.pk, InventoryMovement.ADJUSTMENT, instance.stock - before[2]
+        )
+
+
+@receiver(post_save, sender=Product)
+def refresh_cart_totals_on_price_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    changes = instance.tracked_changes()
+    if changes is not None and "price" in changes:
+        carts.refresh_for_products([instance.pk])
+
+
+@receiver(pre_delete, sender=Product)
+def drop_product_from_carts(sender, instance, **kwargs):
+    carts.drop_product(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Order)
+def log_change_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    model = ChangeLogEntry.PRODUCT if sender is Product else ChangeLogEntry.ORDER
+    action = ChangeLogEntry.CREATED if created else ChangeLogEntry.UPDATED
+    changes.record(model, action, [instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Order)
+def log_change_on_delete(sender, instance, **kwargs):
+    model = ChangeLogEntry.PRODUCT if sender is Product else ChangeLogEntry.ORDER
+    changes.record(model, ChangeLogEntry.DELETED, [instance.pk])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    authentication.users.forget(instance.pk)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def forget_cached_user_permissions(sender, instance, reverse, **kwargs):
+    # Reverse changes (from the group or permission side) touch any user
+    authentication.users.forget(None if reverse else instance.pk)
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def forget_cached_group_members(sender, **kwargs):
+    authentication.users.forget()
@@ -0,0 +1,154 @@
+from unittest import mock
+
+from django.contrib.auth.models import Group, Permission, User
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from store import authz
+from store.models import Category, Order, OrderItem, Product
+
+
+class AdminQueryCountTest(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Lamps", slug="lamps")
+        buyer = User.objects.create_user("buyer")
+        for i in range(25):
+            product = Product.objects.create(
+                name=f"Lamp {i}", price=10, stock=5, category=category
+            )
+            order = Order.objects.create(
+                user=buyer,
+                first_name="A",
+                last_name="B",
+                address="C",
+                city="D",
+                postal_code="1",
+                phone="2",
+                total_price=10,
+            )
+            OrderItem.objects.create(
+                order=order, product=product, quantity=1, price_at_order=10
+            )
+
+    def member(self, username, group, *codenames):
+        group, _ = Group.objects.get_or_create(name=group)
+        group.permissions.set(Permission.objects.filter(codename__in=codenames))
+        user = User.objects.create_user(username, is_staff=True)
+        user.groups.add(group)
+        return user
+
+    def test_checks_answered_from_memory(self):
+        staff = self.member("sam", authz.STAFF, "change_order")
+        request = RequestFactory().get("/")
+        request.user = User.objects.get(pk=staff.pk)
+        # The groups with their permissions, then the user's own
+        with self.assertNumQueries(2):
+            for _ in range(10):
+                self.assertTrue(authz.resolve(request).is_staff_member)
+                self.assertTrue(request.user.has_perm("store.change_order"))
+                self.assertFalse(request.user.has_perm("store.change_product"))
+
+    def assertPageQueries(self, user, url, num):
+        self.client.force_login(user)
+        with self.assertNumQueries(num):
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        return resp
+
+    def test_staff_pages(self):
+        staff = self.member("sam", authz.STAFF, "change_order")
+        self.assertPageQueries(staff, reverse("admin:index"), 6)
+        self.assertPageQueries(staff, reverse("admin:store_order_changelist"), 9)
+
+    def test_manager_pages(self):
+        manager = self.member(
+            "mia", authz.MANAGERS, "change_product", "change_category"
+        )
+        self.assertPageQueries(manager, reverse("admin:index"), 6)
+        self.assertPageQueries(manager, reverse("admin:store_product_changelist"), 9)
+
+    def test_superuser_pages(self):
+        root = User.objects.create_superuser("root", "root@example.com", "pass")
+        self.assertPageQueries(root, reverse("admin:store_order_changelist"), 7)
+        self.assertPageQueries(root, reverse("admin:store_product_changelist"), 7)
+
+
+class LargeTableAdminTest(TestCase):
+    def setUp(self):
+        self.root = User.objects.create_superuser("root", "root@example.com", "pass")
+        self.client.force_login(self.root)
+        self.url = reverse("admin:store_order_changelist")
+
+    def add_orders(self, count):
+        for i in range(count):
+            Order.objects.create(
+                user=User.objects.create_user(f"buyer{Order.objects.count()}"),
+                first_name="Ann",
+                last_name=f"Lee{i}",
+                address="1 Main St",
+                city="Lyon",
+                postal_code="69001",
+                total_price=10,
+            )
+
+    def count_queries(self, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(self.url, params).status_code, 200)
+        return len(queries)
+
+    def test_rows_load_their_users(self):
+        self.add_orders(3)
+        few = self.count_queries()
+        self.add_orders(15)
+        self.assertEqual(self.count_queries(), few)
+        self.assertEqual(self.count_queries({"q": "lee1"}), few)
+
+    def test_search_matches_order_fields_or_username(self):
+        self.add_orders(3)
+        Order.objects.filter(last_name="Lee2").update(city="Paris")
+
+        def found(term):
+            resp = self.client.get(self.url, {"q": term})
+            return sorted(o.last_name for o in resp.context["cl"].result_list)
+
+        self.assertEqual(found("lee1"), ["Lee1"])
+        self.assertEqual(found("buyer0"), ["Lee0"])
+        self.assertEqual(found("paris"), ["Lee2"])
+        self.assertEqual(found("ann lyon"), ["Lee0", "Lee1"])
+        self.assertEqual(found('"1 main"'), ["Lee0", "Lee1", "Lee2"])
+
+    def test_estimated_count(self):
+        self.add_orders(3)
+        with mock.patch("store.pagination.estimated_count", return_value=2_000_000):
+            with CaptureQueriesContext(connection) as queries:
+                resp = self.client.get(self.url)
+            self.assertContains(resp, "2000000 orders")
+            self.assertFalse([q for q in queries if "COUNT(" in q["sql"].upper()])
+            # Pages past the real end are empty rather than errors
+            resp = self.client.get(self.url, {"p": "500"})
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(list(resp.context["cl"].result_list), [])
+
+        with self.settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=0):
+            self.assertContains(self.client.get(self.url), "3 orders")
+
+    def test_date_hierarchy(self):
+        self.add_orders(2)
+        year = Order.objects.first().ordered_at.year
+        resp = self.client.get(self.url, {"ordered_at__year": year})
+        self.assertEqual(len(resp.context["cl"].result_list), 2)
+
+    def test_product_search_uses_catalog_index(self):
+        category = Category.objects.create(name="Lamps", slug="lamps")
+        Product.objects.create(
+            name="Walnut desk lamp", price=10, stock=1, category=category
+        )
+        Product.objects.create(name="Oak chair", price=10, stock=1, category=category)
+        resp = self.client.get(
+            reverse("admin:store_product_changelist"), {"q": "walnut la"}
+        )
+        self.assertEqual(
+            [p.name for p in resp.context["cl"].result_list], ["Walnut desk lamp"]
+        )
@@ -1,9 +1,22 @@
+from unittest import mock
+
 from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from store.models import Category, Product
+from store.models import (
+    Cart,
+    CartItem,
+    Category,
+    IdempotencyKey,
+    Order,
+    OrderItem,
+    Product,
+)
 
 
 class StoreApiTest(APITestCase):
@@ -25,7 +38,7 @@ class StoreApiTest(APITestCase):
         url = reverse("product-list")
         resp = self.client.get(url)
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(resp.json()), 1)
+        self.assertEqual(len(resp.json()["results"]), 1)
 
     def test_manager_can_create_product(self):
         self.client.force_authenticate(self.manager)
@@ -78,3 +91,219 @@ class StoreApiTest(APITestCase):
             url_order_detail, {"status": "PROCESSING"}, format="json"
         )
         self.assertEqual(resp3.status_code, status.HTTP_200_OK)
+
+
+class ApiQueryCountTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("joe", "joe@example.com", "pass")
+        cart = Cart.objects.create(user=self.user)
+        for i in range(2):
+            cat = Category.objects.create(name=f"C{i}", slug=f"c{i}")
+            for j in range(3):
+                product = Product.objects.create(
+                    name=f"P{i}{j}", price=2, stock=5, category=cat
+                )
+                CartItem.objects.create(cart=cart, product=product, quantity=1)
+        for _ in range(3):
+            order = Order.objects.create(user=self.user, total_price=4)
+            for product in Product.objects.all()[:2]:
+                OrderItem.objects.create(
+                    order=order, product=product, quantity=2, price_at_order=2
+                )
+
+    def assertListQueries(self, name, num):
+        with self.assertNumQueries(num):
+            resp = self.client.get(reverse(name))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return resp.json()
+
+    def test_category_list(self):
+        # count + page
+        self.assertEqual(self.assertListQueries("category-list", 2)["count"], 2)
+
+    def test_product_list(self):
+        # one page of products joined with their categories
+        data = self.assertListQueries("product-list", 1)
+        self.assertEqual(data["results"][0]["category"], "C0")
+
+    def test_cart_list(self):
+        self.client.force_authenticate(self.user)
+        # count + page of lines joined with products and categories
+        data = self.assertListQueries("cart-list", 2)
+        self.assertEqual(len(data["results"]), 6)
+        self.assertEqual(data["results"][0]["product"]["category"], "C0")
+
+    def test_order_list(self):
+        self.client.force_authenticate(self.user)
+        # 2 permission lookups, count, page, then every page's lines with
+        # their products and categories in one prefetch
+        data = self.assertListQueries("order-list", 5)
+        self.assertEqual(len(data["results"]), 3)
+        self.assertEqual(len(data["results"][0]["items"]), 2)
+        self.assertEqual(data["results"][0]["items"][0]["product"]["category"], "C0")
+
+
+class IdempotentOrderTest(APITestCase):
+    SHIPPING = {
+        "first_name": "J",
+        "last_name": "D",
+        "address": "A",
+        "city": "C",
+        "postal_code": "123",
+        "phone": "000",
+    }
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("joe", "joe@example.com", "pass")
+        cat = Category.objects.create(name="C", slug="c")
+        self.prod = Product.objects.create(name="P", price=3, stock=5, category=cat)
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.prod, quantity=2)
+        self.client.force_authenticate(self.user)
+
+    def post(self, key, data=None):
+        return self.client.post(
+            reverse("order-list"),
+            data or self.SHIPPING,
+            format="json",
+            headers={"Idempotency-Key": key},
+        )
+
+    def test_retry_replays_first_response(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.post("abc")
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(first.json()["total_price"], "6.00")
+        self.assertEqual(len(first.json()["items"]), 1)
+        self.prod.refresh_from_db()
+        self.assertEqual(self.prod.stock, 3)
+
+        with self.assertNumQueries(0):
+            retry = self.post("abc")
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry.headers["Idempotent-Replayed"], "true")
+
+        cache.clear()
+        self.assertEqual(self.post("abc").json(), first.json())
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_key_reused_for_other_request(self):
+        self.post("abc")
+        resp = self.post("abc", dict(self.SHIPPING, city="Other"))
+        self.assertEqual(resp.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_failed_request_stores_nothing(self):
+        Product.objects.filter(pk=self.prod.pk).update(stock=1)
+        resp = self.post("abc")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertFalse(Order.objects.exists())
+
+        Product.objects.filter(pk=self.prod.pk).update(stock=5)
+        self.assertEqual(self.post("abc").status_code, status.HTTP_201_CREATED)
+
+
+class ProductFilteringTest(APITestCase):
+    def setUp(self):
+        self.lamps = Category.objects.create(name="Lamps", slug="lamps")
+        chairs = Category.objects.create(name="Chairs", slug="chairs")
+        for name, price, stock, cat in [
+            ("Desk lamp", 20, 3, self.lamps),
+            ("Floor lamp", 80, 0, self.lamps),
+            ("Wall lamp", 45, 1, self.lamps),
+            ("Oak chair", 60, 2, chairs),
+        ]:
+            Product.objects.create(name=name, price=price, stock=stock, category=cat)
+
+    def names(self, **params):
+        resp = self.client.get(reverse("product-list"), params)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return [row["name"] for row in resp.json()["results"]]
+
+    def test_filters(self):
+        self.assertEqual(
+            self.names(category=self.lamps.pk),
+            ["Desk lamp", "Floor lamp", "Wall lamp"],
+        )
+        self.assertEqual(
+            self.names(min_price=40, max_price=70), ["Oak chair", "Wall lamp"]
+        )
+        self.assertEqual(
+            self.names(category=self.lamps.pk, in_stock="true"),
+            ["Desk lamp", "Wall lamp"],
+        )
+        # Garbage is ignored like on the HTML catalog
+        self.assertEqual(len(self.names(min_price="cheap")), 4)
+
+    def test_ordering_and_search(self):
+        self.assertEqual(
+            self.names(ordering="-price"),
+            ["Floor lamp", "Oak chair", "Wall lamp", "Desk lamp"],
+        )
+        self.assertEqual(
+            self.names(search="lamp", in_stock="true", ordering="price"),
+            ["Desk lamp", "Wall lamp"],
+        )
+        # Unknown fields are dropped, leaving the default order
+        self.assertEqual(self.names(ordering="description")[0], "Desk lamp")
+
+    def test_cursor_walk_keeps_ordering(self):
+        url = reverse("product-list")
+        resp = self.client.get(url, {"ordering": "-price", "page_size": 3}).json()
+        rest = self.client.get(resp["next"]).json()
+        self.assertEqual(
+            [row["price"] for row in resp["results"] + rest["results"]],
+            ["80.00", "60.00", "45.00", "20.00"],
+        )
+
+
+class SparseFieldsTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("joe", "joe@example.com", "pass")
+        cat = Category.objects.create(name="Lamps", slug="lamps")
+        cart = Cart.objects.create(user=self.user)
+        for i in range(5):
+            product = Product.objects.create(
+                name=f"Lamp {i}",
+                description="Bright",
+                price=10 + i,
+                stock=i,
+                category=cat,
+            )
+            CartItem.objects.create(cart=cart, product=product, quantity=2)
+
+    def get(self, name, **params):
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(reverse(name), params)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return resp.json(), " ".join(q["sql"] for q in queries)
+
+    def test_fields_narrow_response_and_columns(self):
+        data, sql = self.get("product-list", fields="id,name,price")
+        self.assertEqual(
+            data["results"][0],
+            {"id": data["results"][0]["id"], "name": "Lamp 0", "price": "10.00"},
+        )
+        self.assertNotIn("description", sql)
+        self.assertNotIn("store_category", sql)
+
+    def test_omit(self):
+        data, sql = self.get("product-list", omit="description,category")
+        self.assertEqual(
+            set(data["results"][0]), {"id", "name", "price", "stock", "image"}
+        )
+        self.assertNotIn("description", sql)
+
+    def test_fast_path_matches_serializer(self):
+        self.client.force_authenticate(self.user)
+        for name, params in [
+            ("product-list", {"ordering": "-price", "page_size": 2}),
+            ("product-list", {"fields": "id,category"}),
+            ("cart-list", {}),
+        ]:
+            fast, _ = self.get(name, **params)
+            with mock.patch("store.api.fastpath.values_plan", return_value=None):
+                slow, _ = self.get(name, **params)
+            self.assertEqual(fast, slow)
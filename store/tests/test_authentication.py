@@ -0,0 +1,98 @@
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import Permission, User
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIRequestFactory, APITestCase
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+
+from store.api.authentication import CachedJWTAuthentication, blacklist, users
+
+
+class CachedJWTAuthenticationTest(APITestCase):
+    def setUp(self):
+        users.forget()
+        blacklist.reset()
+        self.user = User.objects.create_user("joe", password="pass")
+        tokens = self.client.post(
+            reverse("token_obtain_pair"), {"username": "joe", "password": "pass"}
+        ).json()
+        self.access, self.refresh = tokens["access"], tokens["refresh"]
+
+    def authenticate(self):
+        request = APIRequestFactory().get(
+            "/", HTTP_AUTHORIZATION=f"Bearer {self.access}"
+        )
+        user, _ = CachedJWTAuthentication().authenticate(request)
+        return user
+
+    def test_no_queries_once_cached(self):
+        self.assertEqual(self.authenticate(), self.user)
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+            self.assertFalse(user.has_perm("store.change_product"))
+        # Each request gets its own instance
+        self.assertIsNot(user, self.authenticate())
+
+    def test_expired_users_are_pruned(self):
+        other = User.objects.create_user("ann", password="pass")
+        users.get(other.pk)
+        self.authenticate()
+        self.assertEqual(users.entries.keys(), {self.user.pk, other.pk})
+        later = time.monotonic() + 2 * settings.JWT_USER_CACHE_TTL
+        with mock.patch("time.monotonic", return_value=later):
+            self.authenticate()
+        self.assertEqual(users.entries.keys(), {self.user.pk})
+
+    def test_permission_changes_are_seen(self):
+        self.assertFalse(self.authenticate().has_perm("store.change_product"))
+        self.user.user_permissions.add(
+            Permission.objects.get(codename="change_product")
+        )
+        self.assertTrue(self.authenticate().has_perm("store.change_product"))
+
+        self.user.is_active = False
+        self.user.save()
+        resp = self.client.get(
+            reverse("cart-list"), headers={"authorization": f"Bearer {self.access}"}
+        )
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logout_revokes_access_token(self):
+        headers = {"authorization": f"Bearer {self.access}"}
+        resp = self.client.get(reverse("cart-list"), headers=headers)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+        resp = self.client.post(
+            reverse("token_logout"), {"refresh": self.refresh}, headers=headers
+        )
+        self.assertEqual(resp.status_code, status.HTTP_205_RESET_CONTENT)
+        resp = self.client.get(reverse("cart-list"), headers=headers)
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        # Another process only learns of it from the database
+        blacklist.reset()
+        resp = self.client.get(reverse("cart-list"), headers=headers)
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_sees_rows_committed_out_of_id_order(self):
+        # The refresh token issued in setUp
+        early = OutstandingToken.objects.get(user=self.user)
+        late = OutstandingToken.objects.create(
+            user=self.user,
+            jti="late",
+            token="late",
+            expires_at=early.expires_at,
+        )
+        BlacklistedToken.objects.create(pk=10, token=late)
+        blacklist.refresh()
+        # Took its id before the row above but committed after the refresh
+        BlacklistedToken.objects.create(pk=5, token=early)
+        blacklist.refresh()
+        self.assertIn(early.jti, blacklist)
+        self.assertIn("late", blacklist)
@@ -0,0 +1,140 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import Permission, User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from store import facets
+from store.models import (
+    Cart,
+    CartItem,
+    CatalogFacetCount,
+    Category,
+    InventoryMovement,
+    Product,
+)
+
+
+class BulkProductUpdateTest(APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Lamps", slug="lamps")
+        self.products = [
+            Product.objects.create(
+                name=f"Lamp {i}", price=10, stock=5, category=self.category
+            )
+            for i in range(60)
+        ]
+        self.manager = User.objects.create_user("mia", password="pass")
+        self.manager.user_permissions.add(
+            Permission.objects.get(codename="change_product")
+        )
+        self.client.force_authenticate(self.manager)
+        self.url = reverse("product-bulk-update")
+
+    def patch(self, rows):
+        return self.client.patch(self.url, rows, format="json")
+
+    def facet_counts(self):
+        return {
+            (c.category_id, c.price_band, c.in_stock): c.product_count
+            for c in CatalogFacetCount.objects.exclude(product_count=0)
+        }
+
+    def test_applies_patches_and_side_effects(self):
+        lamp, other, same = self.products[:3]
+        user = User.objects.create_user("joe", password="pass")
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.create(cart=cart, product=lamp, quantity=2)
+
+        resp = self.patch(
+            [
+                {"id": lamp.pk, "price": "12.50", "stock": 2},
+                {"id": other.pk, "stock": 0},
+                {"id": same.pk, "price": "10"},
+            ]
+        )
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            resp.json()["results"],
+            [
+                {"id": lamp.pk, "status": "updated"},
+                {"id": other.pk, "status": "updated"},
+                {"id": same.pk, "status": "unchanged"},
+            ],
+        )
+        lamp.refresh_from_db()
+        self.assertEqual((lamp.price, lamp.stock), (Decimal("12.50"), 2))
+        self.assertEqual(
+            list(
+                InventoryMovement.objects.filter(
+                    kind=InventoryMovement.ADJUSTMENT
+                ).values_list("product_id", "quantity")
+            ),
+            [(lamp.pk, -3), (other.pk, -5)],
+        )
+        cart.refresh_from_db()
+        self.assertEqual(cart.total, Decimal("25.00"))
+        maintained = self.facet_counts()
+        facets.rebuild()
+        self.assertEqual(maintained, self.facet_counts())
+
+    def test_statements_do_not_grow_with_batch(self):
+        def count(products, price):
+            rows = [{"id": p.pk, "price": price, "stock": 7} for p in products]
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.patch(rows).status_code, status.HTTP_200_OK)
+            return len(queries)
+
+        # The first request also loads the manager's permissions
+        count(self.products[:1], "11")
+        self.assertEqual(count(self.products[:10], "12"), count(self.products, "13"))
+
+    def test_batch_is_all_or_nothing(self):
+        lamp = self.products[0]
+        resp = self.patch([{"id": lamp.pk, "price": "5"}, {"id": lamp.pk + 1000}])
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(resp.json()[0], {})
+        self.assertIn("non_field_errors", resp.json()[1])
+
+        resp = self.patch([{"id": lamp.pk, "price": "5"}, {"id": 999, "stock": 1}])
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(resp.json()["ids"], [999])
+
+        resp = self.patch([{"id": lamp.pk, "stock": 1}, {"id": lamp.pk, "stock": 2}])
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        lamp.refresh_from_db()
+        self.assertEqual((lamp.price, lamp.stock), (Decimal("10.00"), 5))
+
+    def test_requires_change_permission(self):
+        self.client.force_authenticate(User.objects.create_user("joe"))
+        resp = self.patch([{"id": self.products[0].pk, "stock": 1}])
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_admin_list_editable(self):
+        admin = User.objects.create_superuser("root", "root@example.com", "pass")
+        self.client.force_login(admin)
+        page = Product.objects.order_by("-pk")[:2]
+        data = {
+            "form-TOTAL_FORMS": "2",
+            "form-INITIAL_FORMS": "2",
+            "_save": "Save",
+        }
+        for i, product in enumerate(page):
+            data.update(
+                {
+                    f"form-{i}-id": product.pk,
+                    f"form-{i}-price": "15.00",
+                    f"form-{i}-stock": str(i),
+                }
+            )
+        resp = self.client.post(
+            reverse("admin:store_product_changelist") + "?o=-0", data
+        )
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(
+            sorted(Product.objects.filter(price=15).values_list("stock", flat=True)),
+            [0, 1],
+        )
@@ -0,0 +1,104 @@
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.checks import run_checks
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from store import caching
+from store.models import Category, Product
+
+
+class CatalogCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cat = Category.objects.create(name="Cat", slug="cat")
+        self.prod = Product.objects.create(
+            name="Lamp", description="d", price=10, stock=3, category=self.cat
+        )
+
+    def test_product_detail_served_from_cache(self):
+        url = reverse("store:product_detail", args=[self.prod.pk])
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            resp = self.client.get(url)
+        self.assertContains(resp, "Lamp")
+
+    def test_missing_product_is_404(self):
+        resp = self.client.get(reverse("store:product_detail", args=[999]))
+        self.assertEqual(resp.status_code, 404)
+
+    def test_product_and_category_changes_invalidate(self):
+        url = reverse("store:product_detail", args=[self.prod.pk])
+        self.client.get(url)
+        self.prod.name = "Floor lamp"
+        self.prod.save()
+        self.assertContains(self.client.get(url), "Floor lamp")
+        self.cat.name = "Lighting"
+        self.cat.save()
+        self.assertContains(self.client.get(url), "Lighting")
+
+    def test_listing_page_cached_and_invalidated(self):
+        url = reverse("store:product_list")
+        self.client.get(url, {"q": "lamp"})
+        with self.assertNumQueries(0):
+            resp = self.client.get(url, {"q": "lamp"})
+        self.assertEqual(list(resp.context["page_obj"]), [self.prod])
+        Product.objects.create(name="Lamp shade", price=2, stock=1, category=self.cat)
+        resp = self.client.get(url, {"q": "lamp"})
+        self.assertEqual(len(resp.context["page_obj"]), 2)
+
+    def test_admin_list_editable_invalidates(self):
+        admin = User.objects.create_superuser("admin", "a@example.com", "pass")
+        self.client.force_login(admin)
+        url = reverse("store:product_detail", args=[self.prod.pk])
+        self.client.get(url)
+        resp = self.client.post(
+            reverse("admin:store_product_changelist"),
+            {
+                "form-TOTAL_FORMS": "1",
+                "form-INITIAL_FORMS": "1",
+                "form-MIN_NUM_FORMS": "0",
+                "form-MAX_NUM_FORMS": "1000",
+                "form-0-id": str(self.prod.pk),
+                "form-0-price": "12.50",
+                "form-0-stock": "3",
+                "_save": "Save",
+            },
+        )
+        self.assertEqual(resp.status_code, 302)
+        self.assertContains(self.client.get(url), "12.50")
+
+    def test_single_flight_builds_once(self):
+        calls = []
+
+        def build():
+            calls.append(1)
+            time.sleep(0.2)
+            return "value"
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(caching.get_or_build("sf-key", build))
+            )
+            for _ in range(8)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(results, ["value"] * 8)
+        self.assertEqual(len(calls), 1)
+
+    def test_deploy_check_requires_a_shared_cache(self):
+        def errors():
+            return [e.id for e in run_checks(include_deployment_checks=True)]
+
+        with override_settings(DEBUG=False):
+            self.assertIn("store.E001", errors())
+        shared = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache"}}
+        with override_settings(DEBUG=False, CACHES=shared):
+            self.assertNotIn("store.E001", errors())
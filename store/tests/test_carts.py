@@ -0,0 +1,297 @@
+import json
+from decimal import Decimal
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from store import carts, pricing
+from store.backends import CartModelBackend
+from store.context_processors import cart_item_count
+from store.models import (
+    Cart,
+    CartItem,
+    Category,
+    Order,
+    Product,
+    StockReservation,
+)
+from store.orders import place_order
+
+
+class CartTotalsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("joe", password="pass")
+        cat = Category.objects.create(name="C", slug="c")
+        self.lamp = Product.objects.create(name="Lamp", price=10, stock=5, category=cat)
+        self.desk = Product.objects.create(name="Desk", price=50, stock=5, category=cat)
+        self.client.force_login(self.user)
+
+    def add(self, product):
+        return self.client.post(reverse("store:add_to_cart", args=[product.pk])).json()
+
+    def cart(self):
+        return Cart.objects.get(user=self.user)
+
+    def test_mutations_keep_totals(self):
+        self.add(self.lamp)
+        self.assertEqual(self.add(self.lamp)["cart_item_count"], 2)
+        self.add(self.desk)
+        self.assertEqual(
+            (self.cart().item_count, self.cart().total), (3, Decimal("70.00"))
+        )
+
+        item = CartItem.objects.get(product=self.desk)
+        resp = self.client.post(
+            reverse("store:ajax_update_cart_item"),
+            json.dumps({"item_id": item.pk, "quantity": 3}),
+            content_type="application/json",
+        ).json()
+        self.assertEqual((resp["cart_item_count"], resp["cart_total"]), (5, "170.00"))
+
+        self.client.get(reverse("store:remove_from_cart", args=[item.pk]))
+        self.assertEqual(
+            (self.cart().item_count, self.cart().total), (2, Decimal("20.00"))
+        )
+        self.client.get(reverse("store:clear_cart"))
+        self.assertEqual((self.cart().item_count, self.cart().total), (0, 0))
+
+    def test_price_change_and_deletion_update_totals(self):
+        self.add(self.lamp)
+        self.add(self.desk)
+        self.lamp.price = 12
+        self.lamp.save()
+        self.assertEqual(self.cart().total, Decimal("62.00"))
+        self.desk.delete()
+        self.assertEqual((self.cart().item_count, self.cart().total), (1, 12))
+
+    def test_checkout_empties_totals(self):
+        self.add(self.lamp)
+        cart = self.cart()
+        place_order(Order(user=self.user), list(cart.items.all()))
+        self.assertEqual((self.cart().item_count, self.cart().total), (0, 0))
+
+    def test_badge_needs_no_query(self):
+        self.add(self.lamp)
+        request = RequestFactory().get("/")
+        request.user = CartModelBackend().get_user(self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(cart_item_count(request), {"cart_item_count": 1})
+            cart_item_count(request)
+
+    def test_guest_badge_counts_session(self):
+        self.client.logout()
+        self.add(self.lamp)
+        self.add(self.desk)
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        request.session = self.client.session
+        self.assertEqual(cart_item_count(request), {"cart_item_count": 2})
+
+
+class CartPricingTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("joe", password="pass")
+        cat = Category.objects.create(name="C", slug="c")
+        self.products = [
+            Product.objects.create(name=f"P{i}", price="2.50", stock=5, category=cat)
+            for i in range(4)
+        ]
+
+    def test_session_and_database_carts_price_alike(self):
+        session_cart = {str(p.pk): 2 for p in self.products}
+        with self.assertNumQueries(1):
+            guest = pricing.price_session_cart(session_cart)
+
+        cart = Cart.objects.create(user=self.user)
+        for p in self.products:
+            CartItem.objects.create(cart=cart, product=p, quantity=2)
+        with self.assertNumQueries(1):
+            db = pricing.price_cart(cart)
+
+        for priced in (guest, db):
+            self.assertEqual(priced.total, Decimal("20.00"))
+            self.assertEqual(priced.item_count, 8)
+            self.assertEqual([line.subtotal for line in priced], [Decimal("5.00")] * 4)
+        self.assertEqual(len(db.items()), 4)
+        self.assertEqual(guest.items(), [])
+
+    def test_guest_update_and_cart_page_totals(self):
+        for p in self.products:
+            self.client.post(reverse("store:add_to_cart", args=[p.pk]))
+        resp = self.client.post(
+            reverse("store:ajax_update_cart_item"),
+            json.dumps({"item_id": self.products[0].pk, "quantity": 3}),
+            content_type="application/json",
+        ).json()
+        self.assertEqual((resp["item_subtotal"], resp["cart_total"]), ("7.50", "15.00"))
+
+        resp = self.client.get(reverse("store:cart_view"))
+        self.assertEqual(resp.context["total"], Decimal("15.00"))
+
+
+class SessionCartMergeTest(TestCase):
+    def setUp(self):
+        cat = Category.objects.create(name="C", slug="c")
+        self.products = [
+            Product.objects.create(name=f"P{i}", price=1, stock=3, category=cat)
+            for i in range(18)
+        ]
+
+    def login_with_cart(self, username, products):
+        user = User.objects.create_user(username, password="pass")
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.create(cart=cart, product=products[0], quantity=3)
+
+        self.client.logout()
+        for product in products:
+            self.client.post(reverse("store:add_to_cart", args=[product.pk]))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(
+                reverse("store:login"), {"username": username, "password": "pass"}
+            )
+        return cart, len(queries)
+
+    def test_merge_query_count_does_not_grow_with_cart(self):
+        _, small = self.login_with_cart("small", self.products[:3])
+        big_cart, big = self.login_with_cart("big", self.products[3:])
+        self.assertEqual(small, big)
+
+        big_cart.refresh_from_db()
+        self.assertEqual(big_cart.items.count(), 15)
+        # 3 already in the cart + 1 from the session is clamped to the stock
+        self.assertEqual(big_cart.items.get(product=self.products[3]).quantity, 3)
+        self.assertEqual(big_cart.item_count, 17)
+        self.assertEqual(StockReservation.objects.filter(cart=big_cart).count(), 15)
+        self.assertFalse(StockReservation.objects.filter(cart__isnull=True).exists())
+
+
+class CartBatchTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("joe", password="pass")
+        cat = Category.objects.create(name="C", slug="c")
+        self.products = [
+            Product.objects.create(name=f"P{i}", price=2, stock=4, category=cat)
+            for i in range(12)
+        ]
+        self.lamp, self.desk = self.products[:2]
+        self.client.force_login(self.user)
+
+    def batch(self, ops):
+        return self.client.post(
+            reverse("store:ajax_cart_batch"),
+            json.dumps({"ops": ops}),
+            content_type="application/json",
+        )
+
+    def test_coalesce(self):
+        ops = [
+            {"product_id": 1, "delta": 1},
+            {"product_id": 1, "delta": 1},
+            {"product_id": 2, "quantity": 0},
+            {"product_id": 3, "quantity": 5},
+            {"product_id": 3, "delta": -2},
+            {"product_id": 4, "delta": 1},
+            {"product_id": 4, "delta": -1},
+        ]
+        self.assertEqual(carts.coalesce({1: 1, 2: 2}, ops), {1: 3, 2: 0, 3: 3})
+
+    def test_batch_applies_ops(self):
+        self.batch([{"product_id": self.lamp.pk, "quantity": 1}])
+        resp = self.batch(
+            [
+                {"product_id": self.lamp.pk, "delta": 1},
+                {"product_id": self.desk.pk, "quantity": 3},
+                {"product_id": self.lamp.pk, "delta": 1},
+            ]
+        ).json()
+        self.assertTrue(resp["success"])
+        self.assertEqual((resp["cart_item_count"], resp["cart_total"]), (6, "12.00"))
+        self.assertEqual(
+            [(i["product_id"], i["quantity"]) for i in resp["items"]],
+            [(self.lamp.pk, 3), (self.desk.pk, 3)],
+        )
+        cart = Cart.objects.get(user=self.user)
+        self.assertEqual((cart.item_count, cart.total), (6, Decimal("12.00")))
+        self.assertEqual(StockReservation.objects.filter(cart=cart).count(), 2)
+
+        resp = self.batch([{"product_id": self.lamp.pk, "quantity": 0}]).json()
+        self.assertEqual(resp["cart_item_count"], 3)
+        self.assertFalse(
+            StockReservation.objects.filter(cart=cart, product=self.lamp).exists()
+        )
+
+    def test_batch_is_all_or_nothing(self):
+        self.batch([{"product_id": self.lamp.pk, "quantity": 1}])
+        resp = self.batch(
+            [
+                {"product_id": self.lamp.pk, "quantity": 2},
+                {"product_id": self.desk.pk, "quantity": 9},
+            ]
+        ).json()
+        self.assertEqual(
+            resp,
+            {"success": False, "product_id": self.desk.pk, "error": "Max stock is 4"},
+        )
+        self.assertEqual(CartItem.objects.get(product=self.lamp).quantity, 1)
+        self.assertFalse(CartItem.objects.filter(product=self.desk).exists())
+
+        resp = self.batch([{"product_id": 999, "quantity": 1}])
+        self.assertEqual(resp.status_code, 400)
+        resp = self.batch([{"product_id": self.lamp.pk, "quantity": -1}])
+        self.assertEqual(resp.status_code, 400)
+
+    def test_query_count_does_not_grow_with_batch(self):
+        def count(products, quantity):
+            ops = [{"product_id": p.pk, "quantity": quantity} for p in products]
+            with CaptureQueriesContext(connection) as queries:
+                self.assertTrue(self.batch(ops).json()["success"])
+            return len(queries)
+
+        count(self.products[:1], 1)
+        self.assertEqual(count(self.products[:2], 2), count(self.products, 3))
+
+    def test_guest_batch(self):
+        self.client.logout()
+        resp = self.batch(
+            [
+                {"product_id": self.lamp.pk, "delta": 2},
+                {"product_id": self.desk.pk, "quantity": 1},
+            ]
+        ).json()
+        self.assertEqual((resp["cart_item_count"], resp["cart_total"]), (3, "6.00"))
+        self.assertEqual(
+            self.client.session["cart"], {str(self.lamp.pk): 2, str(self.desk.pk): 1}
+        )
+        self.assertEqual(StockReservation.objects.filter(cart__isnull=True).count(), 2)
+
+    def test_api_batch(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse("cart-batch")
+        resp = client.post(
+            url,
+            [
+                {"product_id": self.lamp.pk, "quantity": 2},
+                {"product_id": self.desk.pk, "delta": 1},
+            ],
+            format="json",
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual((resp.json()["item_count"], resp.json()["total"]), (3, "6.00"))
+        self.assertEqual(len(resp.json()["items"]), 2)
+
+        resp = client.post(
+            url,
+            [{"product_id": self.lamp.pk, "quantity": 1, "delta": 1}],
+            format="json",
+        )
+        self.assertEqual(resp.status_code, 400)
+        resp = client.post(
+            url, [{"product_id": self.lamp.pk, "quantity": 9}], format="json"
+        )
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("quantity", resp.json())
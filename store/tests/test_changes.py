@@ -0,0 +1,136 @@
+from django.contrib.auth.models import Permission, User
+from django.db import transaction
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from store import inventory
+from store.models import Cart, CartItem, Category, ChangeLogEntry, Order, Product
+from store.orders import place_order
+
+
+class ChangeFeedTest(APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Lamps", slug="lamps")
+        self.user = User.objects.create_user("joe", password="pass")
+        self.lamp = Product.objects.create(
+            name="Lamp", price=10, stock=5, category=self.category
+        )
+
+    def feed(self, since=0, **params):
+        resp = self.client.get(reverse("change-feed"), dict(params, since=since))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return resp.json()
+
+    def test_created_updated_deleted(self):
+        first = self.feed()
+        self.assertEqual(
+            [(r["id"], r["action"]) for r in first["results"]],
+            [(self.lamp.pk, "created")],
+        )
+        self.assertEqual(first["results"][0]["data"]["name"], "Lamp")
+
+        chair = Product.objects.create(
+            name="Chair", price=30, stock=1, category=self.category
+        )
+        self.lamp.price = 12
+        self.lamp.save()
+        chair_pk = chair.pk
+        chair.delete()
+        changed = self.feed(first["cursor"])
+        self.assertEqual(
+            [(r["id"], r["action"]) for r in changed["results"]],
+            [(self.lamp.pk, "updated"), (chair_pk, "deleted")],
+        )
+        self.assertEqual(changed["results"][0]["data"]["price"], "12.00")
+        self.assertIsNone(changed["results"][1]["data"])
+        self.assertEqual(self.feed(changed["cursor"])["results"], [])
+
+    def test_bulk_paths_and_order_visibility(self):
+        cart = Cart.objects.create(user=self.user)
+        item = CartItem.objects.create(cart=cart, product=self.lamp, quantity=2)
+        cursor = self.feed()["cursor"]
+        order = place_order(Order(user=self.user), [item])
+        inventory.cancel_orders([order])
+
+        # Orders only show up for order staff
+        self.assertEqual(
+            [(r["model"], r["action"]) for r in self.feed(cursor)["results"]],
+            [("product", "updated")],
+        )
+        staff = User.objects.create_user("ann", password="pass")
+        staff.user_permissions.add(Permission.objects.get(codename="change_order"))
+        self.client.force_authenticate(staff)
+        results = self.feed(cursor)["results"]
+        self.assertEqual(
+            [(r["model"], r["action"]) for r in results],
+            [("order", "created"), ("product", "updated")],
+        )
+        self.assertEqual(results[0]["data"]["status"], "CANCELLED")
+
+    def test_rolled_back_changes_are_not_logged(self):
+        cursor = self.feed()["cursor"]
+        try:
+            with transaction.atomic():
+                self.lamp.save()
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(self.feed(cursor)["results"], [])
+
+    def test_entries_are_written_with_the_change(self):
+        with transaction.atomic():
+            self.lamp.save()
+            self.assertTrue(
+                ChangeLogEntry.objects.filter(
+                    object_id=self.lamp.pk, action=ChangeLogEntry.UPDATED
+                ).exists()
+            )
+
+    def test_paging_and_late_commits(self):
+        for i in range(3):
+            Product.objects.create(
+                name=f"P{i}", price=1, stock=1, category=self.category
+            )
+        page = self.feed(limit=2)
+        self.assertTrue(page["more"])
+        rest = self.feed(page["cursor"], limit=2)
+        self.assertFalse(rest["more"])
+        self.assertEqual(len(page["results"]) + len(rest["results"]), 4)
+
+        # An entry with a lower id that commits after the read still comes
+        # after the cursor
+        early = ChangeLogEntry.objects.create(
+            model=ChangeLogEntry.PRODUCT,
+            object_id=self.lamp.pk,
+            action=ChangeLogEntry.UPDATED,
+        )
+        Product.objects.create(name="P3", price=1, stock=1, category=self.category)
+        early.delete()
+        cursor = self.feed(rest["cursor"])["cursor"]
+        early.save()
+        self.assertEqual(
+            [(r["id"], r["action"]) for r in self.feed(cursor)["results"]],
+            [(self.lamp.pk, "updated")],
+        )
+
+    def test_cost_follows_changes(self):
+        Product.objects.bulk_create(
+            Product(name=f"P{i}", price=1, stock=1, category=self.category)
+            for i in range(50)
+        )
+        cursor = self.feed()["cursor"]
+        self.lamp.save()
+        # Numbering the new entry (look for unnumbered ones, the last
+        # sequence, the entries, the update, in a savepoint), the log page,
+        # then the changed products with their categories
+        with self.assertNumQueries(8):
+            page = self.feed(cursor)
+        self.assertEqual(len(page["results"]), 1)
+        # With nothing new only the check for unnumbered entries is added
+        with self.assertNumQueries(2):
+            self.assertEqual(self.feed(page["cursor"])["results"], [])
+
+    def test_bad_cursor(self):
+        resp = self.client.get(reverse("change-feed"), {"since": "abc"})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,92 @@
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from store import caching
+from store.models import Cart, CartItem, Category, Product
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name="Lamps", slug="lamps")
+        self.lamp = Product.objects.create(
+            name="Lamp", price=10, stock=5, category=self.category
+        )
+
+    def revalidate(self, url, num_queries, **headers):
+        first = self.client.get(url, **headers)
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first.has_header("ETag"))
+        with self.assertNumQueries(num_queries):
+            again = self.client.get(
+                url, headers=dict(headers, if_none_match=first["ETag"])
+            )
+        self.assertEqual(again.status_code, 304)
+        return first
+
+    def test_api_not_modified_without_queries(self):
+        for url in [
+            reverse("product-list"),
+            reverse("product-detail", args=[self.lamp.pk]),
+            reverse("category-list"),
+        ]:
+            with self.subTest(url=url):
+                first = self.revalidate(url, 0)
+                resp = self.client.get(
+                    url, headers={"if_modified_since": first["Last-Modified"]}
+                )
+                self.assertEqual(resp.status_code, 304)
+
+    def test_api_change_invalidates(self):
+        url = reverse("product-detail", args=[self.lamp.pk])
+        etag = self.client.get(url)["ETag"]
+        self.lamp.price = 12
+        self.lamp.save()
+        resp = self.client.get(url, headers={"if_none_match": etag})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["price"], "12.00")
+        # Other query strings are other representations
+        other = self.client.get(
+            reverse("product-list"), {"fields": "id"}, headers={"if_none_match": etag}
+        )
+        self.assertEqual(other.status_code, 200)
+
+    @override_settings(CATALOG_CACHE_TIMEOUT=1)
+    def test_workers_with_their_own_caches(self):
+        first, second = LocMemCache("worker-1", {}), LocMemCache("worker-2", {})
+        url = reverse("product-detail", args=[self.lamp.pk])
+        with mock.patch.object(caching, "cache", first):
+            etag = self.client.get(url)["ETag"]
+        with mock.patch.object(caching, "cache", second):
+            self.lamp.price = 12
+            self.lamp.save()
+        with mock.patch.object(caching, "cache", first):
+            # The first worker never saw the change, but only until its
+            # stamp expires
+            resp = self.client.get(url, headers={"if_none_match": etag})
+            self.assertEqual(resp.status_code, 304)
+            time.sleep(1.1)
+            resp = self.client.get(url, headers={"if_none_match": etag})
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(resp.json()["price"], "12.00")
+
+    def test_pages(self):
+        self.revalidate(reverse("store:product_list"), 0)
+        detail = reverse("store:product_detail", args=[self.lamp.pk])
+        first = self.revalidate(detail, 0)
+
+        # The page shows the visitor's cart, so adding to it changes the tag
+        user = User.objects.create_user("joe", password="pass")
+        self.client.force_login(user)
+        etag = self.revalidate(detail, 3)["ETag"]
+        self.assertNotEqual(etag, first["ETag"])
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.create(cart=cart, product=self.lamp, quantity=1)
+        resp = self.client.get(detail, headers={"if_none_match": etag})
+        self.assertEqual(resp.status_code, 200)
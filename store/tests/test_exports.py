@@ -0,0 +1,124 @@
+import csv
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from store import exports
+from store.models import Category, Order, OrderItem, Product
+
+
+class ExportTest(APITestCase):
+    def setUp(self):
+        self.lamps = Category.objects.create(name="Lamps", slug="lamps")
+        chairs = Category.objects.create(name="Chairs", slug="chairs")
+        self.lamp = Product.objects.create(
+            name="Desk lamp", price=20, stock=3, category=self.lamps
+        )
+        Product.objects.create(name="Oak chair", price=60, stock=0, category=chairs)
+        self.user = User.objects.create_user("joe", password="pass")
+        other = User.objects.create_user("ann", password="pass")
+        for user in (self.user, other):
+            order = Order.objects.create(user=user, total_price=40)
+            OrderItem.objects.create(
+                order=order, product=self.lamp, quantity=2, price_at_order=20
+            )
+
+    def stream(self, name, **params):
+        resp = self.client.get(reverse(name), params)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertTrue(resp.streaming)
+        return resp, b"".join(resp.streaming_content).decode()
+
+    def test_products_ndjson_follows_filters(self):
+        resp, body = self.stream("product-export", category=self.lamps.pk)
+        self.assertEqual(resp["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["name"], "Desk lamp")
+        self.assertEqual(rows[0]["price"], "20.00")
+        self.assertEqual(rows[0]["category"], "Lamps")
+
+    def test_orders_csv_only_own_orders(self):
+        self.client.force_authenticate(self.user)
+        resp, body = self.stream("order-export", **{"as": "csv"})
+        self.assertIn('filename="orders.csv"', resp["Content-Disposition"])
+        rows = list(csv.DictReader(StringIO(body)))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["product"], "Desk lamp")
+        self.assertEqual(rows[0]["quantity"], "2")
+        self.assertEqual(int(rows[0]["order_id"]), Order.objects.get(user=self.user).pk)
+
+    def test_csv_escapes_formulas(self):
+        self.lamp.name = '=HYPERLINK("http://example.com","Lamp")'
+        self.lamp.save()
+        rows = list(
+            csv.DictReader(StringIO("".join(exports.export("products", "csv"))))
+        )
+        self.assertEqual(rows[0]["name"], "'" + self.lamp.name)
+        self.assertEqual(rows[1]["name"], "Oak chair")
+        self.assertEqual(rows[0]["price"], "20.00")
+
+        line = json.loads(next(exports.export("products", "ndjson")).splitlines()[0])
+        self.assertEqual(line["name"], self.lamp.name)
+
+    def test_unknown_format(self):
+        resp = self.client.get(reverse("product-export"), {"as": "xml"})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_chunks_are_buffered(self):
+        chunks = list(exports.buffered(["ab", "cd", "ef"], size=4))
+        self.assertEqual(chunks, ["abcd", "ef"])
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "products.csv"
+            call_command(
+                "export_catalog", "--format", "csv", "-o", str(path), stderr=StringIO()
+            )
+            rows = list(csv.DictReader(path.open(encoding="utf-8")))
+        self.assertEqual([row["name"] for row in rows], ["Desk lamp", "Oak chair"])
+
+        out = StringIO()
+        call_command("export_catalog", "--dataset", "orders", stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 2)
+
+    def test_admin_exports(self):
+        root = User.objects.create_superuser("root", "root@example.com", "pass")
+        self.client.force_login(root)
+        mine = Order.objects.get(user=self.user)
+        mine.status = "COMPLETED"
+        mine.save()
+        url = reverse("admin:store_order_changelist")
+
+        page = self.client.get(url, {"status__exact": "COMPLETED"})
+        self.assertContains(
+            page, reverse("admin:store_order_export") + "?status__exact=COMPLETED"
+        )
+        resp = self.client.get(
+            reverse("admin:store_order_export"), {"status__exact": "COMPLETED"}
+        )
+        self.assertTrue(resp.streaming)
+        rows = list(csv.DictReader(StringIO(b"".join(resp.streaming_content).decode())))
+        self.assertEqual([int(row["order_id"]) for row in rows], [mine.pk])
+
+        resp = self.client.post(
+            url,
+            {
+                "action": "export_csv",
+                "_selected_action": list(Order.objects.values_list("pk", flat=True)),
+            },
+        )
+        self.assertIn('filename="orders.csv"', resp["Content-Disposition"])
+        body = b"".join(resp.streaming_content).decode()
+        self.assertEqual(len(list(csv.DictReader(StringIO(body)))), 2)
+
+        self.client.force_login(User.objects.create_user("nobody", is_staff=True))
+        resp = self.client.get(reverse("admin:store_order_export"))
+        self.assertEqual(resp.status_code, 403)
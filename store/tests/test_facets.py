@@ -0,0 +1,109 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from store import facets
+from store.catalog import parse_filters
+from store.models import CatalogFacetCount, Category, Product
+
+
+class FacetTest(TestCase):
+    def setUp(self):
+        self.tools = Category.objects.create(name="Tools", slug="tools")
+        self.toys = Category.objects.create(name="Toys", slug="toys")
+        self.hammer = Product.objects.create(
+            name="Hammer", price=20, stock=3, category=self.tools
+        )
+        self.saw = Product.objects.create(
+            name="Saw", price=60, stock=0, category=self.tools
+        )
+        self.ball = Product.objects.create(
+            name="Ball", price=5, stock=9, category=self.toys
+        )
+
+    def facets_for(self, **params):
+        return facets.get_facets(parse_filters(params))
+
+    def assert_matches_recount(self):
+        maintained = {
+            (c.category_id, c.price_band, c.in_stock): c.product_count
+            for c in CatalogFacetCount.objects.exclude(product_count=0)
+        }
+        facets.rebuild()
+        recounted = {
+            (c.category_id, c.price_band, c.in_stock): c.product_count
+            for c in CatalogFacetCount.objects.all()
+        }
+        self.assertEqual(maintained, recounted)
+
+    def test_unfiltered_counts(self):
+        result = self.facets_for()
+        self.assertEqual(result["categories"], {self.tools.pk: 2, self.toys.pk: 1})
+        self.assertEqual([b["count"] for b in result["price_bands"]], [2, 0, 1, 0, 0])
+        self.assertEqual((result["in_stock"], result["out_of_stock"]), (2, 1))
+
+    def test_disjunctive_filters(self):
+        result = self.facets_for(category=str(self.tools.pk), in_stock="on")
+        # Category facet ignores the category filter but honours in-stock
+        self.assertEqual(result["categories"], {self.tools.pk: 1, self.toys.pk: 1})
+        self.assertEqual([b["count"] for b in result["price_bands"]], [1, 0, 0, 0, 0])
+        self.assertEqual((result["in_stock"], result["out_of_stock"]), (1, 1))
+
+    def test_band_aligned_range_uses_cells_only(self):
+        with self.assertNumQueries(1):
+            result = self.facets_for(min_price="50", max_price="99.99")
+        self.assertEqual(result["categories"], {self.tools.pk: 1})
+
+    def test_search_and_odd_ranges_fall_back_to_products(self):
+        self.assertEqual(self.facets_for(q="saw")["categories"], {self.tools.pk: 1})
+        result = self.facets_for(min_price="10", max_price="30")
+        self.assertEqual(result["categories"], {self.tools.pk: 1})
+        self.assertEqual(result["price_bands"][2]["count"], 1)
+
+    def test_cells_follow_saves_and_deletes(self):
+        self.hammer.price = Decimal("300")
+        self.hammer.stock = 0
+        self.hammer.save()
+        self.ball.category = self.tools
+        self.ball.save()
+        self.saw.delete()
+        Product.objects.create(name="Kite", price=30, stock=1, category=self.toys)
+        self.assert_matches_recount()
+
+    def test_partial_saves_move_cells_without_rebuild(self):
+        hammer = Product.objects.only("id", "name").get(pk=self.hammer.pk)
+        hammer.name = "Claw hammer"
+        with CaptureQueriesContext(connection) as queries:
+            hammer.save()
+        self.assertFalse(
+            [q for q in queries if "catalogfacetcount" in q["sql"].lower()]
+        )
+
+        with mock.patch.object(facets, "rebuild") as rebuild:
+            saw = Product.objects.only("id", "stock").get(pk=self.saw.pk)
+            saw.stock = 4
+            saw.save()
+            Product(
+                pk=self.ball.pk, name="Ball", price=70, stock=9, category=self.toys
+            ).save()
+            self.hammer.price = 120
+            self.hammer.save(update_fields=["price"])
+        rebuild.assert_not_called()
+        self.assert_matches_recount()
+
+    def test_catalog_and_api_show_counts(self):
+        resp = self.client.get(reverse("store:product_list"))
+        counts = {c.name: c.product_count for c in resp.context["categories"]}
+        self.assertEqual(counts, {"Tools": 2, "Toys": 1})
+        self.assertEqual(resp.context["in_stock_count"], 2)
+        resp = self.client.get(reverse("product-facets"), {"in_stock": "true"})
+        data = resp.json()
+        self.assertEqual(
+            {c["name"]: c["count"] for c in data["categories"]},
+            {"Tools": 1, "Toys": 1},
+        )
+        self.assertEqual(data["out_of_stock"], 1)
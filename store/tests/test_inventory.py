@@ -0,0 +1,112 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from store import inventory
+from store.models import (
+    Cart,
+    CartItem,
+    Category,
+    InventoryMovement,
+    InventorySnapshot,
+    Order,
+    Product,
+)
+from store.orders import place_order
+
+
+class InventoryLedgerTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("joe", password="pass")
+        cat = Category.objects.create(name="C", slug="c")
+        self.product = Product.objects.create(
+            name="Lamp", price=10, stock=5, category=cat
+        )
+
+    def kinds(self):
+        return list(InventoryMovement.objects.values_list("kind", "quantity"))
+
+    def buy(self, quantity):
+        cart, _ = Cart.objects.get_or_create(user=self.user)
+        item = CartItem.objects.create(
+            cart=cart, product=self.product, quantity=quantity
+        )
+        return place_order(Order(user=self.user), [item])
+
+    def test_every_change_is_recorded(self):
+        self.product.stock = 8
+        self.product.save()
+        order = self.buy(3)
+        self.assertEqual(
+            self.kinds(),
+            [("RESTOCK", 5), ("ADJUSTMENT", 3), ("SALE", -3)],
+        )
+        self.assertEqual(InventoryMovement.objects.last().order, order)
+        self.assertEqual(inventory.drift(), {})
+
+    def test_saves_without_loaded_values_are_recorded(self):
+        Product.objects.only("name").get(pk=self.product.pk).save()
+        deferred = Product.objects.only("name").get(pk=self.product.pk)
+        deferred.stock = 7
+        deferred.save()
+        by_hand = Product(
+            pk=self.product.pk,
+            name="Lamp",
+            price=10,
+            stock=4,
+            category_id=self.product.category_id,
+        )
+        by_hand.save()
+        self.assertEqual(
+            self.kinds(), [("RESTOCK", 5), ("ADJUSTMENT", 2), ("ADJUSTMENT", -3)]
+        )
+        self.assertEqual(inventory.drift(), {})
+
+    def test_cancel_returns_stock_once(self):
+        order = self.buy(2)
+        self.assertEqual(inventory.cancel_orders([order]), 1)
+        self.assertEqual(inventory.cancel_orders([order]), 0)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
+        self.assertEqual(self.kinds()[-1], ("CANCELLATION", 2))
+        self.assertEqual(inventory.drift(), {})
+
+    def test_admin_mark_cancelled_action(self):
+        order = self.buy(5)
+        admin = User.objects.create_superuser("admin", "a@example.com", "pass")
+        self.client.force_login(admin)
+        self.client.post(
+            reverse("admin:store_order_changelist"),
+            {"action": "mark_cancelled", "_selected_action": [order.pk]},
+        )
+        order.refresh_from_db()
+        self.product.refresh_from_db()
+        self.assertEqual(order.status, "CANCELLED")
+        self.assertEqual(self.product.stock, 5)
+
+    def test_compaction_folds_old_movements(self):
+        self.buy(1)
+        self.buy(1)
+        InventoryMovement.objects.update(created_at=timezone.now() - timedelta(days=60))
+        self.buy(1)
+        out = StringIO()
+        call_command("compact_inventory", "--keep-days=30", stdout=out)
+        self.assertIn("Folded 3 movement(s)", out.getvalue())
+        self.assertIn("Stock matches the ledger", out.getvalue())
+        snapshot = InventorySnapshot.objects.get(product=self.product)
+        self.assertEqual(snapshot.quantity, 3)
+        self.assertEqual(self.kinds(), [("SALE", -1)])
+        self.assertEqual(inventory.ledger_balances()[self.product.pk], 2)
+
+    def test_fix_records_adjustment_for_untracked_change(self):
+        Product.objects.filter(pk=self.product.pk).update(stock=7)
+        out = StringIO()
+        call_command("compact_inventory", "--fix", stdout=out)
+        self.assertIn("stock 7, ledger 5", out.getvalue())
+        self.assertEqual(self.kinds()[-1], ("ADJUSTMENT", 2))
+        self.assertEqual(inventory.drift(), {})
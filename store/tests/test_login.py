@@ -0,0 +1,84 @@
+from django.contrib.auth.hashers import MD5PasswordHasher
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+
+class CountingHasher(MD5PasswordHasher):
+    """
+    Counts hashes; verify() hashes through encode().
+    """
+
+    algorithm = "counting_md5"
+    hashes = 0
+
+    def encode(self, password, salt):
+        CountingHasher.hashes += 1
+        return super().encode(password, salt)
+
+
+COUNTING = "store.tests.test_login.CountingHasher"
+MD5 = "django.contrib.auth.hashers.MD5PasswordHasher"
+
+
+@override_settings(PASSWORD_HASHERS=[COUNTING, MD5])
+class LoginHashingTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("joe", password="s3cret-pass")
+        CountingHasher.hashes = 0
+
+    def test_login_hashes_once(self):
+        resp = self.client.post(
+            reverse("store:login"), {"username": "joe", "password": "s3cret-pass"}
+        )
+        self.assertRedirects(resp, reverse("store:product_list"))
+        self.assertEqual(CountingHasher.hashes, 1)
+        self.assertEqual(int(self.client.session["_auth_user_id"]), self.user.pk)
+
+    def test_signup_hashes_once(self):
+        resp = self.client.post(
+            reverse("store:signup"),
+            {
+                "username": "ann",
+                "email": "ann@example.com",
+                "password1": "Un1que-passphrase",
+                "password2": "Un1que-passphrase",
+            },
+        )
+        self.assertRedirects(resp, reverse("store:product_list"))
+        self.assertEqual(CountingHasher.hashes, 1)
+        self.assertEqual(
+            int(self.client.session["_auth_user_id"]),
+            User.objects.get(username="ann").pk,
+        )
+
+    def test_login_upgrades_old_hashes(self):
+        with override_settings(PASSWORD_HASHERS=[MD5]):
+            self.user.set_password("s3cret-pass")
+            self.user.save()
+        self.client.post(
+            reverse("store:login"), {"username": "joe", "password": "s3cret-pass"}
+        )
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("counting_md5$"))
+
+    def test_login_queries(self):
+        # The user, last_login and the session (checked, created, saved in
+        # their savepoints); nothing for the profile or the empty cart
+        with self.assertNumQueries(9):
+            self.client.post(
+                reverse("store:login"), {"username": "joe", "password": "s3cret-pass"}
+            )
+
+    def test_failed_login_hashes_once(self):
+        self.client.post(
+            reverse("store:login"), {"username": "joe", "password": "wrong"}
+        )
+        self.assertEqual(CountingHasher.hashes, 1)
+
+    def test_sessions_from_model_backend_still_resolve(self):
+        self.client.force_login(
+            self.user, backend="django.contrib.auth.backends.ModelBackend"
+        )
+        resp = self.client.get(reverse("store:cart_view"))
+        self.assertEqual(resp.context["user"], self.user)
@@ -0,0 +1,126 @@
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from store.models import Cart, CartItem, Category, Order, OrderItem, Product
+from store.orders import OutOfStock, place_order
+
+SHIPPING = {
+    "first_name": "J",
+    "last_name": "D",
+    "address": "A",
+    "city": "C",
+    "postal_code": "123",
+    "phone": "000",
+}
+
+
+class CheckoutTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("joe", "joe@example.com", "pass")
+        self.cat = Category.objects.create(name="C", slug="c")
+        self.lamp = Product.objects.create(
+            name="Lamp", price=10, stock=5, category=self.cat
+        )
+        self.desk = Product.objects.create(
+            name="Desk", price=50, stock=1, category=self.cat
+        )
+        self.cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=self.cart, product=self.lamp, quantity=2)
+        CartItem.objects.create(cart=self.cart, product=self.desk, quantity=1)
+        self.client.force_login(self.user)
+
+    def test_checkout_creates_order_and_decrements_stock(self):
+        resp = self.client.post(reverse("store:checkout"), SHIPPING)
+        order = Order.objects.get()
+        self.assertRedirects(resp, reverse("store:order_confirmation", args=[order.pk]))
+        self.assertEqual(order.total_price, 70)
+        self.assertEqual(order.order_items.count(), 2)
+        self.lamp.refresh_from_db()
+        self.desk.refresh_from_db()
+        self.assertEqual((self.lamp.stock, self.desk.stock), (3, 0))
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_out_of_stock_rolls_everything_back(self):
+        Product.objects.filter(pk=self.desk.pk).update(stock=0)
+        resp = self.client.post(reverse("store:checkout"), SHIPPING)
+        self.assertRedirects(resp, reverse("store:cart_view"))
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.lamp.refresh_from_db()
+        self.assertEqual(self.lamp.stock, 5)
+        self.assertEqual(CartItem.objects.count(), 2)
+
+    def test_query_count_does_not_grow_per_line_insert(self):
+        Product.objects.filter(pk=self.desk.pk).update(stock=10)
+        items = list(self.cart.items.select_related("product"))
+        order = Order(user=self.user, **SHIPPING)
+        # 2 conditional updates, order insert, bulk line insert, bulk ledger
+        # insert, cart delete, hold release, cart totals, stock re-read, the
+        # product and order change feed inserts, plus the savepoint pair of
+        # the atomic block
+        with self.assertNumQueries(13):
+            place_order(order, items)
+
+
+class ConcurrentCheckoutTest(TransactionTestCase):
+    buyers = 12
+    stock = 3
+
+    def setUp(self):
+        cat = Category.objects.create(name="C", slug="c")
+        self.product = Product.objects.create(
+            name="Last units", price=10, stock=self.stock, category=cat
+        )
+        self.users = []
+        for i in range(self.buyers):
+            user = User.objects.create(username=f"buyer{i}")
+            cart = Cart.objects.create(user=user)
+            CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+            self.users.append(user)
+
+    def checkout(self, user, results, barrier):
+        barrier.wait()
+        try:
+            while True:
+                try:
+                    items = list(
+                        CartItem.objects.filter(cart__user=user).select_related(
+                            "product"
+                        )
+                    )
+                    place_order(Order(user=user, **SHIPPING), items)
+                    results.append("ok")
+                    return
+                except OutOfStock:
+                    results.append("out")
+                    return
+                except OperationalError:
+                    # SQLite reports lock contention instead of waiting; retry
+                    time.sleep(0.01)
+        finally:
+            connection.close()
+
+    def test_parallel_checkouts_never_oversell(self):
+        results = []
+        barrier = threading.Barrier(self.buyers)
+        threads = [
+            threading.Thread(target=self.checkout, args=(user, results, barrier))
+            for user in self.users
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+        self.assertEqual(results.count("ok"), self.stock)
+        self.assertEqual(results.count("out"), self.buyers - self.stock)
+        self.assertEqual(Order.objects.count(), self.stock)
+        sold = sum(OrderItem.objects.values_list("quantity", flat=True))
+        self.assertEqual(sold, self.stock)
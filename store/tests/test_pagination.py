@@ -0,0 +1,120 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from store.models import Category, Product
+from store.pagination import KeysetPaginator, encode_cursor
+
+
+class KeysetPaginatorTest(TestCase):
+    def setUp(self):
+        self.cat = Category.objects.create(name="Cat", slug="cat")
+        # Duplicate names make sure the id tie-breaker is honoured
+        for name in ["b", "a", "c", "b", "a", "d", "b"]:
+            Product.objects.create(name=name, price=1, stock=1, category=self.cat)
+        self.expected = list(Product.objects.order_by("name", "id"))
+
+    def walk(self, qs, per_page):
+        paginator = KeysetPaginator(qs, per_page)
+        page = paginator.get_page()
+        pages = [list(page)]
+        while page.has_next():
+            page = paginator.get_page(page.next_cursor)
+            pages.append(list(page))
+        return pages, page
+
+    def test_forward_walk_visits_every_row_once(self):
+        pages, _ = self.walk(Product.objects.order_by("name", "id"), 3)
+        self.assertEqual([p for page in pages for p in page], self.expected)
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+
+    def test_backward_walk(self):
+        paginator = KeysetPaginator(Product.objects.order_by("name", "id"), 3)
+        pages, last = self.walk(Product.objects.order_by("name", "id"), 3)
+        previous = paginator.get_page(last.previous_cursor)
+        self.assertEqual(list(previous), pages[1])
+        self.assertTrue(previous.has_next())
+        first = paginator.get_page(previous.previous_cursor)
+        self.assertEqual(list(first), pages[0])
+        self.assertFalse(first.has_previous())
+
+    def test_descending_ordering(self):
+        qs = Product.objects.order_by("-name", "id")
+        pages, _ = self.walk(qs, 2)
+        self.assertEqual([p for page in pages for p in page], list(qs))
+
+    def test_bad_cursor_falls_back_to_first_page(self):
+        paginator = KeysetPaginator(Product.objects.all(), 3)
+        self.assertEqual(list(paginator.get_page("!!not-a-cursor")), self.expected[:3])
+        self.assertEqual(
+            list(paginator.get_page(encode_cursor(["a"]))), self.expected[:3]
+        )
+
+    def test_edited_cursors_fall_back_to_first_page(self):
+        paginator = KeysetPaginator(Product.objects.order_by("name", "id"), 3)
+        for values in (["x", "abc"], [None, 1], [{"a": 1}, 1], ["a", [1]]):
+            with self.subTest(values=values):
+                page = paginator.get_page(encode_cursor(values))
+                self.assertEqual(list(page), self.expected[:3])
+        paginator = KeysetPaginator(Product.objects.order_by("-price", "id"), 3)
+        page = paginator.get_page(encode_cursor(["cheap", 1]))
+        self.assertFalse(page.has_previous())
+
+    def test_edited_cursors_on_the_api_and_catalog(self):
+        cursors = [encode_cursor(["x", "abc"]), encode_cursor([None, 1])]
+        for cursor in cursors:
+            resp = self.client.get(reverse("product-list"), {"cursor": cursor})
+            self.assertEqual(resp.status_code, 200)
+            self.assertIsNone(resp.json()["previous"])
+        resp = self.client.get(
+            reverse("product-list"),
+            {"ordering": "-price", "cursor": encode_cursor(["x", 1])},
+        )
+        self.assertEqual(resp.status_code, 200)
+        with self.settings(CATALOG_PAGINATION="keyset", CATALOG_PAGE_SIZE=4):
+            for cursor in cursors:
+                resp = self.client.get(
+                    reverse("store:product_list"), {"cursor": cursor}
+                )
+                self.assertEqual(list(resp.context["page_obj"]), self.expected[:4])
+            resp = self.client.get(
+                reverse("store:product_list"),
+                {"q": "a", "cursor": encode_cursor(["high", "a", 1])},
+            )
+            self.assertEqual(resp.status_code, 200)
+
+    def test_deep_page_runs_no_count_and_no_offset(self):
+        paginator = KeysetPaginator(Product.objects.all(), 2)
+        cursor = encode_cursor(["c", self.expected[-2].pk])
+        with CaptureQueriesContext(connection) as ctx:
+            page = paginator.get_page(cursor)
+        self.assertEqual(list(page), self.expected[-1:])
+        self.assertEqual(len(ctx.captured_queries), 1)
+        sql = ctx.captured_queries[0]["sql"].upper()
+        self.assertNotIn("COUNT(", sql)
+        self.assertNotIn("OFFSET", sql)
+
+    def test_products_api_cursor_links(self):
+        url = reverse("product-list")
+        resp = self.client.get(url, {"page_size": 4}).json()
+        self.assertEqual(len(resp["results"]), 4)
+        self.assertIsNone(resp["previous"])
+        resp2 = self.client.get(resp["next"]).json()
+        self.assertEqual(
+            [p["id"] for p in resp["results"] + resp2["results"]],
+            [p.pk for p in self.expected],
+        )
+        self.assertIsNone(resp2["next"])
+        self.assertIsNotNone(resp2["previous"])
+
+    @override_settings(CATALOG_PAGINATION="keyset", CATALOG_PAGE_SIZE=4)
+    def test_catalog_next_prev_mode(self):
+        resp = self.client.get(reverse("store:product_list"))
+        self.assertEqual(list(resp.context["page_obj"]), self.expected[:4])
+        self.assertIsNone(resp.context["previous_page_url"])
+        resp2 = self.client.get(
+            reverse("store:product_list") + resp.context["next_page_url"]
+        )
+        self.assertEqual(list(resp2.context["page_obj"]), self.expected[4:])
+        self.assertContains(resp2, "Previous")
@@ -0,0 +1,98 @@
+import json
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from store import reservations
+from store.models import Cart, CartItem, Category, Order, Product, StockReservation
+from store.orders import OutOfStock, place_order
+
+
+class StockReservationTest(TestCase):
+    def setUp(self):
+        cat = Category.objects.create(name="C", slug="c")
+        self.product = Product.objects.create(
+            name="Lamp", price=10, stock=2, category=cat
+        )
+        self.alice = User.objects.create_user("alice", password="pass")
+        self.bob = User.objects.create_user("bob", password="pass")
+
+    def add(self, client):
+        resp = client.post(reverse("store:add_to_cart", args=[self.product.pk]))
+        return resp.json()
+
+    def test_holds_limit_other_carts(self):
+        self.client.force_login(self.alice)
+        self.assertTrue(self.add(self.client)["success"])
+        self.assertTrue(self.add(self.client)["success"])
+        self.assertEqual(reservations.available(self.product), 0)
+
+        self.client.force_login(self.bob)
+        result = self.add(self.client)
+        self.assertFalse(result["success"])
+        self.assertIn("only 0 available", result["error"])
+
+    def test_guest_holds_follow_login(self):
+        self.assertTrue(self.add(self.client)["success"])
+        hold = StockReservation.objects.get()
+        self.assertIsNone(hold.cart)
+
+        self.client.post(
+            reverse("store:login"), {"username": "alice", "password": "pass"}
+        )
+        hold = StockReservation.objects.get()
+        self.assertEqual(hold.cart.user, self.alice)
+        self.assertEqual(hold.quantity, 1)
+
+    def test_expired_holds_do_not_count_and_are_swept(self):
+        cart = Cart.objects.create(user=self.alice)
+        reservations.hold(self.product, 2, cart=cart)
+        StockReservation.objects.update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        self.assertEqual(reservations.available(self.product), 2)
+
+        call_command("release_expired_reservations", batch_size=1, stdout=StringIO())
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_checkout_respects_other_holds_and_releases_own(self):
+        alice_cart = Cart.objects.create(user=self.alice)
+        bob_cart = Cart.objects.create(user=self.bob)
+        reservations.hold(self.product, 1, cart=alice_cart)
+        item = CartItem.objects.create(cart=bob_cart, product=self.product, quantity=2)
+
+        with self.assertRaises(OutOfStock):
+            place_order(Order(user=self.bob, total_price=0), [item])
+
+        item.quantity = 1
+        item.save()
+        reservations.hold(self.product, 1, cart=bob_cart)
+        place_order(Order(user=self.bob, total_price=0), [item])
+        self.assertEqual(
+            list(StockReservation.objects.values_list("cart", flat=True)),
+            [alice_cart.pk],
+        )
+
+    def test_update_and_remove_adjust_hold(self):
+        self.client.force_login(self.alice)
+        self.add(self.client)
+        item = CartItem.objects.get()
+        resp = self.client.post(
+            reverse("store:ajax_update_cart_item"),
+            json.dumps({"item_id": item.pk, "quantity": 3}),
+            content_type="application/json",
+        )
+        self.assertFalse(resp.json()["success"])
+        self.client.post(
+            reverse("store:ajax_update_cart_item"),
+            json.dumps({"item_id": item.pk, "quantity": 2}),
+            content_type="application/json",
+        )
+        self.assertEqual(StockReservation.objects.get().quantity, 2)
+        self.client.get(reverse("store:remove_from_cart", args=[item.pk]))
+        self.assertFalse(StockReservation.objects.exists())
@@ -0,0 +1,63 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from store import search
+from store.models import Category, Product
+
+
+class ProductSearchTest(TestCase):
+    def setUp(self):
+        self.cat = Category.objects.create(name="Cat", slug="cat")
+        self.lamp = Product.objects.create(
+            name="Desk lamp",
+            description="Warm light",
+            price=10,
+            stock=1,
+            category=self.cat,
+        )
+        self.chair = Product.objects.create(
+            name="Chair",
+            description="Goes well with a lamp",
+            price=20,
+            stock=1,
+            category=self.cat,
+        )
+        self.table = Product.objects.create(
+            name="Table", description="Oak", price=30, stock=1, category=self.cat
+        )
+
+    def search(self, query):
+        qs = search.search_products(Product.objects.all(), query)
+        return list(qs.order_by("-search_rank", "name", "id"))
+
+    def test_name_hit_ranks_above_description_hit(self):
+        self.assertEqual(self.search("lamp"), [self.lamp, self.chair])
+
+    def test_prefix_and_all_terms_required(self):
+        self.assertEqual(self.search("la"), [self.lamp, self.chair])
+        self.assertEqual(self.search("warm lamp"), [self.lamp])
+
+    def test_operator_characters_are_ignored(self):
+        self.assertEqual(self.search('"oak*) OR'), [])
+        self.assertEqual(self.search('"oak'), [self.table])
+        self.assertEqual(self.search("()"), [])
+
+    def test_index_follows_save_and_delete(self):
+        self.table.description = "Walnut"
+        self.table.save()
+        self.assertEqual(self.search("oak"), [])
+        self.assertEqual(self.search("walnut"), [self.table])
+        self.lamp.delete()
+        self.assertEqual(self.search("lamp"), [self.chair])
+
+    def test_rebuild_index(self):
+        search.rebuild_index()
+        self.assertEqual(self.search("lamp"), [self.lamp, self.chair])
+
+    def test_catalog_and_api_use_index(self):
+        resp = self.client.get(reverse("store:product_list"), {"q": "lamp"})
+        self.assertEqual(list(resp.context["page_obj"]), [self.lamp, self.chair])
+        resp = self.client.get(reverse("product-list"), {"search": "lamp"})
+        self.assertEqual(
+            [p["id"] for p in resp.json()["results"]], [self.lamp.pk, self.chair.pk]
+        )
@@ -15,6 +15,7 @@ urlpatterns = [
         views.ajax_update_cart_item,
         name="ajax_update_cart_item",
     ),
+    path("cart/ajax/batch/", views.ajax_cart_batch, name="ajax_cart_batch"),
     # path("cart/update/", views.update_cart, name="update_cart"),
     path("cart/clear/", views.clear_cart, name="clear_cart"),
     path("checkout/", views.checkout_view, name="checkout"),
@@ -1,60 +1,112 @@
 import json
-from types import SimpleNamespace
 
+from django.conf import settings
 from django.contrib import messages
-from django.contrib.auth import authenticate, login, logout
+from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import AuthenticationForm
-from django.core.paginator import Paginator
-from django.db import models
-from django.http import HttpResponseBadRequest, JsonResponse
+from django.core.paginator import Page, Paginator
+from django.db import transaction
+from django.http import Http404, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
-from django.utils import timezone
 from django.views.decorators.http import require_POST
 
-from .context_processors import cart_item_count as get_cart_count
+from accounts.models import get_profile
+
+from . import carts, pricing, reservations
+from .caching import get_categories, get_or_build, get_product, listing_key
+from .catalog import filter_products, parse_filters
+from .conditional import listing_versions, page_condition, product_versions
+from .facets import get_facets
 from .forms import OrderForm, SignUpForm
-from .models import Cart, CartItem, Category, Order, OrderItem, Product
+from .models import Cart, CartItem, Order, Product
+from .orders import OutOfStock, place_order
+from .pagination import KeysetPaginator
+from .reservations import InsufficientStock
 
 
-def product_list(request):
+def _cursor_url(request, cursor):
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    params.pop("page", None)
+    params["cursor"] = cursor
+    return f"?{params.urlencode()}"
+
+
+def _price_band_url(request, band):
+    params = request.GET.copy()
+    for key in ("page", "cursor", "min_price", "max_price"):
+        params.pop(key, None)
+    params["min_price"] = band["min"]
+    if band["max"] is not None:
+        params["max_price"] = band["max"]
+    return f"?{params.urlencode()}"
+
+
+def _build_listing(request):
     """
-    List of products with filtering: search, category, price, in stock, pagination.
+    Everything on a catalog page that depends only on the query string;
+    the result is cached per (query string, catalog version).
     """
     qs = Product.objects.select_related("category").all()
-    categories = Category.objects.all()
-
-    q = request.GET.get("q", "").strip()
-    category_id = request.GET.get("category", "").strip()
-    min_price = request.GET.get("min_price", "").strip()
-    max_price = request.GET.get("max_price", "").strip()
-    in_stock = request.GET.get("in_stock")
-
-    if q:
-        qs = qs.filter(models.Q(name__icontains=q) | models.Q(description__icontains=q))
+    categories = get_categories()
 
-    if category_id.isdigit():
-        qs = qs.filter(category_id=category_id)
+    filters = parse_filters(request.GET)
+    qs = filter_products(qs, filters)
+    if filters["q"]:
+        qs = qs.order_by("-search_rank", "name", "id")
+    else:
+        qs = qs.order_by("name", "id")
+
+    facet_counts = get_facets(filters)
+    for cat in categories:
+        cat.product_count = facet_counts["categories"].get(cat.id, 0)
+    price_bands = [
+        dict(band, url=_price_band_url(request, band))
+        for band in facet_counts["price_bands"]
+    ]
 
-    if min_price:
-        try:
-            qs = qs.filter(price__gte=float(min_price))
-        except ValueError:
-            pass
-    if max_price:
-        try:
-            qs = qs.filter(price__lte=float(max_price))
-        except ValueError:
-            pass
+    keyset_pagination = settings.CATALOG_PAGINATION == "keyset"
+    next_page_url = previous_page_url = None
+    if keyset_pagination:
+        page_obj = KeysetPaginator(qs, settings.CATALOG_PAGE_SIZE).get_page(
+            request.GET.get("cursor")
+        )
+        next_page_url = _cursor_url(request, page_obj.next_cursor)
+        previous_page_url = _cursor_url(request, page_obj.previous_cursor)
+    else:
+        paginator = Paginator(qs, settings.CATALOG_PAGE_SIZE)
+        page_number = request.GET.get("page")
+        page = paginator.get_page(page_number)
+        # Cache a detached copy: rows of this page plus the total count
+        page_obj = Page(
+            list(page.object_list),
+            page.number,
+            Paginator(range(paginator.count), settings.CATALOG_PAGE_SIZE),
+        )
+
+    return {
+        "page_obj": page_obj,
+        "keyset_pagination": keyset_pagination,
+        "next_page_url": next_page_url,
+        "previous_page_url": previous_page_url,
+        "categories": categories,
+        "price_bands": price_bands,
+        "in_stock_count": facet_counts["in_stock"],
+        "out_of_stock_count": facet_counts["out_of_stock"],
+    }
 
-    if in_stock == "on":
-        qs = qs.filter(stock__gt=0)
 
-    qs = qs.order_by("name")
-    paginator = Paginator(qs, 6)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+@page_condition(listing_versions)
+def product_list(request):
+    """
+    List of products with filtering: search, category, price, in stock, pagination.
+    With CATALOG_PAGINATION = "keyset" the listing pages by cursor (next/prev only).
+    Pages are served from the catalog cache until a product or category changes.
+    """
+    listing = get_or_build(listing_key(request.GET), lambda: _build_listing(request))
 
     breadcrumbs = [
         {"title": "Home", "url": reverse("store:product_list")},
@@ -64,31 +116,32 @@ def product_list(request):
         request,
         "store/product_list.html",
         {
-            "page_obj": page_obj,
+            **listing,
             "breadcrumbs": breadcrumbs,
-            "categories": categories,
-            "search_query": q,
-            "selected_category": category_id,
-            "min_price": min_price,
-            "max_price": max_price,
-            "in_stock": in_stock,
+            "search_query": request.GET.get("q", "").strip(),
+            "selected_category": request.GET.get("category", "").strip(),
+            "min_price": request.GET.get("min_price", "").strip(),
+            "max_price": request.GET.get("max_price", "").strip(),
+            "in_stock": request.GET.get("in_stock"),
         },
     )
 
 
+def _in_cart(request, pk):
+    if request.user.is_authenticated:
+        return CartItem.objects.filter(cart__user=request.user, product_id=pk).exists()
+    return str(pk) in request.session.get("cart", {})
+
+
+@page_condition(product_versions, visitor_state=_in_cart)
 def product_detail(request, pk):
     """
     Display details for a single product identified by its pk.
     """
-    product = get_object_or_404(Product, pk=pk)
-    in_cart = False
-    if request.user.is_authenticated:
-        in_cart = CartItem.objects.filter(
-            cart__user=request.user, product=product
-        ).exists()
-    else:
-        session_cart = request.session.get("cart", {})
-        in_cart = str(product.pk) in session_cart
+    product = get_product(pk)
+    if product is None:
+        raise Http404("No Product matches the given query.")
+    in_cart = _in_cart(request, product.pk)
 
     breadcrumbs = [
         {"title": "Home", "url": reverse("store:product_list")},
@@ -117,9 +170,8 @@ def signup_view(request):
             user.is_active = True
             user.save()
             username = form.cleaned_data.get("username")
-            raw_password = form.cleaned_data.get("password1")
-            user = authenticate(username=username, password=raw_password)
-            login(request, user)
+            # The form hashed the password; authenticating would hash it again
+            login(request, user, backend=settings.AUTHENTICATION_BACKENDS[0])
             merge_session_cart_to_db(request, user)
             messages.success(
                 request, f"Welcome, {username}! Your account has been created."
@@ -140,16 +192,14 @@ def login_view(request):
     if request.method == "POST":
         form = AuthenticationForm(request, data=request.POST)
         if form.is_valid():
-            username = form.cleaned_data.get("username")
-            password = form.cleaned_data.get("password")
-            user = authenticate(username=username, password=password)
-            if user is not None:
-                login(request, user)
-                merge_session_cart_to_db(request, user)
-                messages.success(request, f"You are now logged in as {username}.")
-                return redirect("store:product_list")
-            else:
-                messages.error(request, "Invalid username or password.")
+            # The form has authenticated the user already
+            user = form.get_user()
+            login(request, user)
+            merge_session_cart_to_db(request, user)
+            messages.success(
+                request, f"You are now logged in as {user.get_username()}."
+            )
+            return redirect("store:product_list")
         else:
             messages.error(request, "Invalid credentials.")
     else:
@@ -172,26 +222,7 @@ def cart_view(request):
       - for logged-in users — from the database,
       - for anonymous users — from request.session['cart'].
     """
-    items = []
-    total = 0
-    if request.user.is_authenticated:
-        cart, _ = Cart.objects.get_or_create(user=request.user)
-        items = cart.items.select_related("product").all()
-        for item in items:
-            item.subtotal = item.product.price * item.quantity
-        total = sum(item.subtotal for item in items)
-    else:
-        session_cart = request.session.get("cart", {})
-        product_ids = [int(pid) for pid in session_cart.keys()]
-        products = Product.objects.filter(pk__in=product_ids)
-        for prod in products:
-            qty = session_cart.get(str(prod.pk), 0)
-            fake = SimpleNamespace(
-                product=prod, quantity=qty, subtotal=prod.price * qty, pk=prod.pk
-            )
-            items.append(fake)
-            total += fake.subtotal
-
+    priced = pricing.price_visitor_cart(request)
     breadcrumbs = [
         {"title": "Home", "url": reverse("store:product_list")},
         {"title": "Cart", "url": ""},
@@ -200,8 +231,8 @@ def cart_view(request):
         request,
         "store/cart.html",
         {
-            "items": items,
-            "total": total,
+            "items": priced.lines,
+            "total": priced.total,
             "breadcrumbs": breadcrumbs,
         },
     )
@@ -213,25 +244,41 @@ def add_to_cart(request, pk):
     Adds an item to the current user's cart.
     If the cart doesn't exist yet - creates it.
     If the product is already in the cart, increases the quantity by 1.
+    The new quantity is held against stock for STOCK_RESERVATION_TTL seconds.
     If AJAX request, return JSON, otherwise redirect to cart.
     """
     product = get_object_or_404(Product, pk=pk)
     if request.user.is_authenticated:
         cart, _ = Cart.objects.get_or_create(user=request.user)
+        item = CartItem.objects.filter(cart=cart, product=product).first()
+        quantity = item.quantity + 1 if item else 1
+        try:
+            reservations.hold(product, quantity, cart=cart)
+        except InsufficientStock as exc:
+            return JsonResponse({"success": False, "error": str(exc)})
+        if item:
+            item.quantity = quantity
+            item.save()
+        else:
+            CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+        count = carts.changed(request, cart)["item_count"]
     else:
-        cart, _ = Cart.objects.get_or_create(user=request.user)
-    item, created = CartItem.objects.get_or_create(cart=cart, product=product)
-    if not created:
-        item.quantity += 1
-        item.save()
+        session_cart = request.session.get("cart", {})
+        quantity = session_cart.get(str(product.pk), 0) + 1
+        try:
+            reservations.hold(
+                product, quantity, session_key=reservations.guest_key(request.session)
+            )
+        except InsufficientStock as exc:
+            return JsonResponse({"success": False, "error": str(exc)})
+        session_cart[str(product.pk)] = quantity
+        request.session["cart"] = session_cart
+        count = sum(session_cart.values())
 
     return JsonResponse(
         {
             "success": True,
-            "cart_item_count": cart.items.aggregate(total=models.Sum("quantity"))[
-                "total"
-            ]
-            or 0,
+            "cart_item_count": count,
             "cart_url": reverse("store:cart_view"),
         }
     )
@@ -240,25 +287,19 @@ def add_to_cart(request, pk):
 def merge_session_cart_to_db(request, user):
     """
     On login/registration: transfers data from request.session['cart']
-    to Cart/CartItem tables and clears the session.
+    to Cart/CartItem tables and clears the session. The number of
+    queries does not depend on the size of the cart (see carts.merge).
     """
     session_cart = request.session.get("cart", {})
     if not session_cart:
         return
 
-    cart, _ = Cart.objects.get_or_create(user=user)
-    for pid_str, qty in session_cart.items():
-        try:
-            prod = Product.objects.get(pk=int(pid_str))
-        except Product.DoesNotExist:
-            continue
-        item, created = CartItem.objects.get_or_create(cart=cart, product=prod)
-        if created:
-            item.quantity = qty
-        else:
-            item.quantity += qty
-        item.quantity = min(item.quantity, prod.stock)
-        item.save()
+    with transaction.atomic():
+        # The guest's holds are handed over to the cart, so they must not
+        # count against it
+        reservations.release(session_key=request.session.get("cart_key", ""))
+        cart, _ = Cart.objects.get_or_create(user=user)
+        carts.merge(cart, {int(pid): qty for pid, qty in session_cart.items()})
     del request.session["cart"]
 
 
@@ -269,11 +310,19 @@ def remove_from_cart(request, pk):
     For anonymous user pk is product_id, for auth - CartItem.pk.
     """
     if request.user.is_authenticated:
-        CartItem.objects.filter(pk=pk, cart__user=request.user).delete()
+        cart = Cart.objects.filter(user=request.user).first()
+        items = CartItem.objects.filter(pk=pk, cart=cart)
+        product_ids = list(items.values_list("product_id", flat=True))
+        items.delete()
+        reservations.release(cart=cart, product_ids=product_ids)
+        carts.refresh(cart)
     else:
         session_cart = request.session.get("cart", {})
         session_cart.pop(str(pk), None)
         request.session["cart"] = session_cart
+        reservations.release(
+            session_key=request.session.get("cart_key", ""), product_ids=[pk]
+        )
     return redirect("store:cart_view")
 
 
@@ -300,16 +349,16 @@ def ajax_update_cart_item(request):
             item = CartItem.objects.get(pk=int(item_id), cart=cart)
         except CartItem.DoesNotExist:
             return HttpResponseBadRequest("No such item")
-        if quantity > item.product.stock:
+        try:
+            reservations.hold(item.product, quantity, cart=cart)
+        except InsufficientStock as exc:
             return JsonResponse(
-                {"success": False, "error": f"Max stock is {item.product.stock}"}
+                {"success": False, "error": f"Max stock is {max(exc.available, 0)}"}
             )
         item.quantity = quantity
-        item.full_clean()
         item.save()
-        item_subtotal = item.product.price * item.quantity
-        items = cart.items.select_related("product").all()
-        cart_total = sum(i.product.price * i.quantity for i in items)
+        item_subtotal = pricing.line_subtotal(item.product, item.quantity)
+        cart_total = carts.changed(request, cart)["total"]
 
     else:
         session_cart = request.session.get("cart", {})
@@ -319,27 +368,80 @@ def ajax_update_cart_item(request):
             prod = Product.objects.get(pk=int(item_id))
         except Product.DoesNotExist:
             return HttpResponseBadRequest("Product does not exist")
-        if quantity > prod.stock:
+        try:
+            reservations.hold(
+                prod, quantity, session_key=reservations.guest_key(request.session)
+            )
+        except InsufficientStock as exc:
             return JsonResponse(
-                {"success": False, "error": f"Max stock is {prod.stock}"}
+                {"success": False, "error": f"Max stock is {max(exc.available, 0)}"}
             )
         session_cart[item_id] = quantity
         request.session["cart"] = session_cart
-        item_subtotal = prod.price * quantity
-        cart_total = 0
-        for pid_str, qty in session_cart.items():
-            try:
-                p = Product.objects.get(pk=int(pid_str))
-            except Product.DoesNotExist:
-                continue
-            cart_total += p.price * qty
+        item_subtotal = pricing.line_subtotal(prod, quantity)
+        cart_total = pricing.price_session_cart(session_cart).total
 
     return JsonResponse(
         {
             "success": True,
             "item_subtotal": f"{item_subtotal:.2f}",
             "cart_total": f"{cart_total:.2f}",
-            "cart_item_count": get_cart_count(request)["cart_item_count"],
+            "cart_item_count": carts.summary(request)["item_count"],
+        }
+    )
+
+
+def _parse_op(op):
+    product_id = int(op["product_id"])
+    if "quantity" not in op:
+        return {"product_id": product_id, "delta": int(op["delta"])}
+    quantity = int(op["quantity"])
+    if quantity < 0:
+        raise ValueError(quantity)
+    return {"product_id": product_id, "quantity": quantity}
+
+
+@require_POST
+def ajax_cart_batch(request):
+    """
+    AJAX: {'ops': [{'product_id': <int>, 'quantity': <int>} or
+    {'product_id': <int>, 'delta': <int>}, ...]}
+    Applies all of them in one transaction (quantity 0 removes a line) and
+    returns the whole cart, so the page can send a debounced batch of
+    clicks instead of one request each.
+    """
+    try:
+        ops = [_parse_op(op) for op in json.loads(request.body)["ops"]]
+    except (ValueError, TypeError, KeyError, json.JSONDecodeError):
+        return HttpResponseBadRequest("Invalid data")
+
+    try:
+        priced = carts.apply_ops(request, ops)
+    except InsufficientStock as exc:
+        return JsonResponse(
+            {
+                "success": False,
+                "product_id": exc.product.pk,
+                "error": f"Max stock is {max(exc.available, 0)}",
+            }
+        )
+    except Product.DoesNotExist:
+        return HttpResponseBadRequest("Product does not exist")
+
+    return JsonResponse(
+        {
+            "success": True,
+            "items": [
+                {
+                    "item_id": line.pk,
+                    "product_id": line.product.pk,
+                    "quantity": line.quantity,
+                    "subtotal": f"{line.subtotal:.2f}",
+                }
+                for line in priced
+            ],
+            "cart_total": f"{priced.total:.2f}",
+            "cart_item_count": priced.item_count,
         }
     )
 
@@ -351,10 +453,14 @@ def clear_cart(request):
       - for anonymous users - deletes data from the session.
     """
     if request.user.is_authenticated:
-        CartItem.objects.filter(cart__user=request.user).delete()
+        cart = Cart.objects.filter(user=request.user).first()
+        CartItem.objects.filter(cart=cart).delete()
+        reservations.release(cart=cart)
+        carts.refresh(cart)
     else:
         if "cart" in request.session:
             del request.session["cart"]
+        reservations.release(session_key=request.session.get("cart_key", ""))
     return redirect("store:cart_view")
 
 
@@ -364,19 +470,15 @@ def checkout_view(request):
     Shows the order form.
     If the cart is empty, redirects to the catalog.
     POST: validates data, creates Order and OrderItem, lists items from stock, clears cart.
+    Everything happens in one transaction; if any product ran out of stock
+    nothing is saved and the user is sent back to the cart.
     """
-    cart, _ = Cart.objects.get_or_create(user=request.user)
-    items = cart.items.select_related("product").all()
-    if not items:
+    priced = pricing.price_visitor_cart(request)
+    if not priced:
         messages.error(request, "Your cart is empty.")
         return redirect("store:product_list")
 
-    total = 0
-    for item in items:
-        item.subtotal = item.product.price * item.quantity
-        total += item.subtotal
-
-    profile = request.user.profile
+    profile = get_profile(request.user)
     initial_data = {
         "first_name": profile.user.first_name or "",
         "last_name": profile.user.last_name or "",
@@ -391,23 +493,12 @@ def checkout_view(request):
         if form.is_valid():
             order = form.save(commit=False)
             order.user = request.user
-            order.total_price = total
-            order.ordered_at = timezone.now()
             order.status = "PENDING"
-            order.save()
-
-            for item in items:
-                OrderItem.objects.create(
-                    order=order,
-                    product=item.product,
-                    quantity=item.quantity,
-                    price_at_order=item.product.price,
-                )
-                product = item.product
-                product.stock -= item.quantity
-                product.save()
-
-            items.delete()
+            try:
+                place_order(order, priced.items())
+            except OutOfStock as exc:
+                messages.error(request, str(exc))
+                return redirect("store:cart_view")
 
             messages.success(request, f"Order #{order.id} created successfully!")
             return redirect("store:order_confirmation", order_id=order.id)
@@ -426,8 +517,8 @@ def checkout_view(request):
         "store/checkout.html",
         {
             "form": form,
-            "items": items,
-            "total": total,
+            "items": priced.lines,
+            "total": priced.total,
             "breadcrumbs": breadcrumbs,
         },
     )